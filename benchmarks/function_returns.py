@@ -0,0 +1,89 @@
+"""Compares the tree-walker's two ways of returning from a Lox function.
+
+By default return statements hand a completion signal back up to
+LoxFunction.call. With `signal_returns=False` they raise LoxReturn instead,
+the way jlox does. The workload calls the functions from
+test_scripts/ch10_functions.lox in a loop, so nearly every statement run
+is part of a call or a return.
+
+    python -m benchmarks.function_returns [--repeat N]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from pylox.interpreter import Interpreter
+from pylox.lox import Lox
+
+WORKLOAD = """
+fun timesThree(number){
+    return number * 3;
+}
+
+fun makeCounter(){
+    var i = 0;
+    fun count() {
+        i = i + 1;
+        return i;
+    }
+    return count;
+}
+
+fun factorial(n){
+    if(n == 1){
+        return 1;
+    }
+    else{
+        var val = factorial(n-1) * n;
+        return val;
+    }
+}
+
+fun fib(n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+
+var counter = makeCounter();
+for (var i = 0; i < 2000; i = i + 1) {
+    timesThree(i);
+    counter();
+    factorial(10);
+}
+print counter();
+print fib(18);
+"""
+
+
+def run(signal_returns: bool) -> float:
+    runtime = Lox()
+    runtime.interpreter = Interpreter(runtime, signal_returns=signal_returns)
+    runtime.source = WORKLOAD
+
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        runtime.run()
+    elapsed = time.perf_counter() - start
+
+    assert output.getvalue() == "2001.0\n2584.0\n", output.getvalue()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per mode, the best is reported")
+    args = parser.parse_args()
+
+    results = {}
+    for name, signal_returns in [("exceptions", False), ("signals", True)]:
+        results[name] = min(run(signal_returns) for _ in range(args.repeat))
+        print(f"{name:>10}: {results[name]:.3f}s")
+
+    print(f"   speedup: {results['exceptions'] / results['signals']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
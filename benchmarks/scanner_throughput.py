@@ -0,0 +1,66 @@
+"""Measures how many tokens per second each scanner produces.
+
+The workload is every script in test_scripts/ and example_programs/,
+repeated until it's a few hundred thousand tokens long, so it covers the
+whole token set in realistic proportions. Each scanner's tokens are checked
+against Scanner's before it's timed.
+
+    python -m benchmarks.scanner_throughput [--repeat N] [--copies N]
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import time
+
+from pylox.lox import Lox, SCANNERS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def workload(copies: int) -> str:
+    sources = []
+    for pattern in ["test_scripts/*.lox", "example_programs/*.lox"]:
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, pattern))):
+            with open(path) as ifp:
+                sources.append(ifp.read())
+    return "\n".join(sources * copies)
+
+
+def scan(name: str, source: str):
+    # the scanners report unexpected characters by printing them
+    with contextlib.redirect_stdout(io.StringIO()):
+        return SCANNERS[name](source, Lox()).scan_tokens()
+
+
+def run(name: str, source: str) -> float:
+    start = time.perf_counter()
+    scan(name, source)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per scanner, the best is reported")
+    parser.add_argument("--copies", type=int, default=100, help="how many times to repeat the scripts")
+    args = parser.parse_args()
+
+    source = workload(args.copies)
+    expected = [(token.type, token.lexeme, token.line) for token in scan("char", source)]
+    print(f"{len(source) / 1e6:.1f}MB of source, {len(expected)} tokens")
+
+    results = {}
+    for name in SCANNERS:
+        tokens = scan(name, source)
+        assert [(tokens[i].type, tokens[i].lexeme, tokens[i].line) for i in range(len(tokens))] == expected, name
+
+        results[name] = min(run(name, source) for _ in range(args.repeat))
+        print(f"{name:>6}: {len(expected) / results[name]:>10,.0f} tokens/s")
+
+    print(f" speedup: {results['char'] / results['regex']:.2f}x (regex over char)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Runs the Lox benchmark suite and compares results between runs.
+
+The workloads are the .lox files in this directory, modelled on the
+benchmarks from Crafting Interpreters. Each one is run in-process from
+scratch (scanning, parsing, resolving and running it) a few times to warm
+up and then timed over a number of repetitions, reporting the median and
+variance. Every run must print the same output as the first.
+
+    pylox-bench run [NAME ...] [--engine ENGINE ...] [-O] [--warmup N] [--repeat N] [--output FILE]
+    pylox-bench compare BASELINE RESULTS [--threshold PERCENT]
+
+`compare` (or `run --compare BASELINE`) exits with status 1 if any
+benchmark's median got slower by more than the threshold.
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pylox import __version__
+from pylox.lox import ENGINES, Lox
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# How much slower a median can get, in percent, before compare calls it a regression
+DEFAULT_THRESHOLD = 5.0
+
+
+def benchmarks() -> Dict[str, str]:
+    """The path of every workload in the suite, by name"""
+
+    paths = sorted(glob.glob(os.path.join(BENCHMARKS_DIR, "*.lox")))
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+
+def run_once(source: str, engine: str, optimize: bool) -> Tuple[float, str]:
+    runtime = Lox(engine=engine, optimize=optimize)
+    runtime.source = source
+
+    output = io.StringIO()
+    # collected beforehand so no run pays for the garbage of the one before
+    gc.collect()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        runtime.run()
+    elapsed = time.perf_counter() - start
+
+    if runtime.had_error or runtime.had_runtime_error:
+        raise RuntimeError(f"the program failed:\n{output.getvalue()}")
+    return elapsed, output.getvalue()
+
+
+def measure(path: str, engine: str, optimize: bool = False, warmup: int = 1, repeat: int = 5) -> dict:
+    """Times one workload on one engine, returning its entry in the results"""
+
+    with open(path) as ifp:
+        source = ifp.read()
+
+    times, outputs = [], set()
+    for run in range(warmup + repeat):
+        elapsed, output = run_once(source, engine, optimize)
+        outputs.add(output)
+        if len(outputs) > 1:
+            raise RuntimeError(f"{path} printed something different on run {run + 1} with --engine={engine}")
+        if run >= warmup:
+            times.append(elapsed)
+
+    return {
+        "benchmark": os.path.splitext(os.path.basename(path))[0],
+        "engine": engine,
+        "optimize": optimize,
+        "median": statistics.median(times),
+        "variance": statistics.variance(times) if len(times) > 1 else 0.0,
+        "min": min(times),
+        "max": max(times),
+        "times": times,
+    }
+
+
+def label(result: dict) -> str:
+    return f"{result['benchmark']} ({result['engine']}{', -O' if result['optimize'] else ''})"
+
+
+def print_result(result: dict, width: int) -> None:
+    print(
+        f"{label(result):<{width}}  {result['median']:>8.4f}s  {result['variance'] ** 0.5:>7.4f}s"
+        f"  {result['min']:>8.4f}s  {result['max']:>8.4f}s",
+        flush=True,
+    )
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> bool:
+    """Prints how each median changed from `baseline`, returning whether any regressed by more than `threshold` percent
+
+    Results are matched up by benchmark and engine, so runs with and without
+    -O can be compared too.
+    """
+
+    before = {f"{result['benchmark']} ({result['engine']})": result for result in baseline["results"]}
+    after = {f"{result['benchmark']} ({result['engine']})": result for result in results["results"]}
+    common = [name for name in after if name in before]
+    if not common:
+        print("No benchmarks in common to compare")
+        return False
+
+    regressed = False
+    width = max(len(name) for name in common)
+    print(f"{'benchmark':<{width}}  {'before':>9}  {'after':>9}  {'change':>8}")
+    for name in common:
+        old, new = before[name]["median"], after[name]["median"]
+        change = 100 * (new / old - 1)
+        verdict = ""
+        if change > threshold:
+            verdict = "  slower"
+            regressed = True
+        elif change < -threshold:
+            verdict = "  faster"
+        print(f"{name:<{width}}  {old:>8.4f}s  {new:>8.4f}s  {change:>+7.1f}%{verdict}")
+
+    for name in sorted(set(before) ^ set(after)):
+        print(f"{name}: only in {'the baseline' if name in before else 'the new results'}")
+    if regressed:
+        print(f"Regressed: at least one median is more than {threshold:g}% slower")
+    return regressed
+
+
+def load(path: str) -> dict:
+    with open(path) as ifp:
+        return json.load(ifp)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="pylox-bench", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite")
+    run.add_argument("names", nargs="*", metavar="NAME", help=f"benchmarks to run (default: all of {', '.join(benchmarks())})")
+    run.add_argument("--engine", action="append", choices=ENGINES.keys(), help="engine to run with, can be repeated (default: tree)")
+    run.add_argument("-O", dest="optimize", action="store_true", help="optimize the programs before running them")
+    run.add_argument("--warmup", type=int, default=1, help="untimed runs of each benchmark first")
+    run.add_argument("--repeat", type=int, default=5, help="timed runs of each benchmark")
+    run.add_argument("--output", help="write the results to this file as JSON")
+    run.add_argument("--compare", metavar="BASELINE", help="compare the results with ones written by an earlier run")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="percent slower that counts as a regression")
+
+    compare_command = commands.add_parser("compare", help="compare two results files")
+    compare_command.add_argument("baseline", help="results from before a change")
+    compare_command.add_argument("results", help="results from after it")
+    compare_command.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="percent slower that counts as a regression")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        sys.exit(1 if compare(load(args.baseline), load(args.results), args.threshold) else 0)
+
+    suite = benchmarks()
+    unknown = [name for name in args.names if name not in suite]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error("--repeat must be at least 1, and --warmup at least 0")
+
+    results = {
+        "pylox": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+        "results": [],
+    }
+
+    runs = [(name, engine) for name in args.names or suite for engine in args.engine or ["tree"]]
+    width = max(len(f"{name} ({engine}, -O)") for name, engine in runs)
+    print(f"{'benchmark':<{width}}  {'median':>9}  {'stdev':>8}  {'min':>9}  {'max':>9}")
+    for name, engine in runs:
+        result = measure(suite[name], engine, args.optimize, args.warmup, args.repeat)
+        results["results"].append(result)
+        print_result(result, width)
+
+    if args.output is not None:
+        with open(args.output, "w") as ofp:
+            json.dump(results, ofp, indent=2)
+    if args.compare is not None:
+        print()
+        sys.exit(1 if compare(load(args.compare), results, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
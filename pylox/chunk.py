@@ -0,0 +1,172 @@
+from pylox.token import Token
+from pylox.types import LoxObject
+
+from enum import IntEnum, auto
+from typing import List, Optional
+
+
+class OpCode(IntEnum):
+
+    # Constants and literals
+    CONSTANT = auto()
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+
+    # Variables
+    GET_LOCAL = auto()
+    SET_LOCAL = auto()
+    GET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    SET_GLOBAL = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    GET_PROPERTY = auto()
+    CHECK_INSTANCE = auto()
+    SET_PROPERTY = auto()
+    GET_SUPER = auto()
+
+    # Operators
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    MODULO = auto()
+    NOT = auto()
+    NEGATE = auto()
+
+    # Statements
+    PRINT = auto()
+    ASSERT = auto()
+
+    # Control flow, jump targets are absolute offsets into the chunk
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    JUMP_IF_TRUE = auto()
+    POP_JUMP_IF_FALSE = auto()
+
+    # Functions and classes
+    CALL = auto()
+    INVOKE = auto()
+    PREPARE_INVOKE = auto()
+    PREPARE_SUPER_INVOKE = auto()
+    CALL_METHOD = auto()
+    CLOSURE = auto()
+    CLOSE_UPVALUE = auto()
+    RETURN = auto()
+    CLASS = auto()
+    INHERIT = auto()
+    METHOD = auto()
+
+
+class Chunk:
+
+    # A flat sequence of opcodes and their operands. Every slot in `code` has a
+    # matching entry in `tokens` so that runtime errors can be reported with the
+    # same token (and line number) as the tree-walking interpreter uses.
+
+    def __init__(self):
+        self.code: List[int] = []
+        self.tokens: List[Optional[Token]] = []
+        self.constants: List[LoxObject] = []
+        self.constant_indices = {}
+
+    def write(self, byte: int, token: Optional[Token] = None) -> int:
+        self.code.append(byte)
+        self.tokens.append(token)
+        return len(self.code) - 1
+
+    def add_constant(self, value: LoxObject) -> int:
+        # key on the type as well, since 1.0 == True in python
+        key = (type(value), value)
+        index = self.constant_indices.get(key)
+        if index is None:
+            self.constants.append(value)
+            index = len(self.constants) - 1
+            self.constant_indices[key] = index
+        return index
+
+    def disassemble(self, name: str) -> str:
+        lines = [f"== {name} =="]
+        offset = 0
+        while offset < len(self.code):
+            op = OpCode(self.code[offset])
+            operands = OPERAND_COUNTS.get(op, 0)
+            args = self.code[offset + 1 : offset + 1 + operands]
+            if op == OpCode.CLOSURE:
+                function = self.constants[args[0]]
+                args = self.code[offset + 1 : offset + 2 + 2 * function.upvalue_count]
+                operands = len(args)
+            line = self.tokens[offset].line if self.tokens[offset] is not None else "|"
+            text = f"{offset:04d} {line:>4} {op.name:<18} {' '.join(str(a) for a in args)}"
+            if op in CONSTANT_OPERAND_OPS:
+                text += f" '{self.constants[args[0]]}'"
+            lines.append(text.rstrip())
+            offset += 1 + operands
+        return "\n".join(lines)
+
+
+OPERAND_COUNTS = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.JUMP_IF_TRUE: 1,
+    OpCode.POP_JUMP_IF_FALSE: 1,
+    OpCode.CALL: 1,
+    OpCode.INVOKE: 2,
+    OpCode.PREPARE_INVOKE: 1,
+    OpCode.PREPARE_SUPER_INVOKE: 1,
+    OpCode.CALL_METHOD: 1,
+    OpCode.CLOSURE: 1,
+    OpCode.CLASS: 1,
+    OpCode.METHOD: 1,
+}
+
+CONSTANT_OPERAND_OPS = {
+    OpCode.CONSTANT,
+    OpCode.GET_GLOBAL,
+    OpCode.DEFINE_GLOBAL,
+    OpCode.SET_GLOBAL,
+    OpCode.GET_PROPERTY,
+    OpCode.SET_PROPERTY,
+    OpCode.GET_SUPER,
+    OpCode.INVOKE,
+    OpCode.PREPARE_INVOKE,
+    OpCode.PREPARE_SUPER_INVOKE,
+    OpCode.CLOSURE,
+    OpCode.CLASS,
+    OpCode.METHOD,
+}
+
+
+class FunctionPrototype:
+
+    # The compiled form of a function declaration (clox's ObjFunction)
+
+    def __init__(self, name: str, arity: int = 0):
+        self.name = name
+        self.arity = arity
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __str__(self) -> str:
+        if self.name is None:
+            return "< script >"
+        return f"< fn {self.name} >"
@@ -0,0 +1,597 @@
+from pylox.types import LoxObject
+from pylox.exceptions import LoxRuntimeError, LoxAssertionError, LoxReturn
+from pylox.token_type import TokenType
+from pylox.token import Token
+from pylox.environment import Environment, GlobalEnvironment, UNDEFINED
+from pylox.interpreter import ClockBuiltinFn
+from pylox.lox_callable import LoxCallable
+from pylox.lox_function import LoxFunction
+from pylox.lox_class import LoxClass
+from pylox.lox_instance import LoxInstance, GetCache, SetCache
+from pylox.counted_loop import CountedLoop
+
+from pylox import expr
+from pylox import stmt
+
+from typing import Callable, List, Optional, Union
+
+# Every node is compiled into a python function which takes the current
+# environment and returns the node's value (or None for statements).
+Compiled = Callable[[Environment], LoxObject]
+
+
+class CompiledFunction(LoxFunction):
+
+    # A LoxFunction whose body has already been compiled into closures
+
+    def __init__(self, declaration: stmt.Function, body: Compiled, closure: Environment, is_initializer: bool,
+                 instance: Optional[LoxInstance] = None):
+        super().__init__(declaration, closure, is_initializer, instance)
+        self.body = body
+
+    def bind(self, instance: LoxInstance) -> 'CompiledFunction':
+        return CompiledFunction(self.declaration, self.body, self.closure, self.is_initializer, instance)
+
+    def call_in(self, instance: Optional[LoxInstance], interpreter, arguments: List[LoxObject]):
+        if instance is not None:
+            environment = Environment(self.closure, [instance, *arguments])
+        elif self.declaration in interpreter.empty_scopes:
+            environment = self.closure
+        else:
+            environment = Environment(self.closure, arguments)
+
+        try:
+            self.body(environment)
+        except LoxReturn as lr:
+            if self.is_initializer:
+                return instance
+            return lr.value
+
+        if self.is_initializer:
+            return instance
+        return None
+
+
+class ClosureCompiler(expr.Visitor, stmt.Visitor):
+
+    # Walks the resolved syntax tree once and turns every node into a
+    # specialized python closure, with operators, scope depths and constants
+    # already bound. Running the program then never goes back through
+    # `accept` or matches on token types.
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.globals = GlobalEnvironment()
+        self.locals = {}
+        # blocks and functions that declare nothing, see Resolver.visit_block_stmt
+        self.empty_scopes = set()
+
+        self.globals.define("clock", ClockBuiltinFn())
+
+    def resolve(self, expression: expr.Expr, depth: int, slot: int) -> None:
+        self.locals[expression] = (depth, slot)
+
+    def resolve_tail_call(self, expression: expr.Call) -> None:
+        # compiled functions return by raising LoxReturn, tail calls are just calls
+        pass
+
+    def resolve_counted_loop(self, loop: CountedLoop) -> None:
+        # only the tree-walking Interpreter has a fast path for these
+        pass
+
+    def resolve_empty_scope(self, node: Union[stmt.Block, stmt.Function]) -> None:
+        self.empty_scopes.add(node)
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        program = [self.compile(statement) for statement in statements]
+        try:
+            for statement in program:
+                statement(self.globals)
+        except LoxRuntimeError as e:
+            self.runtime.runtime_error(e)
+        except LoxAssertionError as e:
+            self.runtime.assertion_error(e)
+
+    def compile(self, node) -> Compiled:
+        return node.accept(self)
+
+    def compile_block(self, statements: List[stmt.Stmt]) -> Compiled:
+        compiled = [self.compile(statement) for statement in statements]
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def block(env):
+            for statement in compiled:
+                statement(env)
+
+        return block
+
+    # Statements
+
+    def visit_expression_stmt(self, statement: stmt.Expression) -> Compiled:
+        return self.compile(statement.expression)
+
+    def visit_print_stmt(self, statement: stmt.Print) -> Compiled:
+        expression = self.compile(statement.expression)
+
+        def print_stmt(env):
+            print(str(expression(env)))
+
+        return print_stmt
+
+    def visit_assert_stmt(self, statement: stmt.Assert) -> Compiled:
+        expression = self.compile(statement.expression)
+        line = statement.assert_token.line
+
+        def assert_stmt(env):
+            value = expression(env)
+            if value is None or value is False:
+                raise LoxAssertionError(line, "Assertion Error")
+
+        return assert_stmt
+
+    def visit_var_stmt(self, statement: stmt.Var) -> Compiled:
+        name = statement.name.lexeme
+        if statement.initializer is None:
+
+            def var_stmt(env):
+                env.define(name, None)
+
+            return var_stmt
+
+        initializer = self.compile(statement.initializer)
+
+        def var_stmt(env):
+            env.define(name, initializer(env))
+
+        return var_stmt
+
+    def visit_block_stmt(self, statement: stmt.Block) -> Compiled:
+        body = self.compile_block(statement.statements)
+        if statement in self.empty_scopes:
+            return body
+
+        def block_stmt(env):
+            body(Environment(env))
+
+        return block_stmt
+
+    def visit_if_stmt(self, statement: stmt.If) -> Compiled:
+        condition = self.compile(statement.condition)
+        then_branch = self.compile(statement.then_branch)
+
+        if statement.else_branch is None:
+
+            def if_stmt(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    then_branch(env)
+
+            return if_stmt
+
+        else_branch = self.compile(statement.else_branch)
+
+        def if_else_stmt(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                then_branch(env)
+            else:
+                else_branch(env)
+
+        return if_else_stmt
+
+    def visit_while_stmt(self, statement: stmt.While) -> Compiled:
+        condition = self.compile(statement.condition)
+        body = self.compile(statement.body)
+
+        def while_stmt(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return
+                body(env)
+
+        return while_stmt
+
+    def visit_return_stmt(self, statement: stmt.Return) -> Compiled:
+        if statement.value is None:
+
+            def return_stmt(env):
+                raise LoxReturn(None)
+
+            return return_stmt
+
+        value = self.compile(statement.value)
+
+        def return_value_stmt(env):
+            raise LoxReturn(value(env))
+
+        return return_value_stmt
+
+    def visit_function_stmt(self, statement: stmt.Function) -> Compiled:
+        name = statement.name.lexeme
+        body = self.compile_block(statement.body)
+
+        def function_stmt(env):
+            env.define(name, CompiledFunction(statement, body, env, False))
+
+        return function_stmt
+
+    def visit_class_stmt(self, statement: stmt.Class) -> Compiled:
+        name = statement.name.lexeme
+        superclass_expression = None
+        if statement.superclass is not None:
+            superclass_expression = self.compile(statement.superclass)
+
+        methods = [
+            (method, self.compile_block(method.body), method.name.lexeme == "init")
+            for method in statement.methods
+        ]
+
+        def class_stmt(env):
+            superclass = None
+            if superclass_expression is not None:
+                superclass = superclass_expression(env)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(statement.superclass.name, "Superclass must be a class.")
+
+            method_env = env
+            if superclass is not None:
+                method_env = Environment(env, [superclass])
+
+            functions = {}
+            for declaration, body, is_initializer in methods:
+                functions[declaration.name.lexeme] = CompiledFunction(declaration, body, method_env, is_initializer)
+
+            env.define(name, LoxClass(name, superclass, functions))
+
+        return class_stmt
+
+    # Expressions
+
+    def visit_literal_expr(self, expression: expr.Literal) -> Compiled:
+        value = expression.value
+
+        def literal(env):
+            return value
+
+        return literal
+
+    def visit_grouping_expr(self, expression: expr.Grouping) -> Compiled:
+        return self.compile(expression.expression)
+
+    def visit_logical_expr(self, expression: expr.Logical) -> Compiled:
+        left = self.compile(expression.left)
+        right = self.compile(expression.right)
+
+        if expression.operator.type == TokenType.OR:
+
+            def logical_or(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+
+            return logical_or
+
+        def logical_and(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+
+        return logical_and
+
+    def visit_unary_expr(self, expression: expr.Unary) -> Compiled:
+        right = self.compile(expression.right)
+        operator = expression.operator
+
+        match operator.type:
+            case TokenType.BANG:
+
+                def bang(env):
+                    value = right(env)
+                    return value is None or value is False
+
+                return bang
+
+            case TokenType.MINUS:
+
+                def negate(env):
+                    value = right(env)
+                    if type(value) is not float:
+                        raise LoxRuntimeError(operator, "Operand must be a numbers.")
+                    return -value
+
+                return negate
+
+    def visit_binary_expr(self, expression: expr.Binary) -> Compiled:
+        left = self.compile(expression.left)
+        right = self.compile(expression.right)
+        operator = expression.operator
+
+        match operator.type:
+            case TokenType.GREATER:
+
+                def greater(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    return a > b
+
+                return greater
+
+            case TokenType.LESS:
+
+                def less(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    return a < b
+
+                return less
+
+            case TokenType.GREATER_EQUAL:
+
+                def greater_equal(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    return a >= b
+
+                return greater_equal
+
+            case TokenType.LESS_EQUAL:
+
+                def less_equal(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    return a <= b
+
+                return less_equal
+
+            case TokenType.BANG_EQUAL:
+
+                def not_equal(env):
+                    return left(env) != right(env)
+
+                return not_equal
+
+            case TokenType.EQUAL_EQUAL:
+
+                def equal(env):
+                    return left(env) == right(env)
+
+                return equal
+
+            case TokenType.MINUS:
+
+                def subtract(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    return a - b
+
+                return subtract
+
+            case TokenType.SLASH:
+
+                def divide(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    if b == 0:
+                        raise LoxRuntimeError(operator, "Runtime Error: Cannot Divide by zero.")
+                    return a / b
+
+                return divide
+
+            case TokenType.PERCENT:
+
+                def modulo(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    if b == 0:
+                        raise LoxRuntimeError(operator, "Runtime Error: Cannot Modulo by zero.")
+                    return a % b
+
+                return modulo
+
+            case TokenType.STAR:
+
+                def multiply(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(operator, "Operands must be numbers.")
+                    return a * b
+
+                return multiply
+
+            case TokenType.PLUS:
+
+                def add(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is type(b) and (type(a) is float or type(a) is str):
+                        return a + b
+                    raise LoxRuntimeError(operator, "Runtime Error: Operands must be two numbers or two strings")
+
+                return add
+
+    def look_up_variable(self, name: Token, expression: expr.Expr) -> Compiled:
+        resolved = self.locals.get(expression, None)
+
+        if resolved is None:
+            global_values = self.globals.values
+            slot = self.globals.slot(name.lexeme)
+
+            def global_variable(env):
+                value = global_values[slot]
+                if value is UNDEFINED:
+                    raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+                return value
+
+            return global_variable
+
+        distance, slot = resolved
+        if distance == 0:
+
+            def local_variable(env):
+                return env.values[slot]
+
+            return local_variable
+
+        if distance == 1:
+
+            def enclosing_variable(env):
+                return env.enclosing.values[slot]
+
+            return enclosing_variable
+
+        def ancestor_variable(env):
+            return env.ancestor(distance).values[slot]
+
+        return ancestor_variable
+
+    def visit_variable_expr(self, expression: expr.Variable) -> Compiled:
+        return self.look_up_variable(expression.name, expression)
+
+    def visit_this_expr(self, expression: expr.This) -> Compiled:
+        return self.look_up_variable(expression.keyword, expression)
+
+    def visit_assign_expr(self, expression: expr.Assign) -> Compiled:
+        value = self.compile(expression.value)
+        resolved = self.locals.get(expression)
+        name = expression.name
+
+        if resolved is None:
+            global_values = self.globals.values
+            slot = self.globals.slot(name.lexeme)
+
+            def assign_global_variable(env):
+                result = value(env)
+                if global_values[slot] is UNDEFINED:
+                    raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+                global_values[slot] = result
+                return result
+
+            return assign_global_variable
+
+        distance, slot = resolved
+
+        def assign_local_variable(env):
+            result = value(env)
+            env.ancestor(distance).values[slot] = result
+            return result
+
+        return assign_local_variable
+
+    def visit_get_expr(self, expression: expr.Get) -> Compiled:
+        obj = self.compile(expression.object)
+        name = expression.name
+        get_cached = GetCache(name).get
+
+        def get(env):
+            instance = obj(env)
+            if isinstance(instance, LoxInstance):
+                return get_cached(instance)
+            raise LoxRuntimeError(name, "Only class instances have properties.")
+
+        return get
+
+    def visit_set_expr(self, expression: expr.Set) -> Compiled:
+        obj = self.compile(expression.object)
+        value = self.compile(expression.value)
+        name = expression.name
+        set_cached = SetCache(name).set
+
+        def set(env):
+            instance = obj(env)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have fields.")
+            result = value(env)
+            set_cached(instance, result)
+            return result
+
+        return set
+
+    def visit_super_expr(self, expression: expr.Super) -> Compiled:
+        distance, slot = self.locals.get(expression)
+        method_name = expression.method
+
+        def super_expr(env):
+            superclass = env.get_at(distance, slot)
+            parent_object = env.get_at(distance - 1, 0)
+            method = superclass.find_method(method_name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(method_name, f"Undefined property {method_name.lexeme}.")
+            return method.bind(parent_object)
+
+        return super_expr
+
+    def visit_call_expr(self, expression: expr.Call) -> Compiled:
+        arguments = [self.compile(argument) for argument in expression.arguments]
+        paren = expression.paren
+        interpreter = self
+
+        def call_value(function, values):
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+
+            if len(values) != function.arity():
+                raise LoxRuntimeError(paren, f"Expected {function.arity()} arguments but got { len(values) }.")
+
+            return function.call(interpreter, values)
+
+        if type(expression.callee) is expr.Get:
+            return self.compile_invoke(expression, arguments, call_value)
+
+        callee = self.compile(expression.callee)
+
+        def call(env):
+            function = callee(env)
+            return call_value(function, [argument(env) for argument in arguments])
+
+        return call
+
+    def compile_invoke(self, expression: expr.Call, arguments: List[Compiled], call_value) -> Compiled:
+        # obj.method(args) looks the method up and calls it without creating a
+        # bound method (see LoxFunction.invoke). Fields shadow methods, so a
+        # field holding a function is still called through `call_value`.
+        obj = self.compile(expression.callee.object)
+        name = expression.callee.name
+        paren = expression.paren
+        offset_of = GetCache(name).offset
+        interpreter = self
+
+        def invoke(env):
+            instance = obj(env)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only class instances have properties.")
+
+            offset = offset_of(instance.shape)
+            if offset is not None:
+                function = instance.values[offset]
+                return call_value(function, [argument(env) for argument in arguments])
+
+            method = instance.klass.methods.get(name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(name, f"Undefined property {name.lexeme}.")
+
+            values = [argument(env) for argument in arguments]
+            if len(values) != method.arity():
+                raise LoxRuntimeError(paren, f"Expected {method.arity()} arguments but got { len(values) }.")
+            return method.invoke(instance, interpreter, values)
+
+        return invoke
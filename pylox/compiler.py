@@ -0,0 +1,415 @@
+from pylox.chunk import OpCode, FunctionPrototype
+from pylox.resolver import FunctionType
+from pylox.token import Token
+from pylox.token_type import TokenType
+from pylox.types import LoxObject
+
+from pylox import expr
+from pylox import stmt
+
+from typing import List, Optional
+
+
+BINARY_OPCODES = {
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.PERCENT: OpCode.MODULO,
+}
+
+
+class Local:
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class FunctionState:
+
+    # Book-keeping for the function currently being compiled (clox's `Compiler` struct).
+    # Slot zero of every frame holds the callee, or `this` inside of methods.
+
+    def __init__(self, enclosing: Optional['FunctionState'], function: FunctionPrototype, function_type: FunctionType):
+        self.enclosing = enclosing
+        self.function = function
+        self.function_type = function_type
+        self.scope_depth = 0
+        self.upvalues = []  # (index, is_local) pairs
+
+        slot_zero = "this" if function_type in [FunctionType.METHOD, FunctionType.INITIALIZER] else ""
+        self.locals = [Local(slot_zero, 0)]
+
+
+class ClassState:
+
+    def __init__(self, enclosing: Optional['ClassState']):
+        self.enclosing = enclosing
+        self.has_superclass = False
+
+
+class Compiler(expr.Visitor, stmt.Visitor):
+
+    # Compiles a resolved syntax tree into bytecode for the VM. Static errors have
+    # already been reported by the Resolver by the time we get here, so the compiler
+    # only needs to work out where each variable lives at runtime.
+
+    def __init__(self):
+        self.current: Optional[FunctionState] = None
+        self.current_class: Optional[ClassState] = None
+
+    def compile(self, statements: List[stmt.Stmt]) -> FunctionPrototype:
+        self.current = FunctionState(None, FunctionPrototype(None), FunctionType.NONE)
+        self.current_class = None
+        for statement in statements:
+            self.compile_node(statement)
+        self.emit_return()
+        return self.current.function
+
+    def compile_node(self, node) -> None:
+        node.accept(self)
+
+    @property
+    def chunk(self):
+        return self.current.function.chunk
+
+    # Emitting bytecode
+
+    def emit(self, op: OpCode, token: Optional[Token] = None) -> int:
+        return self.chunk.write(op, token)
+
+    def emit_with_operand(self, op: OpCode, operand: int, token: Optional[Token] = None) -> int:
+        self.chunk.write(op, token)
+        return self.chunk.write(operand, token)
+
+    def emit_constant(self, value: LoxObject) -> None:
+        self.emit_with_operand(OpCode.CONSTANT, self.chunk.add_constant(value))
+
+    def emit_jump(self, op: OpCode) -> int:
+        return self.emit_with_operand(op, -1)
+
+    def patch_jump(self, operand_offset: int) -> None:
+        self.chunk.code[operand_offset] = len(self.chunk.code)
+
+    def emit_return(self) -> None:
+        if self.current.function_type == FunctionType.INITIALIZER:
+            self.emit_with_operand(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def identifier_constant(self, name: Token) -> int:
+        return self.chunk.add_constant(name.lexeme)
+
+    # Scopes and variables
+
+    def begin_scope(self) -> None:
+        self.current.scope_depth += 1
+
+    def end_scope(self) -> None:
+        state = self.current
+        state.scope_depth -= 1
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals[-1].is_captured:
+                self.emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emit(OpCode.POP)
+            state.locals.pop()
+
+    def declare_variable(self, name: str) -> None:
+        if self.current.scope_depth == 0:
+            return
+        self.current.locals.append(Local(name, -1))
+
+    def mark_initialized(self) -> None:
+        if self.current.scope_depth == 0:
+            return
+        self.current.locals[-1].depth = self.current.scope_depth
+
+    def define_variable(self, name: Token) -> None:
+        if self.current.scope_depth > 0:
+            self.mark_initialized()
+            return
+        self.emit_with_operand(OpCode.DEFINE_GLOBAL, self.identifier_constant(name), name)
+
+    @staticmethod
+    def resolve_local(state: FunctionState, name: str) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name:
+                return i
+        return -1
+
+    def resolve_upvalue(self, state: FunctionState, name: str) -> int:
+        if state.enclosing is None:
+            return -1
+
+        local = self.resolve_local(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].is_captured = True
+            return self.add_upvalue(state, local, True)
+
+        upvalue = self.resolve_upvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.add_upvalue(state, upvalue, False)
+
+        return -1
+
+    @staticmethod
+    def add_upvalue(state: FunctionState, index: int, is_local: bool) -> int:
+        upvalue = (index, is_local)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+        state.upvalues.append(upvalue)
+        state.function.upvalue_count = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def named_variable(self, name: Token, assign: bool = False) -> None:
+        slot = self.resolve_local(self.current, name.lexeme)
+        if slot != -1:
+            op = OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL
+        else:
+            slot = self.resolve_upvalue(self.current, name.lexeme)
+            if slot != -1:
+                op = OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE
+            else:
+                slot = self.identifier_constant(name)
+                op = OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL
+
+        self.emit_with_operand(op, slot, name)
+
+    # Statements
+
+    def visit_expression_stmt(self, statement: stmt.Expression) -> None:
+        self.compile_node(statement.expression)
+        self.emit(OpCode.POP)
+
+    def visit_print_stmt(self, statement: stmt.Print) -> None:
+        self.compile_node(statement.expression)
+        self.emit(OpCode.PRINT)
+
+    def visit_assert_stmt(self, statement: stmt.Assert) -> None:
+        self.compile_node(statement.expression)
+        self.emit(OpCode.ASSERT, statement.assert_token)
+
+    def visit_var_stmt(self, statement: stmt.Var) -> None:
+        self.declare_variable(statement.name.lexeme)
+        if statement.initializer is not None:
+            self.compile_node(statement.initializer)
+        else:
+            self.emit(OpCode.NIL)
+        self.define_variable(statement.name)
+
+    def visit_block_stmt(self, statement: stmt.Block) -> None:
+        self.begin_scope()
+        for s in statement.statements:
+            self.compile_node(s)
+        self.end_scope()
+
+    def visit_if_stmt(self, statement: stmt.If) -> None:
+        self.compile_node(statement.condition)
+        then_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile_node(statement.then_branch)
+
+        if statement.else_branch is None:
+            self.patch_jump(then_jump)
+            return
+
+        else_jump = self.emit_jump(OpCode.JUMP)
+        self.patch_jump(then_jump)
+        self.compile_node(statement.else_branch)
+        self.patch_jump(else_jump)
+
+    def visit_while_stmt(self, statement: stmt.While) -> None:
+        loop_start = len(self.chunk.code)
+        self.compile_node(statement.condition)
+        exit_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile_node(statement.body)
+        self.emit_with_operand(OpCode.JUMP, loop_start)
+        self.patch_jump(exit_jump)
+
+    def visit_function_stmt(self, statement: stmt.Function) -> None:
+        self.declare_variable(statement.name.lexeme)
+        self.mark_initialized()  # functions may refer to themselves recursively
+        self.function(statement, FunctionType.FUNCTION)
+        self.define_variable(statement.name)
+
+    def function(self, declaration: stmt.Function, function_type: FunctionType) -> None:
+        prototype = FunctionPrototype(declaration.name.lexeme, len(declaration.params))
+        self.current = FunctionState(self.current, prototype, function_type)
+        self.begin_scope()
+
+        for param in declaration.params:
+            self.declare_variable(param.lexeme)
+            self.mark_initialized()
+
+        for statement in declaration.body:
+            self.compile_node(statement)
+        self.emit_return()
+
+        state = self.current
+        self.current = state.enclosing
+
+        self.emit_with_operand(OpCode.CLOSURE, self.chunk.add_constant(prototype), declaration.name)
+        for index, is_local in state.upvalues:
+            self.chunk.write(1 if is_local else 0)
+            self.chunk.write(index)
+
+    def visit_return_stmt(self, statement: stmt.Return) -> None:
+        if statement.value is None:
+            self.emit_return()
+            return
+        self.compile_node(statement.value)
+        self.emit(OpCode.RETURN)
+
+    def visit_class_stmt(self, statement: stmt.Class) -> None:
+        name_constant = self.identifier_constant(statement.name)
+        self.declare_variable(statement.name.lexeme)
+        self.emit_with_operand(OpCode.CLASS, name_constant, statement.name)
+        self.define_variable(statement.name)
+
+        class_state = ClassState(self.current_class)
+        self.current_class = class_state
+
+        if statement.superclass is not None:
+            self.named_variable(statement.superclass.name)
+            self.begin_scope()
+            self.declare_variable("super")
+            self.mark_initialized()
+
+            self.named_variable(statement.name)
+            self.emit(OpCode.INHERIT, statement.superclass.name)
+            class_state.has_superclass = True
+
+        self.named_variable(statement.name)
+        for method in statement.methods:
+            function_type = FunctionType.METHOD
+            if method.name.lexeme == "init":
+                function_type = FunctionType.INITIALIZER
+            self.function(method, function_type)
+            self.emit_with_operand(OpCode.METHOD, self.identifier_constant(method.name), method.name)
+        self.emit(OpCode.POP)
+
+        if class_state.has_superclass:
+            self.end_scope()
+
+        self.current_class = class_state.enclosing
+
+    # Expressions
+
+    def visit_literal_expr(self, expression: expr.Literal) -> None:
+        if expression.value is None:
+            self.emit(OpCode.NIL)
+        elif expression.value is True:
+            self.emit(OpCode.TRUE)
+        elif expression.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit_constant(expression.value)
+
+    def visit_grouping_expr(self, expression: expr.Grouping) -> None:
+        self.compile_node(expression.expression)
+
+    def visit_unary_expr(self, expression: expr.Unary) -> None:
+        self.compile_node(expression.right)
+        match expression.operator.type:
+            case TokenType.BANG:
+                self.emit(OpCode.NOT, expression.operator)
+            case TokenType.MINUS:
+                self.emit(OpCode.NEGATE, expression.operator)
+
+    def visit_binary_expr(self, expression: expr.Binary) -> None:
+        self.compile_node(expression.left)
+        self.compile_node(expression.right)
+        self.emit(BINARY_OPCODES[expression.operator.type], expression.operator)
+
+    def visit_logical_expr(self, expression: expr.Logical) -> None:
+        self.compile_node(expression.left)
+        if expression.operator.type == TokenType.OR:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_TRUE)
+        else:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compile_node(expression.right)
+        self.patch_jump(end_jump)
+
+    def visit_variable_expr(self, expression: expr.Variable) -> None:
+        self.named_variable(expression.name)
+
+    def visit_assign_expr(self, expression: expr.Assign) -> None:
+        self.compile_node(expression.value)
+        self.named_variable(expression.name, assign=True)
+
+    def visit_this_expr(self, expression: expr.This) -> None:
+        self.named_variable(expression.keyword)
+
+    def visit_get_expr(self, expression: expr.Get) -> None:
+        self.compile_node(expression.object)
+        self.emit_with_operand(OpCode.GET_PROPERTY, self.identifier_constant(expression.name), expression.name)
+
+    def visit_set_expr(self, expression: expr.Set) -> None:
+        # the object is checked before the value is evaluated, as the
+        # tree-walking Interpreter does, so no side effects come before the error
+        self.compile_node(expression.object)
+        self.emit(OpCode.CHECK_INSTANCE, expression.name)
+        self.compile_node(expression.value)
+        self.emit_with_operand(OpCode.SET_PROPERTY, self.identifier_constant(expression.name), expression.name)
+
+    def visit_super_expr(self, expression: expr.Super) -> None:
+        self.named_variable(Token(TokenType.THIS, "this", None, expression.keyword.line))
+        self.named_variable(Token(TokenType.SUPER, "super", None, expression.keyword.line))
+        self.emit_with_operand(OpCode.GET_SUPER, self.identifier_constant(expression.method), expression.method)
+
+    def visit_call_expr(self, expression: expr.Call) -> None:
+        callee = expression.callee
+
+        # `obj.method(...)` and `super.method(...)` don't allocate a bound
+        # method. As in the tree-walking Interpreter the method (or field) is
+        # looked up before the arguments are evaluated, so any error comes
+        # before their side effects. When the arguments can't have any the
+        # lookup and call are a single invoke instruction, and otherwise the
+        # method is pushed beneath them for CALL_METHOD to call.
+        if isinstance(callee, expr.Get):
+            self.compile_node(callee.object)
+            if not all(self.is_pure(argument) for argument in expression.arguments):
+                self.emit_with_operand(OpCode.PREPARE_INVOKE, self.identifier_constant(callee.name), callee.name)
+                self.compile_arguments(expression.arguments)
+                self.emit_with_operand(OpCode.CALL_METHOD, len(expression.arguments), expression.paren)
+                return
+            self.compile_arguments(expression.arguments)
+            self.chunk.write(OpCode.INVOKE, callee.name)
+            self.chunk.write(self.identifier_constant(callee.name), callee.name)
+            self.chunk.write(len(expression.arguments), expression.paren)
+            return
+
+        if isinstance(callee, expr.Super):
+            self.named_variable(Token(TokenType.THIS, "this", None, callee.keyword.line))
+            self.named_variable(Token(TokenType.SUPER, "super", None, callee.keyword.line))
+            self.emit_with_operand(OpCode.PREPARE_SUPER_INVOKE, self.identifier_constant(callee.method), callee.method)
+            self.compile_arguments(expression.arguments)
+            self.emit_with_operand(OpCode.CALL_METHOD, len(expression.arguments), expression.paren)
+            return
+
+        self.compile_node(callee)
+        self.compile_arguments(expression.arguments)
+        self.emit_with_operand(OpCode.CALL, len(expression.arguments), expression.paren)
+
+    def is_pure(self, expression: expr.Expr) -> bool:
+        # whether evaluating the expression can neither run Lox code nor fail
+        if isinstance(expression, (expr.Literal, expr.This)):
+            return True
+        if isinstance(expression, expr.Variable):
+            name = expression.name.lexeme
+            return self.resolve_local(self.current, name) != -1 or self.resolve_upvalue(self.current, name) != -1
+        return False
+
+    def compile_arguments(self, arguments: List[expr.Expr]) -> None:
+        for argument in arguments:
+            self.compile_node(argument)
@@ -0,0 +1,87 @@
+from pylox import expr, stmt
+from pylox.token import Token
+from pylox.token_type import TokenType
+
+import operator
+from typing import Callable, Optional
+
+COMPARISONS = {
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+}
+
+
+class CountedLoop:
+
+    # A `for (var i = start; i < limit; i = i + step) body` loop, which the
+    # Parser desugars into:
+    #
+    #     { var i = start; while (i < limit) { body; i = i + step; } }
+    #
+    # If the loop's body never assigns the counter and never declares a
+    # function or class (so no closure can capture the counter or the body's
+    # scope), the Interpreter can keep the counter in a python float and reuse
+    # one Environment for the body on every iteration. The Resolver finds the
+    # loops where that holds, see `Resolver.visit_block_stmt`.
+
+    def __init__(self, block: stmt.Block, name: Token, initializer: expr.Expr, operator: Token,
+                 limit: expr.Expr, loop: stmt.While, body: stmt.Stmt, increment: expr.Assign, step: float):
+        self.block = block
+        self.name = name
+        self.initializer = initializer
+        self.operator = operator
+        self.compare: Callable[[float, float], bool] = COMPARISONS[operator.type]
+        self.limit = limit
+        self.loop = loop
+        self.body = body
+        self.increment = increment
+        self.step = step
+        # cleared by the Resolver if the body turns out to assign the counter
+        # or declare a function or class
+        self.eligible = True
+
+    @classmethod
+    def match(cls, block: stmt.Block) -> Optional["CountedLoop"]:
+        """Returns the counted loop that `block` was desugared from, if it has that shape"""
+
+        if len(block.statements) != 2:
+            return None
+        declaration, loop = block.statements
+        if not isinstance(declaration, stmt.Var) or declaration.initializer is None:
+            return None
+        if not isinstance(loop, stmt.While) or not isinstance(loop.body, stmt.Block):
+            return None
+        name = declaration.name.lexeme
+
+        condition = loop.condition
+        if not isinstance(condition, expr.Binary) or condition.operator.type not in COMPARISONS:
+            return None
+        if not is_variable(condition.left, name):
+            return None
+
+        if len(loop.body.statements) != 2:
+            return None
+        body, increment = loop.body.statements
+        if not isinstance(increment, stmt.Expression):
+            return None
+        increment = increment.expression
+        if not isinstance(increment, expr.Assign) or increment.name.lexeme != name:
+            return None
+
+        step = increment.value
+        if not isinstance(step, expr.Binary) or step.operator.type not in [TokenType.PLUS, TokenType.MINUS]:
+            return None
+        if not is_variable(step.left, name):
+            return None
+        if not isinstance(step.right, expr.Literal) or type(step.right.value) is not float:
+            return None
+        amount = step.right.value if step.operator.type == TokenType.PLUS else -step.right.value
+
+        return cls(block, declaration.name, declaration.initializer, condition.operator,
+                   condition.right, loop, body, increment, amount)
+
+
+def is_variable(expression: expr.Expr, name: str) -> bool:
+    return isinstance(expression, expr.Variable) and expression.name.lexeme == name
@@ -2,48 +2,75 @@ from pylox.types import LoxObject
 from pylox.token import Token
 from pylox.exceptions import LoxRuntimeError
 
+from typing import List, Optional
+
 class Environment:
 
+    # Local variables are stored in a list, indexed by the slot that the Resolver
+    # assigned them. Slots are handed out in declaration order and Lox can't
+    # declare variables conditionally, so defining a variable just appends it.
+
     # TODO: whats the correct type hint for `enclosing`? (See PEP 673)
-    def __init__(self, enclosing=None) -> None:
+    def __init__(self, enclosing=None, values: Optional[List[LoxObject]] = None) -> None:
         self.enclosing = enclosing
-        self.values = {}
+        self.values = [] if values is None else values
 
     def define(self, name: str, value: LoxObject) -> None:
-        self.values[name] = value
+        self.values.append(value)
 
     def ancestor(self, distance: int):
         environment = self
         for i in range(distance):
             environment = environment.enclosing
-        
+
         return environment
 
-    def get_at(self, distance: int, name: str) -> LoxObject:
-        return self.ancestor(distance).values[name]
+    def get_at(self, distance: int, slot: int) -> LoxObject:
+        return self.ancestor(distance).values[slot]
+
+    def assign_at(self, distance: int, slot: int, value: LoxObject) -> None:
+        self.ancestor(distance).values[slot] = value
+
+
+# Marks a global slot whose name has been referenced but not defined yet
+UNDEFINED = object()
+
 
-    def assign_at(self, distance: int, name: str, value: LoxObject) -> None:
-        self.ancestor(distance).values[name.lexeme] = value
+class GlobalEnvironment(Environment):
+
+    # Globals aren't resolved statically (they can be used before they're
+    # declared, and redeclared) so each name gets a slot in a table the first
+    # time it's seen. Slots are never moved or reused, so a variable site can
+    # look its slot up once and then index straight into `values`.
+
+    def __init__(self) -> None:
+        self.enclosing = None
+        self.values = []
+        self.slots = {}
+
+    def slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.values)
+            self.values.append(UNDEFINED)
+        return slot
+
+    def define(self, name: str, value: LoxObject) -> None:
+        self.values[self.slot(name)] = value
 
     def get(self, name: Token) -> LoxObject:
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
+        return self.get_slot(name, self.slot(name.lexeme))
 
-        # recursively check all of the parent environments for this value
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
-        
-        print("undefined get")
-        print(self.values)
-        raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+    def get_slot(self, name: Token, slot: int) -> LoxObject:
+        value = self.values[slot]
+        if value is UNDEFINED:
+            raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+        return value
 
     def assign(self, name: Token, value: LoxObject) -> None:
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
-
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-        
-        raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+        self.assign_slot(name, self.slot(name.lexeme), value)
+
+    def assign_slot(self, name: Token, slot: int, value: LoxObject) -> None:
+        if self.values[slot] is UNDEFINED:
+            raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+        self.values[slot] = value
@@ -41,11 +41,16 @@ class Visitor(ABC):
 
 class Expr(ABC):
 
+    __slots__ = ()
+
     def accept(visitor: Visitor):
         pass
 
 class Binary(Expr):
 
+    __slots__ = ("left", "operator", "right")
+    __match_args__ = ("left", "operator", "right")
+
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
@@ -54,9 +59,15 @@ class Binary(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_binary_expr(self)
 
+    def __reduce__(self):
+        return (Binary, (self.left, self.operator, self.right))
+
 
 class Get(Expr):
 
+    __slots__ = ("object", "name")
+    __match_args__ = ("object", "name")
+
     def __init__(self, object, name):
         self.object = object
         self.name = name
@@ -64,36 +75,60 @@ class Get(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_get_expr(self)
 
+    def __reduce__(self):
+        return (Get, (self.object, self.name))
+
 
 class Grouping(Expr):
 
+    __slots__ = ("expression",)
+    __match_args__ = ("expression",)
+
     def __init__(self, expression):
         self.expression = expression
 
     def accept(self, visitor: Visitor):
         return visitor.visit_grouping_expr(self)
 
+    def __reduce__(self):
+        return (Grouping, (self.expression,))
+
 
 class Literal(Expr):
 
+    __slots__ = ("value",)
+    __match_args__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
     def accept(self, visitor: Visitor):
         return visitor.visit_literal_expr(self)
 
+    def __reduce__(self):
+        return (Literal, (self.value,))
+
 
 class Variable(Expr):
 
+    __slots__ = ("name",)
+    __match_args__ = ("name",)
+
     def __init__(self, name):
         self.name = name
 
     def accept(self, visitor: Visitor):
         return visitor.visit_variable_expr(self)
 
+    def __reduce__(self):
+        return (Variable, (self.name,))
+
 
 class Unary(Expr):
 
+    __slots__ = ("operator", "right")
+    __match_args__ = ("operator", "right")
+
     def __init__(self, operator, right):
         self.operator = operator
         self.right = right
@@ -101,18 +136,30 @@ class Unary(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_unary_expr(self)
 
+    def __reduce__(self):
+        return (Unary, (self.operator, self.right))
+
 
 class This(Expr):
 
+    __slots__ = ("keyword",)
+    __match_args__ = ("keyword",)
+
     def __init__(self, keyword):
         self.keyword = keyword
 
     def accept(self, visitor: Visitor):
         return visitor.visit_this_expr(self)
 
+    def __reduce__(self):
+        return (This, (self.keyword,))
+
 
 class Super(Expr):
 
+    __slots__ = ("keyword", "method")
+    __match_args__ = ("keyword", "method")
+
     def __init__(self, keyword, method):
         self.keyword = keyword
         self.method = method
@@ -120,9 +167,15 @@ class Super(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_super_expr(self)
 
+    def __reduce__(self):
+        return (Super, (self.keyword, self.method))
+
 
 class Assign(Expr):
 
+    __slots__ = ("name", "value")
+    __match_args__ = ("name", "value")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
@@ -130,9 +183,15 @@ class Assign(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_assign_expr(self)
 
+    def __reduce__(self):
+        return (Assign, (self.name, self.value))
+
 
 class Logical(Expr):
 
+    __slots__ = ("left", "operator", "right")
+    __match_args__ = ("left", "operator", "right")
+
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
@@ -141,9 +200,15 @@ class Logical(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_logical_expr(self)
 
+    def __reduce__(self):
+        return (Logical, (self.left, self.operator, self.right))
+
 
 class Set(Expr):
 
+    __slots__ = ("object", "name", "value")
+    __match_args__ = ("object", "name", "value")
+
     def __init__(self, object, name, value):
         self.object = object
         self.name = name
@@ -152,9 +217,15 @@ class Set(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_set_expr(self)
 
+    def __reduce__(self):
+        return (Set, (self.object, self.name, self.value))
+
 
 class Call(Expr):
 
+    __slots__ = ("callee", "paren", "arguments")
+    __match_args__ = ("callee", "paren", "arguments")
+
     def __init__(self, callee, paren, arguments):
         self.callee = callee
         self.paren = paren
@@ -163,4 +234,7 @@ class Call(Expr):
     def accept(self, visitor: Visitor):
         return visitor.visit_call_expr(self)
 
+    def __reduce__(self):
+        return (Call, (self.callee, self.paren, self.arguments))
+
 
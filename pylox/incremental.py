@@ -0,0 +1,307 @@
+from pylox import stmt
+from pylox.parser import Parser
+from pylox.program_cache import Annotation, Annotations
+from pylox.resolver import Resolver
+from pylox.scanner import RegexScanner
+from pylox.token import Token
+from pylox.token_type import TokenType
+
+import bisect
+import sys
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class Diagnostic(NamedTuple):
+
+    line: int
+    # as Lox prints it, e.g. "Error at ;: Expect expression."
+    message: str
+
+
+class Diagnostics:
+
+    # Stands in for Lox as the runtime of the front end, collecting the errors
+    # it reports into `entries` instead of printing them
+
+    def __init__(self):
+        self.entries: List[Diagnostic] = []
+
+    def error(self, line: int, message: str) -> None:
+        self.report(line, "", message)
+
+    def report(self, line: int, where: str, message: str) -> None:
+        self.entries.append(Diagnostic(line, f"Error {where}: {message}"))
+
+    def unexpected_character(self, line: int, character: str) -> None:
+        self.entries.append(Diagnostic(line, f"Unexpected Character {character}"))
+
+
+class Positions:
+
+    # An increasing list of token offsets or indices, where everything from
+    # `pivot` on still has to have `shift` added. An edit moves everything
+    # after it in constant time, and the shift is only carried over to the
+    # entries between the pivot and the next edit.
+
+    def __init__(self, values: List[int]):
+        self.values = values
+        self.pivot = len(values)
+        self.shift = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> int:
+        if index >= self.pivot:
+            return self.values[index] + self.shift
+        return self.values[index]
+
+    def bisect_left(self, value: int, lo: int = 0) -> int:
+        values, pivot = self.values, self.pivot
+        if lo < pivot:
+            index = bisect.bisect_left(values, value, lo, pivot)
+            if index < pivot:
+                return index
+        return bisect.bisect_left(values, value - self.shift, max(lo, pivot))
+
+    def splice(self, first: int, last: int, values: List[int], shift: int) -> None:
+        """Replaces the entries `first` to `last` with `values`, and adds `shift` to the ones after"""
+
+        # leave the pending shift on exactly the entries from `last` on
+        if self.shift:
+            if self.pivot < last:
+                for index in range(self.pivot, first):
+                    self.values[index] += self.shift
+            else:
+                for index in range(last, self.pivot):
+                    self.values[index] -= self.shift
+
+        self.values[first:last] = values
+        self.pivot = first + len(values)
+        self.shift += shift
+
+
+class Declaration:
+
+    # A top-level declaration in a Document, and what parsing and resolving it found
+
+    def __init__(self, statement: Optional[stmt.Stmt], parse_diagnostics: List[Diagnostic]):
+        self.statement = statement
+        self.parse_diagnostics = parse_diagnostics
+        self.resolve_diagnostics: List[Diagnostic] = []
+        self.annotations: List[Annotation] = []
+
+    def move(self, lines: int) -> None:
+        self.parse_diagnostics = [d._replace(line=d.line + lines) for d in self.parse_diagnostics]
+        self.resolve_diagnostics = [d._replace(line=d.line + lines) for d in self.resolve_diagnostics]
+
+
+class DocumentParser(Parser):
+
+    # Parses a Document's tokens, using the list of their types that the
+    # Document keeps up to date rather than building a new one for every edit
+
+    def __init__(self, tokens: List[Token], types: List[TokenType], runtime):
+        self._tokens = tokens
+        self.types = types
+        self.current = 0
+        self.runtime = runtime
+
+
+class Document:
+
+    # The front end for a program that's edited in place, as in an editor.
+    # Each edit re-scans only the source around it, re-parses only the
+    # top-level declarations whose tokens changed and resolves only those
+    # again. The tokens, tree and diagnostics are the same as scanning,
+    # parsing and resolving the edited source from scratch would give, except
+    # that every declaration that parsed without errors is resolved, even if
+    # others had them.
+    #
+    # Tokens after an edit are kept, and so are the nodes of the declarations
+    # after it, with their lines moved if the edit added or removed any.
+
+    def __init__(self, source: str = ""):
+        self.source = ""
+        self.tokens: List[Token] = [Token(TokenType.EOF, "", None, 1)]
+        self.types: List[TokenType] = [TokenType.EOF]
+        # where each token's lexeme starts and ends in the source
+        self.starts = Positions([0])
+        self.ends = Positions([0])
+        # (index of the token that follows it, diagnostic) for each scanning error
+        self.scan_diagnostics: List[Tuple[int, Diagnostic]] = []
+
+        self.declarations: List[Declaration] = []
+        self.statements: List[Optional[stmt.Stmt]] = []
+        # Each declaration was parsed from the tokens `firsts[i]` up to
+        # `lasts[i]`. The parser looks at the token at `lasts[i]` to end some
+        # statements, so that token is part of what it depends on too.
+        self.firsts = Positions([])
+        self.lasts = Positions([])
+
+        self.edit(0, 0, source)
+
+    @property
+    def diagnostics(self) -> List[Diagnostic]:
+        """Scanning errors, then parse errors, then resolution errors, each in source order"""
+
+        diagnostics = [diagnostic for _, diagnostic in self.scan_diagnostics]
+        for declaration in self.declarations:
+            if declaration.parse_diagnostics:
+                diagnostics.extend(declaration.parse_diagnostics)
+        for declaration in self.declarations:
+            if declaration.resolve_diagnostics:
+                diagnostics.extend(declaration.resolve_diagnostics)
+        return diagnostics
+
+    @property
+    def annotations(self) -> List[Annotation]:
+        """What the Resolver told the engine about the program, see `program_cache.replay`"""
+        return [annotation for declaration in self.declarations for annotation in declaration.annotations]
+
+    def edit(self, start: int, end: int, text: str) -> Tuple[List[Optional[stmt.Stmt]], List[Diagnostic]]:
+        """Replaces `source[start:end]` with `text`, returning the new tree and diagnostics"""
+
+        if not 0 <= start <= end <= len(self.source):
+            raise ValueError(f"Edit {start}:{end} is outside the source")
+
+        old_source = self.source
+        self.source = old_source[:start] + text + old_source[end:]
+        offset = len(text) - (end - start)
+        lines = text.count("\n") - old_source.count("\n", start, end)
+
+        first, last, count = self.rescan(start, start + len(text), offset, lines)
+        self.reparse(first, last, count, lines)
+        return self.statements, self.diagnostics
+
+    def rescan(self, start: int, end: int, offset: int, lines: int) -> Tuple[int, int, int]:
+        """Scans the source again around an edit of `start:end` (in the new source)
+
+        Returns the old tokens `first` to `last` that were replaced and how
+        many tokens replaced them.
+        """
+
+        # A token can be changed by an edit up to two characters after it (as
+        # `1.` becomes `1.5`), so scanning starts after the last token that
+        # ended before that. Every token ends where the scanner was in the
+        # same state as at the start of the source, except for its line.
+        first = self.ends.bisect_left(start - 1)
+        if first > 0:
+            position, line = self.ends[first - 1], self.tokens[first - 1].line
+        else:
+            position, line = 0, 1
+
+        tokens, starts, ends, diagnostics = [], [], [], []
+        runtime = Diagnostics()
+        keywords = RegexScanner.keywords
+        operators = RegexScanner.operators
+
+        # scanning stops at the first old token after the edit, where the
+        # source and so the rest of the tokens are the same as before
+        last = len(self.tokens)
+        for match in RegexScanner.pattern.finditer(self.source, position):
+            kind = match.lastgroup
+            text = match.group()
+            position = match.start()
+
+            if position >= end:
+                index = self.starts.bisect_left(position - offset, first)
+                if index < len(self.starts) and self.starts[index] == position - offset:
+                    last = index
+                    break
+
+            token = None
+            if kind == "identifier":
+                text = sys.intern(text)
+                token = Token(keywords.get(text, TokenType.IDENTIFIER), text, None, line)
+            elif kind == "operator":
+                token = Token(operators[text], text, None, line)
+            elif kind == "newline":
+                line += 1
+            elif kind == "number":
+                token = Token(TokenType.NUMBER, text, float(text), line)
+            elif kind == "string":
+                line += text.count("\n")
+                token = Token(TokenType.STRING, text, text[1:-1], line)
+            elif kind == "unterminated":
+                line += text.count("\n")
+                runtime.error(line, "unterminated string.")
+                diagnostics.append((first + len(tokens), runtime.entries.pop()))
+            elif kind == "other":
+                runtime.unexpected_character(line, text)
+                diagnostics.append((first + len(tokens), runtime.entries.pop()))
+
+            if token is not None:
+                tokens.append(token)
+                starts.append(position)
+                ends.append(match.end())
+        else:
+            tokens.append(Token(TokenType.EOF, "", None, line))
+            starts.append(len(self.source))
+            ends.append(len(self.source))
+
+        count = len(tokens)
+        self.tokens[first:last] = tokens
+        self.types[first:last] = [token.type for token in tokens]
+        self.starts.splice(first, last, starts, offset)
+        self.ends.splice(first, last, ends, offset)
+        if lines:
+            kept = self.tokens
+            for index in range(first + count, len(kept)):
+                kept[index].line += lines
+
+        shift = count - (last - first)
+        self.scan_diagnostics = (
+            [entry for entry in self.scan_diagnostics if entry[0] < first]
+            + diagnostics
+            + [(index + shift, diagnostic._replace(line=diagnostic.line + lines))
+               for index, diagnostic in self.scan_diagnostics if index > last]
+        )
+        return first, last, count
+
+    def reparse(self, first: int, last: int, count: int, lines: int) -> None:
+        """Parses and resolves the declarations that depend on the old tokens `first` to `last` again"""
+
+        shift = count - (last - first)
+
+        # the first declaration that looked at any of the replaced tokens
+        changed = self.lasts.bisect_left(first)
+        parser = DocumentParser(self.tokens, self.types, Diagnostics())
+        parser.current = self.firsts[changed] if changed < len(self.firsts) else 0
+
+        # Declarations are parsed until the parser reaches the start of an old
+        # declaration after the new tokens, from which on the tokens and so
+        # the declarations are the same
+        parsed, firsts, lasts = [], [], []
+        reused = len(self.declarations)
+        while not parser.is_at_end():
+            if parser.current >= first + count:
+                index = self.firsts.bisect_left(parser.current - shift, changed)
+                if index < len(self.firsts) and self.firsts[index] == parser.current - shift:
+                    reused = index
+                    break
+
+            parser.runtime.entries = []
+            firsts.append(parser.current)
+            statement = parser.declaration()
+            lasts.append(parser.current)
+            parsed.append(Declaration(statement, parser.runtime.entries))
+
+        for declaration in parsed:
+            # a declaration with syntax errors can still have parsed, with holes in it
+            if declaration.parse_diagnostics:
+                continue
+            runtime = Diagnostics()
+            annotations = Annotations()
+            Resolver(annotations, runtime).resolve([declaration.statement])
+            declaration.resolve_diagnostics = runtime.entries
+            declaration.annotations = annotations.calls
+
+        self.declarations[changed:reused] = parsed
+        self.statements[changed:reused] = [declaration.statement for declaration in parsed]
+        self.firsts.splice(changed, reused, firsts, shift)
+        self.lasts.splice(changed, reused, lasts, shift)
+        if lines:
+            for declaration in self.declarations[changed + len(parsed):]:
+                if declaration.parse_diagnostics or declaration.resolve_diagnostics:
+                    declaration.move(lines)
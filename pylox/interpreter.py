@@ -2,16 +2,20 @@ from pylox.types import LoxObject
 from pylox.exceptions import LoxRuntimeError, LoxAssertionError, LoxReturn
 from pylox.token_type import TokenType
 from pylox.token import Token
-from pylox.environment import Environment
+from pylox.environment import Environment, GlobalEnvironment
 from pylox.lox_callable import LoxCallable
-from pylox.lox_function import LoxFunction
+from pylox.lox_function import LoxFunction, RETURN, TAIL_CALL
 from pylox.lox_class import LoxClass
-from pylox.lox_instance import LoxInstance
+from pylox.lox_instance import LoxInstance, GetCache, SetCache
+from pylox.counted_loop import CountedLoop
 
 from pylox import expr
 from pylox import stmt
 
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Union
+
+if TYPE_CHECKING:
+    from pylox.tracing import TraceHook
 
 import time
 
@@ -32,11 +36,26 @@ class ClockBuiltinFn(LoxCallable):
 
 class Interpreter(expr.Visitor, stmt.Visitor):
 
-    def __init__(self, runtime):
+    def __init__(self, runtime, signal_returns: bool = True):
         self.runtime = runtime
-        self.globals = Environment()
+        self.signal_returns = signal_returns
+        self.return_value = None
+        self.globals = GlobalEnvironment()
         self.environment = self.globals
         self.locals = {}
+        # calls the Resolver found in tail position, see LoxFunction.call_in
+        self.tail_calls = set()
+        self.tail_call = None
+        # desugared `for` loops that can run with a native counter, by their Block
+        self.counted_loops = {}
+        # blocks and functions that declare nothing, so run without a scope of their own
+        self.empty_scopes = set()
+        # inline caches for Get/Set expressions, created the first time each one runs
+        self.property_caches = {}
+        # Told about every Lox function call (see LoxFunction.call_in)
+        # while a program is profiled or traced, see pylox/profiler.py and
+        # pylox/tracing.py. Only one can follow a program at a time.
+        self.call_hooks = None
 
         self.globals.define("clock", ClockBuiltinFn())
 
@@ -50,19 +69,48 @@ class Interpreter(expr.Visitor, stmt.Visitor):
             self.runtime.assertion_error(e)
 
     def execute(self, statement: stmt.Stmt):
-        statement.accept(self)
+        return statement.accept(self)
+
+    def settrace(self, hook: Optional["TraceHook"], lines: bool = True) -> None:
+        """Calls `hook(event, name, line, arg)` as the program runs, or stops if `hook` is None
+
+        See Tracer for the events. Without `lines`, only calls, returns and
+        instantiations are traced, and statements run as fast as untraced.
+        """
+
+        # imported here so programs that are never traced don't pay for it
+        from pylox.tracing import Tracer
+
+        if isinstance(self.call_hooks, Tracer):
+            self.call_hooks.remove()
+        if hook is not None:
+            Tracer(self, hook, lines).install()
+
+    def gettrace(self) -> Optional["TraceHook"]:
+        from pylox.tracing import Tracer
+
+        return self.call_hooks.hook if isinstance(self.call_hooks, Tracer) else None
+
+    def resolve(self, expression: expr.Expr, depth: int, slot: int) -> None:
+        self.locals[expression] = (depth, slot)
 
-    def resolve(self, expression: expr.Expr, depth: int) -> None:
-        self.locals[expression] = depth
+    def resolve_tail_call(self, expression: expr.Call) -> None:
+        self.tail_calls.add(expression)
+
+    def resolve_counted_loop(self, loop: CountedLoop) -> None:
+        self.counted_loops[loop.block] = loop
+
+    def resolve_empty_scope(self, node: Union[stmt.Block, stmt.Function]) -> None:
+        self.empty_scopes.add(node)
 
     def visit_literal_expr(self, expr) -> LoxObject:
         return expr.value
 
     def visit_if_stmt(self, statement: stmt.Stmt) -> None:
         if self.is_truthy(self.evaluate(statement.condition)):
-            self.execute(statement.then_branch)
+            return self.execute(statement.then_branch)
         elif statement.else_branch is not None:
-            self.execute(statement.else_branch)
+            return self.execute(statement.else_branch)
 
     def visit_grouping_expr(self, expr) -> LoxObject:
         return self.evaluate(expr.expression)
@@ -139,11 +187,18 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         self.evaluate(statement.expression)
 
     def visit_return_stmt(self, statement: stmt.Return) -> None:
+        if self.signal_returns and statement.value in self.tail_calls:
+            return self.return_call(statement.value)
+
         value = None
         if statement.value is not None:
             value = self.evaluate(statement.value)
-        
-        raise LoxReturn(value)
+
+        if not self.signal_returns:
+            raise LoxReturn(value)
+
+        self.return_value = value
+        return RETURN
 
     def visit_print_stmt(self, statement: stmt.Print) -> None:
         value = self.evaluate(statement.expression)
@@ -160,7 +215,9 @@ class Interpreter(expr.Visitor, stmt.Visitor):
 
     def visit_while_stmt(self, statement: stmt.While) -> None:
         while self.is_truthy(self.evaluate(statement.condition)):
-            self.execute(statement.body)
+            completion = self.execute(statement.body)
+            if completion is not None:
+                return completion
 
     def visit_var_stmt(self, statement: stmt.Var) -> None:
         value = None
@@ -175,7 +232,10 @@ class Interpreter(expr.Visitor, stmt.Visitor):
     def visit_get_expr(self, expression: expr.Get) -> object:
         obj = self.evaluate(expression.object)
         if isinstance(obj, LoxInstance):
-            return obj.get_attr(expression.name)
+            cache = self.property_caches.get(expression)
+            if cache is None:
+                cache = self.property_caches[expression] = GetCache(expression.name)
+            return cache.get(obj)
         raise LoxRuntimeError(expression.name, "Only class instances have properties.")
 
     def visit_set_expr(self, expression: expr.Set) -> object:
@@ -183,39 +243,101 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         if not isinstance(obj, LoxInstance):
             raise LoxRuntimeError(expression.name, "Only instances have fields.")
         value = self.evaluate(expression.value)
-        obj.set_attr(expression.name, value)
+        cache = self.property_caches.get(expression)
+        if cache is None:
+            cache = self.property_caches[expression] = SetCache(expression.name)
+        cache.set(obj, value)
         return value
 
     def visit_this_expr(self, expression: expr.This) -> object:
         return self.look_up_variable(expression.keyword, expression)
 
     def look_up_variable(self, name: Token, expression: expr.Expr) -> LoxObject:
-        distance = self.locals.get(expression, None)
-        if distance is not None:
-            return self.environment.get_at(distance, name.lexeme)
-        return self.globals.get(name)
+        distance, slot = self.resolved(name, expression)
+        if distance is None:
+            return self.globals.get_slot(name, slot)
+        return self.environment.get_at(distance, slot)
+
+    def resolved(self, name: Token, expression: expr.Expr):
+        # Anything the Resolver didn't find in a local scope is a global. The
+        # first time a site is run its global slot is cached alongside the
+        # locals, with no depth, so later runs skip the lookup by name.
+        resolved = self.locals.get(expression, None)
+        if resolved is None:
+            resolved = self.locals[expression] = (None, self.globals.slot(name.lexeme))
+        return resolved
 
     def visit_block_stmt(self, stmt: stmt.Block) -> None:
-        self.execute_block(stmt.statements, Environment(enclosing=self.environment))
+        loop = self.counted_loops.get(stmt)
+        if loop is not None:
+            return self.execute_counted_loop(loop)
+        if stmt in self.empty_scopes:
+            return self.execute_block(stmt.statements, self.environment)
+        return self.execute_block(stmt.statements, Environment(enclosing=self.environment))
+
+    def execute_counted_loop(self, loop: CountedLoop):
+        previous = self.environment
+        try:
+            # the scope holding only the counter, in slot 0
+            environment = self.environment = Environment(previous)
+            counter = self.evaluate(loop.initializer)
+            environment.define(loop.name.lexeme, counter)
+            if type(counter) is not float:
+                return self.execute(loop.loop)
+
+            # The while loop's `{ body; increment; }` scope, and the body's own
+            # block scope if it has one. Nothing can capture them, so they're
+            # reused on every iteration rather than recreated.
+            body_environment = environment
+            if loop.loop.body not in self.empty_scopes:
+                body_environment = Environment(body_environment)
+            statements = [loop.body]
+            if isinstance(loop.body, stmt.Block):
+                if loop.body not in self.empty_scopes:
+                    body_environment = Environment(body_environment)
+                statements = loop.body.statements
+            body_values = None if body_environment is environment else body_environment.values
+
+            while True:
+                self.environment = environment
+                limit = self.evaluate(loop.limit)
+                if type(limit) is not float:
+                    raise LoxRuntimeError(loop.operator, "Operands must be numbers.")
+                if not loop.compare(counter, limit):
+                    return None
+
+                self.environment = body_environment
+                for statement in statements:
+                    completion = self.execute(statement)
+                    if completion is not None:
+                        return completion
+                if body_values is not None:
+                    body_values.clear()
+
+                counter += loop.step
+                environment.values[0] = counter
+        finally:
+            self.environment = previous
 
     def execute_block(self, statements: List[stmt.Stmt], environment: Environment):
         previous = self.environment
         try:
             self.environment = environment
             for stmt in statements:
-                self.execute(stmt)
+                completion = self.execute(stmt)
+                if completion is not None:
+                    return completion
         finally:
             self.environment = previous
 
     def visit_assign_expr(self, expression: expr.Assign):
         value = self.evaluate(expression.value)
 
-
-        distance = self.locals.get(expression)
-        if distance is not None:
-            self.environment.assign_at(distance, expression.name, value)
+        distance, slot = self.resolved(expression.name, expression)
+        if distance is None:
+            self.globals.assign_slot(expression.name, slot, value)
         else:
-            self.globals.assign(expression.name, value)
+            self.environment.assign_at(distance, slot, value)
 
         return value
 
@@ -226,11 +348,8 @@ class Interpreter(expr.Visitor, stmt.Visitor):
             if not isinstance(superclass, LoxClass):
                 raise LoxRuntimeError(statement.superclass.name, "Superclass must be a class.")
 
-        self.environment.define(statement.name.lexeme, None)
-
         if statement.superclass is not None:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+            self.environment = Environment(self.environment, [superclass])
 
         methods = {}
         for method in statement.methods:
@@ -242,23 +361,75 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         if superclass is not None:
             self.environment = self.environment.enclosing
 
-        self.environment.assign(statement.name, klass)
+        # nothing can run while the methods are being created, so the class can
+        # be defined in one go, keeping its slot in declaration order
+        self.environment.define(statement.name.lexeme, klass)
 
     def visit_super_expr(self, expression: expr.Super) -> None:
-        distance = self.locals.get(expression)
-        superclass = self.environment.get_at(distance, "super")
+        distance, slot = self.locals.get(expression)
+        superclass = self.environment.get_at(distance, slot)
 
         # bind uses of 'super' to the defining class's superclass
-        parent_object = self.environment.get_at(distance-1, "this")
+        # ('this' is always slot 0 of the method's scope, just inside 'super')
+        parent_object = self.environment.get_at(distance-1, 0)
         method = superclass.find_method(expression.method.lexeme)
         
         if method is None:
-            raise LoxRuntimeError(expression.method, f"Undefined property '{expr.method.lexeme}'.")
+            raise LoxRuntimeError(expression.method, f"Undefined property {expression.method.lexeme}.")
         
         return method.bind(parent_object)
 
+    def return_call(self, expression: expr.Call):
+        # `return f(x);` doesn't call a Lox function itself. It returns
+        # TAIL_CALL with the function and its arguments in `tail_call`, and
+        # LoxFunction.call_in runs that in place of the function returning,
+        # so tail recursion doesn't grow the python stack.
+        if type(expression.callee) is expr.Get:
+            value = self.invoke(expression, tail=True)
+        else:
+            value = self.call(expression, self.evaluate(expression.callee), tail=True)
+
+        if value is TAIL_CALL:
+            return TAIL_CALL
+        self.return_value = value
+        return RETURN
+
     def visit_call_expr(self, expression: expr.Call):
-        callee = self.evaluate(expression.callee)
+        if type(expression.callee) is expr.Get:
+            return self.invoke(expression)
+        return self.call(expression, self.evaluate(expression.callee))
+
+    def invoke(self, expression: expr.Call, tail: bool = False):
+        # obj.method(args) calls the method with `this` bound straight into its
+        # scope, rather than creating a bound method first (see LoxFunction.invoke)
+        get = expression.callee
+        obj = self.evaluate(get.object)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(get.name, "Only class instances have properties.")
+
+        cache = self.property_caches.get(get)
+        if cache is None:
+            cache = self.property_caches[get] = GetCache(get.name)
+
+        # fields shadow methods, so a field holding a function is called as usual
+        offset = cache.offset(obj.shape)
+        if offset is not None:
+            return self.call(expression, obj.values[offset], tail)
+
+        method = obj.klass.find_method(get.name.lexeme)
+        if method is None:
+            raise LoxRuntimeError(get.name, f"Undefined property {get.name.lexeme}.")
+
+        arguments = [self.evaluate(argument) for argument in expression.arguments]
+        if len(arguments) != method.arity():
+            raise LoxRuntimeError(expression.paren, f"Expected {method.arity()} arguments but got { len(arguments) }.")
+
+        if tail:
+            self.tail_call = (method, obj, arguments)
+            return TAIL_CALL
+        return method.invoke(obj, self, arguments)
+
+    def call(self, expression: expr.Call, callee: LoxObject, tail: bool = False):
         arguments = []
         for argument in expression.arguments:
             arguments.append(self.evaluate(argument))
@@ -271,6 +442,9 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         if len(arguments) != function.arity():
             raise LoxRuntimeError(expression.paren, f"Expected {function.arity()} arguments but got { len(arguments) }.")
 
+        if tail and type(function) is LoxFunction:
+            self.tail_call = (function, function.instance, arguments)
+            return TAIL_CALL
         return function.call(self, arguments)
 
 
@@ -1,26 +1,77 @@
+import argparse
+import importlib
+import linecache
+import mmap
+import os
 import sys
 
-from pylox.scanner import Scanner
+from pylox.scanner import Scanner, RegexScanner, TokenStoreScanner, MappedScanner
 from pylox.parser import Parser
-from pylox.interpreter import Interpreter
 from pylox.resolver import Resolver
-from pylox.ast_printer import ASTPrinter
+from pylox.program_cache import Annotations, ProgramCache, replay
+from pylox.token import Token
+from pylox.token_store import TokenStore
+from typing import Iterable, List, Union
 from pylox.exceptions import LoxRuntimeError, LoxAssertionError
 
+# Execution engines selectable with `pylox --engine=<name>`, as the module and
+# class of each. Only the selected engine's module is imported (see
+# load_engine), as are the optimizer, profilers, tracing and stats only when
+# they're asked for, since importing everything would cost more than running
+# a small script from the cache.
+ENGINES = {
+    "tree": ("pylox.interpreter", "Interpreter"),
+    "stack": ("pylox.stack_interpreter", "StackInterpreter"),
+    "vm": ("pylox.vm", "VM"),
+    "closure": ("pylox.closure_compiler", "ClosureCompiler"),
+    "python": ("pylox.transpiler", "PythonEngine"),
+}
+
+# How much of a file `--stream` reads at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Files at least this big are memory-mapped rather than read into a str, see run_mapped
+MMAP_MIN_SIZE = 8 * 1024 * 1024
+
+# Scanners selectable with `pylox --scanner=<name>`, which all produce the same tokens
+SCANNERS = {
+    "regex": RegexScanner,
+    "char": Scanner,
+    "store": TokenStoreScanner,
+}
+
 
 class Lox:
-    def __init__(self):
+    def __init__(self, engine: str = "tree", optimize: bool = False, scanner: str = "regex", cache: bool = False):
         self.had_error = False
         self.had_runtime_error = False
-        self.interpreter = Interpreter(self)
+        # set for unexpected characters, which the scanner skips over
+        self.had_warning = False
+        self.optimize = optimize
+        self.scanner = SCANNERS[scanner]
+        self.source_path = None
+        # whether run_file keeps compiled programs in __pyloxcache__
+        self.cache = cache
+        # where run_tokens stores the program it compiles, see run_cached
+        self.program_cache = None
+        self.interpreter = load_engine(engine)(self)
+
+    def run_file(self, file_name: str, stream: bool = False):
+
+        if stream:
+            self.source_path = file_name
+            with open(file_name) as ifp:
+                self.run_stream(iter(lambda: ifp.read(STREAM_CHUNK_SIZE), ""))
 
-    def run_file(self, file_name: str):
+        elif self.cache and self.run_cached(file_name):
+            pass
 
-        with open(file_name) as ifp:
-            text = ifp.read()
+        elif not self.maps_file(file_name) or not self.run_mapped(file_name):
+            with open(file_name) as ifp:
+                text = ifp.read()
 
-        self.source = text
-        self.run()
+            self.source = text
+            self.run()
 
         if self.had_error:
             sys.exit(65)
@@ -37,27 +88,137 @@ class Lox:
             self.run()
             self.had_error = False
 
+    def run_cached(self, file_name: str) -> bool:
+        """Runs a file's compiled program from the cache, without scanning, parsing or resolving it
+
+        Returns False, without running anything, if there's no valid cached
+        program for the file. Once the file has been run as usual, the program
+        compiled from it is cached by run_tokens.
+        """
+
+        cache = ProgramCache(file_name, self.optimize)
+        program = cache.load()
+        if program is None:
+            self.program_cache = cache
+            return False
+
+        statements, calls = program
+        replay(calls, self.interpreter)
+        # the source is only read back for assertion errors, see source_line
+        self.source = None
+        self.source_path = file_name
+        self.interpreter.interpret(statements)
+        return True
+
+    def maps_file(self, file_name: str) -> bool:
+        # the char scanner is only ever given a str
+        return issubclass(self.scanner, (RegexScanner, TokenStoreScanner)) and os.path.getsize(file_name) >= MMAP_MIN_SIZE
+
+    def run_mapped(self, file_name: str) -> bool:
+        """Runs a file by scanning its memory-mapped bytes, without reading it into a str
+
+        Returns False, without running anything, if the file has characters
+        MappedScanner can't scan, for it to be read and run as usual instead.
+        """
+
+        with open(file_name, "rb") as ifp, mmap.mmap(ifp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                tokens = MappedScanner(view, self).scan_tokens()
+                if tokens is None:
+                    return False
+
+                # the source is only read back for assertion errors, see source_line
+                self.source = None
+                self.source_path = file_name
+                self.run_tokens(tokens)
+                # Tokens in the program hold decoded lexemes, but the mapping
+                # can't be closed while the store still has a view of it
+                del tokens
+        return True
+
     def run(self):
 
-        scanner = Scanner(self.source, self)
-        tokens = scanner.scan_tokens()
+        scanner = self.scanner(self.source, self)
+        self.run_tokens(scanner.scan_tokens())
+
+    def run_tokens(self, tokens: Union[List[Token], TokenStore]):
+
+        program_cache, self.program_cache = self.program_cache, None
+        # when the program will be cached, what the Resolver tells the engine is recorded with it
+        resolved = self.interpreter if program_cache is None else Annotations(self.interpreter)
+
         parser = Parser(tokens, self)
         statements = parser.parse()
 
         if self.had_error:
             return
 
-        self.resolver = Resolver(self.interpreter, self)
+        self.resolver = Resolver(resolved, self)
         self.resolver.resolve(statements)
 
         if self.had_error:
             return
 
+        if self.optimize:
+            from pylox.optimizer import Optimizer
+
+            statements = Optimizer().optimize(statements)
+            # The optimizer can drop declarations and add scopes for hoisted
+            # expressions, so the optimized program is resolved again. (The
+            # first pass still reports errors in code the optimizer removes.)
+            Resolver(resolved, self).resolve(statements)
+
+        # programs that scanned with warnings aren't cached, so they're shown every run
+        if program_cache is not None and not self.had_warning:
+            program_cache.store(statements, resolved.calls)
+
         self.interpreter.interpret(statements)
 
+    def run_stream(self, chunks: Iterable[str]):
+        """Runs each top-level declaration as soon as it's been read and parsed
+
+        The whole program is never held in memory at once, as source, tokens or
+        syntax tree. Unlike `run`, declarations before a syntax error have
+        already run by the time it's found. Nothing runs after it, but the rest
+        of the program is still parsed to report any other syntax errors.
+        """
+
+        # the program isn't kept, so nothing can be looked up by its source
+        self.source = None
+        if issubclass(self.scanner, RegexScanner):
+            tokens = self.scanner("", self).stream_tokens(chunks)
+        elif issubclass(self.scanner, TokenStoreScanner):
+            tokens = self.scanner("".join(chunks), self).scan_tokens()
+        else:
+            tokens = self.scanner("".join(chunks), self).stream_tokens()
+
+        self.resolver = Resolver(self.interpreter, self)
+        for statement in Parser(tokens, self).parse_stream():
+            if self.had_runtime_error:
+                break
+            if self.had_error:
+                continue
+
+            self.resolver.resolve([statement])
+            if self.had_error:
+                continue
+
+            statements = [statement]
+            if self.optimize:
+                from pylox.optimizer import Optimizer
+
+                statements = Optimizer().optimize(statements)
+                Resolver(self.interpreter, self).resolve(statements)
+
+            self.interpreter.interpret(statements)
+
     def error(self, line: int, message: str):
         self.report(line, "", message)
 
+    def unexpected_character(self, line: int, character: str):
+        print(f"Unexpected Character {character} on line {line}")
+        self.had_warning = True
+
     def runtime_error(self, error: LoxRuntimeError):
         print(str(error))
         print(f"[line: {error.token.line}]")
@@ -65,24 +226,104 @@ class Lox:
 
     def assertion_error(self, error: LoxAssertionError):
         print(f"Assertion Error on line {error.line}: ")
-        print(" -> ", self.source.split("\n")[error.line - 1])
+        print(" -> ", self.source_line(error.line))
         self.had_runtime_error = True
 
+    def source_line(self, line: int) -> str:
+        if self.source is None:
+            # streamed programs aren't kept in memory, see run_stream
+            return linecache.getline(self.source_path, line).rstrip("\n") if self.source_path else ""
+        return self.source.split("\n")[line - 1]
+
     def report(self, line: int, where: str, message: str):
         print(f"[line: {line}] Error {where}: {message}")
         self.had_error = True
 
 
+def load_engine(name: str) -> type:
+    """The class of the engine named `name` in ENGINES, importing its module"""
+
+    module, engine = ENGINES[name]
+    return getattr(importlib.import_module(module), engine)
+
+
 def main():
 
-    if len(sys.argv) > 2:
-        print("Usage: pylox [script]")
-        sys.exit(64)
+    parser = argparse.ArgumentParser(prog="pylox")
+    parser.add_argument("script", nargs="?", help="Lox script to run, starts a prompt if omitted")
+    parser.add_argument("--engine", choices=ENGINES.keys(), default="tree", help="execution engine to use")
+    parser.add_argument("--scanner", choices=SCANNERS.keys(), default="regex", help="scanner to tokenize with")
+    parser.add_argument("--stream", action="store_true", help="run each declaration as soon as it's parsed")
+    parser.add_argument("-O", dest="optimize", action="store_true", help="optimize the program before running it")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="don't read or write __pyloxcache__")
+    parser.add_argument("--max-depth", type=int, help="maximum call depth for the stack engine")
+    parser.add_argument("--profile", action="store_true", help="report where the script spends its time")
+    parser.add_argument("--profile-mode", choices=["sampling", "deterministic"], default="sampling", help="how to profile")
+    parser.add_argument("--profile-output", help="also write the profile as collapsed stacks, for flame graphs")
+    parser.add_argument("--trace-output", help="write the script's calls to this file as Chrome trace events")
+    parser.add_argument("--stats", action="store_true", help="count the allocations, calls, lookups and evaluations the script makes")
+    args = parser.parse_args()
+
+    if args.max_depth is not None and args.engine != "stack":
+        parser.error("--max-depth can only be used with --engine=stack")
+    if args.profile and args.engine != "tree":
+        parser.error("--profile can only be used with --engine=tree")
+    if (args.profile or args.trace_output is not None or args.stats) and args.script is None:
+        parser.error("--profile, --trace-output and --stats need a script to run")
+    if args.profile_output is not None and not args.profile:
+        parser.error("--profile-output can only be used with --profile")
+    if args.trace_output is not None and args.engine != "tree":
+        parser.error("--trace-output can only be used with --engine=tree")
+    if args.trace_output is not None and args.profile:
+        parser.error("--trace-output can't be used with --profile")
+    if args.stats and args.engine != "tree":
+        parser.error("--stats can only be used with --engine=tree")
+    if args.stats and (args.profile or args.trace_output is not None):
+        parser.error("--stats can't be used with --profile or --trace-output")
+
+    lox = Lox(engine=args.engine, optimize=args.optimize, scanner=args.scanner, cache=args.cache)
+    if args.max_depth is not None:
+        lox.interpreter.max_depth = args.max_depth
+
+    if args.profile:
+        from pylox.profiler import PROFILERS
+
+        profiler = PROFILERS[args.profile_mode](lox.interpreter)
+        profiler.start()
+        try:
+            lox.run_file(args.script, stream=args.stream)
+        finally:
+            profiler.stop()
+            profiler.report(sys.stderr)
+            if args.profile_output is not None:
+                with open(args.profile_output, "w") as ofp:
+                    profiler.write_collapsed(ofp)
+
+    elif args.trace_output is not None:
+        from pylox.tracing import ChromeTrace
+
+        with open(args.trace_output, "w") as ofp:
+            trace = ChromeTrace(ofp)
+            lox.interpreter.settrace(trace, lines=False)
+            try:
+                lox.run_file(args.script, stream=args.stream)
+            finally:
+                lox.interpreter.settrace(None)
+                trace.close()
+
+    elif args.stats:
+        from pylox.stats import Stats
 
-    lox = Lox()
+        stats = Stats()
+        stats.start()
+        try:
+            lox.run_file(args.script, stream=args.stream)
+        finally:
+            stats.stop()
+            stats.report(sys.stderr)
 
-    if len(sys.argv) == 2:
-        lox.run_file(sys.argv[1])
+    elif args.script is not None:
+        lox.run_file(args.script, stream=args.stream)
 
     else:
         lox.run_prompt()
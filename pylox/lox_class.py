@@ -9,28 +9,29 @@ class LoxClass(LoxCallable):
 
     def __init__(self, name: str, superclass: 'LoxClass', methods: dict[str, LoxFunction]):
         self.name = name
-        self.methods = methods
         self.superclass = superclass
 
+        # Methods can't change once a class is declared, so inherited methods are
+        # copied down into one flat table and lookups never walk the superclass chain
+        self.methods = {}
+        if superclass is not None:
+            self.methods.update(superclass.methods)
+        self.methods.update(methods)
+
+        self.initializer = self.methods.get("init")
+        self.initializer_arity = 0 if self.initializer is None else self.initializer.arity()
+
     def __str__(self) -> str:
         return self.name
 
     def call(self, interpreter, arguments: List[LoxObject]):
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
-        if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer is not None:
+            self.initializer.invoke(instance, interpreter, arguments)
         return instance
 
     def find_method(self, name: str) -> LoxFunction:
-        if name in self.methods:
-            return self.methods[name]
-
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
+        return self.methods.get(name)
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        if initializer is None:
-            return 0
-        return initializer.arity()
+        return self.initializer_arity
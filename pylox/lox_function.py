@@ -3,36 +3,88 @@ from pylox.lox_instance import LoxInstance
 from pylox.types import LoxObject
 from pylox.exceptions import LoxReturn
 from pylox import stmt
-from typing import List
+from typing import List, Optional
 from pylox.environment import Environment
 
+# Statements complete normally by returning None. When the interpreter's
+# `signal_returns` is on, a return statement instead stores its value in
+# `interpreter.return_value` and returns RETURN, or returns TAIL_CALL for a
+# call in tail position. Every enclosing statement hands these straight back
+# up to LoxFunction.call_in without raising a LoxReturn.
+RETURN = object()
+TAIL_CALL = object()
+
 class LoxFunction(LoxCallable):
 
-    def __init__(self, declaration: stmt.Function, closure: Environment, is_initializer: bool) -> LoxObject:
+    def __init__(self, declaration: stmt.Function, closure: Environment, is_initializer: bool,
+                 instance: Optional[LoxInstance] = None) -> LoxObject:
         self.declaration = declaration
         self.closure = closure
         self.is_initializer = is_initializer
+        # the instance a method is bound to, if it's been bound (see `bind`)
+        self.instance = instance
 
     def arity(self) -> int:
         return len(self.declaration.params)
 
     def bind(self, instance: LoxInstance) -> 'LoxFunction':
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.is_initializer)
+        return LoxFunction(self.declaration, self.closure, self.is_initializer, instance)
 
     def call(self, interpreter, arguments: List[LoxObject]):
-        environment = Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, arguments[i])
-        
+        return self.call_in(self.instance, interpreter, arguments)
+
+    def invoke(self, instance: LoxInstance, interpreter, arguments: List[LoxObject]):
+        # Calls this method on `instance`, skipping the LoxFunction that `bind`
+        # would create
+        return self.call_in(instance, interpreter, arguments)
+
+    def call_in(self, instance: Optional[LoxInstance], interpreter, arguments: List[LoxObject]):
+        # `instance` is what `this` refers to in a method, and None for any
+        # other function
+        function = self
+        # tells the profiler or tracer about this call, if there is one (see Interpreter.call_hooks)
+        hooks = interpreter.call_hooks
+        if hooks is not None:
+            hooks.enter(function, arguments)
+
+        value = None
         try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except LoxReturn as lr:
-            if self.is_initializer:
-                return self.closure.get_at(0, "this")
-            return lr.value
-        return None
+            while True:
+                # A method's scope holds `this` in slot 0 and then its
+                # parameters, so one Environment is the whole call frame. Any
+                # other function's parameters start at slot 0, and a function
+                # without parameters or locals runs in its closure.
+                if instance is not None:
+                    environment = Environment(function.closure, [instance, *arguments])
+                elif function.declaration in interpreter.empty_scopes:
+                    environment = function.closure
+                else:
+                    environment = Environment(function.closure, arguments)
+
+                try:
+                    completion = interpreter.execute_block(function.declaration.body, environment)
+                except LoxReturn as lr:
+                    value = instance if function.is_initializer else lr.value
+                    return value
+
+                if completion is TAIL_CALL:
+                    # the body ended by calling another function, which runs here in
+                    # place of this one rather than in a nested python call
+                    function, instance, arguments = interpreter.tail_call
+                    if hooks is not None:
+                        hooks.replace(function, arguments)
+                    continue
+
+                if function.is_initializer:
+                    value = instance
+                elif completion is not None:
+                    # the body hit a return statement (see Interpreter.signal_returns)
+                    value = interpreter.return_value
+                return value
+        finally:
+            # with the value returned, or None if a runtime error is unwinding the call
+            if hooks is not None:
+                hooks.exit(value)
 
     def __str__(self):
-        return f"< fn {declaration.name.lexeme} >"
+        return f"< fn {self.declaration.name.lexeme} >"
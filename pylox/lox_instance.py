@@ -1,23 +1,130 @@
 from pylox.token import Token
 from pylox.exceptions import LoxRuntimeError
 
+from typing import Dict, List, Optional, Tuple
+
+
+class Shape:
+
+    # Instances that had the same fields added in the same order share a Shape,
+    # which maps each field name to its offset in the instance's `values` list.
+    # Adding a field moves an instance along a transition to the next Shape.
+
+    __slots__ = ("offsets", "transitions")
+
+    def __init__(self, offsets: Dict[str, int]):
+        self.offsets = offsets
+        self.transitions = {}
+
+    def with_field(self, name: str) -> 'Shape':
+        shape = self.transitions.get(name)
+        if shape is None:
+            offsets = dict(self.offsets)
+            offsets[name] = len(offsets)
+            shape = self.transitions[name] = Shape(offsets)
+        return shape
+
+
+EMPTY_SHAPE = Shape({})
+
+
 class LoxInstance:
 
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass):
         self.klass = klass
-        self.fields = {}
+        self.shape = EMPTY_SHAPE
+        self.values = []
 
     def __str__(self) -> str:
         return self.klass.name + " instance"
 
     def get_attr(self, name: Token) -> object:
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is not None:
+            return self.values[offset]
+
+        return self.get_method(name)
 
+    def get_method(self, name: Token) -> object:
         method = self.klass.find_method(name.lexeme)
         if method is not None:
             return method.bind(self)
         raise LoxRuntimeError(name, f"Undefined property {name.lexeme}.")
 
     def set_attr(self, name: Token, value: object) -> None:
-        self.fields[name.lexeme] = value
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is None:
+            self.shape = self.shape.with_field(name.lexeme)
+            self.values.append(value)
+        else:
+            self.values[offset] = value
+
+
+# Property sites only ever see a handful of shapes in practice. Past this many
+# a site is megamorphic and just falls back to looking the name up each time.
+MAX_CACHED_SHAPES = 4
+
+
+class GetCache:
+
+    # Inline cache for a single Get site: the offset of the field for each
+    # shape seen there, or None if instances of that shape don't have the field
+    # (so it has to be a method).
+
+    __slots__ = ("name", "entries")
+
+    def __init__(self, name: Token):
+        self.name = name
+        self.entries: List[Tuple[Shape, Optional[int]]] = []
+
+    def offset(self, shape: Shape) -> Optional[int]:
+        for cached_shape, offset in self.entries:
+            if cached_shape is shape:
+                return offset
+
+        offset = shape.offsets.get(self.name.lexeme)
+        if len(self.entries) < MAX_CACHED_SHAPES:
+            self.entries.append((shape, offset))
+        return offset
+
+    def get(self, instance: LoxInstance) -> object:
+        offset = self.offset(instance.shape)
+        if offset is not None:
+            return instance.values[offset]
+        return instance.get_method(self.name)
+
+
+class SetCache:
+
+    # Inline cache for a single Set site: for each shape seen there, the offset
+    # being written and the shape the instance has afterwards (a new one if
+    # the field is being added).
+
+    __slots__ = ("name", "entries")
+
+    def __init__(self, name: Token):
+        self.name = name
+        self.entries: List[Tuple[Shape, int, Shape]] = []
+
+    def set(self, instance: LoxInstance, value: object) -> None:
+        shape = instance.shape
+        for cached_shape, offset, next_shape in self.entries:
+            if cached_shape is shape:
+                break
+        else:
+            offset = shape.offsets.get(self.name.lexeme)
+            if offset is None:
+                offset = len(shape.offsets)
+                next_shape = shape.with_field(self.name.lexeme)
+            else:
+                next_shape = shape
+            if len(self.entries) < MAX_CACHED_SHAPES:
+                self.entries.append((shape, offset, next_shape))
+
+        if next_shape is shape:
+            instance.values[offset] = value
+        else:
+            instance.shape = next_shape
+            instance.values.append(value)
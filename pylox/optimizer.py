@@ -0,0 +1,402 @@
+from pylox.token import Token
+from pylox.token_type import TokenType
+from pylox.types import LoxObject
+from pylox.scope_analyzer import Binding, ScopeAnalyzer
+
+from pylox import expr
+from pylox import stmt
+
+from typing import Dict, List, Optional, Set, Tuple
+
+# Operators that always produce a number when they don't raise
+NUMERIC_RESULTS = [TokenType.MINUS, TokenType.STAR, TokenType.SLASH, TokenType.PERCENT]
+
+# Operators that raise unless both operands are numbers
+NUMERIC_OPERANDS = [
+    TokenType.MINUS,
+    TokenType.STAR,
+    TokenType.SLASH,
+    TokenType.PERCENT,
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+]
+
+
+def is_truthy(value: LoxObject) -> bool:
+    return value is not None and value is not False
+
+
+def fold_binary(operator: Token, left: LoxObject, right: LoxObject) -> Tuple[bool, LoxObject]:
+    # Works out `left <operator> right` the way the interpreter would. Returns
+    # (False, None) when the interpreter would raise, so the error is left to
+    # happen at runtime, on the same line.
+
+    match operator.type:
+        case TokenType.EQUAL_EQUAL:
+            return True, left == right
+        case TokenType.BANG_EQUAL:
+            return True, left != right
+        case TokenType.PLUS if type(left) is str and type(right) is str:
+            return True, left + right
+
+    if type(left) is not float or type(right) is not float:
+        return False, None
+
+    match operator.type:
+        case TokenType.PLUS:
+            return True, left + right
+        case TokenType.MINUS:
+            return True, left - right
+        case TokenType.STAR:
+            return True, left * right
+        case TokenType.SLASH if right != 0:
+            return True, left / right
+        case TokenType.PERCENT if right != 0:
+            return True, left % right
+        case TokenType.GREATER:
+            return True, left > right
+        case TokenType.GREATER_EQUAL:
+            return True, left >= right
+        case TokenType.LESS:
+            return True, left < right
+        case TokenType.LESS_EQUAL:
+            return True, left <= right
+
+    return False, None
+
+
+class Loop:
+
+    # A while loop whose body is being optimized, and the expressions hoisted
+    # out of it so far
+
+    def __init__(self, variables: Set[Binding]):
+        # locals declared or assigned somewhere in the loop
+        self.variables = variables
+        self.hoisted: List[stmt.Var] = []
+
+
+class Optimizer(expr.Visitor, stmt.Visitor):
+
+    # Rewrites a resolved program into an equivalent one that does less work at
+    # runtime. Lox.run runs it between resolving and interpreting when `-O` is
+    # passed. Every rewrite must keep the program's output and runtime errors
+    # the same, so anything that might raise is never folded, dropped or moved:
+    #
+    #  - arithmetic, comparisons and logical operators on literals are folded
+    #  - local `var`s that are never assigned and are initialized with a
+    #    literal are replaced by that literal wherever they're read
+    #  - branches that can't be taken, loops that can't run and statements
+    #    after a `return` are dropped
+    #  - expressions in a loop that can't raise and only read locals the loop
+    #    never changes are computed once, before the loop
+    #
+    # Globals are left alone, they can be redefined or assigned by a later
+    # line in the prompt.
+
+    def __init__(self):
+        self.scopes = ScopeAnalyzer()
+        self.constants: Dict[Binding, LoxObject] = {}
+        # locals that only ever hold numbers
+        self.numbers: Set[Binding] = set()
+        # loops being optimized, outermost first
+        self.loops: List[Loop] = []
+        self.temporaries = 0
+
+    def optimize(self, statements: List[stmt.Stmt]) -> List[stmt.Stmt]:
+        self.scopes.analyze(statements)
+        self.infer_numbers()
+        return self.optimize_block(statements)
+
+    def infer_numbers(self) -> None:
+        # Start by assuming every local var holds numbers and rule out any that
+        # store something which isn't one, until nothing changes.
+        self.numbers = {
+            binding for binding in self.scopes.declarations.values()
+            if binding is not None and binding.kind == "var"
+        }
+        changed = True
+        while changed:
+            changed = False
+            for binding in list(self.numbers):
+                if not all(value is not None and self.is_number(value) for value in binding.values):
+                    self.numbers.discard(binding)
+                    changed = True
+
+    def optimize_block(self, statements: List[stmt.Stmt]) -> List[stmt.Stmt]:
+        optimized = []
+        for statement in statements:
+            result = statement.accept(self)
+            if result is None:
+                continue
+            optimized.append(result)
+            if isinstance(result, stmt.Return):
+                break  # nothing after this can run
+        return optimized
+
+    def statement(self, statement: stmt.Stmt) -> stmt.Stmt:
+        # for the branches of ifs and bodies of loops, which can't be empty
+        result = statement.accept(self)
+        if result is None:
+            return stmt.Block([])
+        return result
+
+    def expression(self, expression: expr.Expr) -> expr.Expr:
+        loop = self.invariant_loop(expression)
+        if loop is None:
+            return expression.accept(self)
+
+        # hoist the whole expression, not its parts one at a time
+        loops, self.loops = self.loops, []
+        optimized = expression.accept(self)
+        self.loops = loops
+
+        if isinstance(optimized, (expr.Literal, expr.Variable)):
+            return optimized
+
+        line = optimized.operator.line
+        name = f"${self.temporaries}"
+        self.temporaries += 1
+        loop.hoisted.append(stmt.Var(Token(TokenType.IDENTIFIER, name, None, line), optimized))
+        return expr.Variable(Token(TokenType.IDENTIFIER, name, None, line))
+
+    # Analysis
+
+    def constant(self, expression: expr.Expr) -> Tuple[bool, LoxObject]:
+        if isinstance(expression, expr.Literal):
+            return True, expression.value
+        if isinstance(expression, expr.Grouping):
+            return self.constant(expression.expression)
+        if isinstance(expression, expr.Variable):
+            binding = self.scopes.references.get(expression)
+            if binding in self.constants:
+                return True, self.constants[binding]
+        return False, None
+
+    def is_number(self, expression: expr.Expr) -> bool:
+        # Whether the expression's value is always a number, if it has one
+        if isinstance(expression, expr.Literal):
+            return type(expression.value) is float
+        if isinstance(expression, expr.Grouping):
+            return self.is_number(expression.expression)
+        if isinstance(expression, expr.Variable):
+            binding = self.scopes.references.get(expression)
+            if binding in self.constants:
+                return type(self.constants[binding]) is float
+            return binding in self.numbers
+        if isinstance(expression, expr.Assign):
+            return self.is_number(expression.value)
+        if isinstance(expression, expr.Unary):
+            return expression.operator.type == TokenType.MINUS
+        if isinstance(expression, expr.Binary):
+            if expression.operator.type in NUMERIC_RESULTS:
+                return True
+            if expression.operator.type == TokenType.PLUS:
+                return self.is_number(expression.left) and self.is_number(expression.right)
+            return False
+        if isinstance(expression, expr.Logical):
+            return self.is_number(expression.left) and self.is_number(expression.right)
+        return False
+
+    def is_pure(self, expression: expr.Expr, variables: Set[Binding]) -> bool:
+        # Whether the expression can be evaluated without side effects or
+        # errors. Collects the locals it reads into `variables`.
+        if isinstance(expression, expr.Literal):
+            return True
+        if isinstance(expression, expr.Grouping):
+            return self.is_pure(expression.expression, variables)
+        if isinstance(expression, expr.Variable):
+            binding = self.scopes.references.get(expression)
+            if binding is None:
+                return False  # globals can be undefined, or changed by any call
+            if binding not in self.constants:
+                variables.add(binding)
+            return True
+        if isinstance(expression, expr.Unary):
+            if not self.is_pure(expression.right, variables):
+                return False
+            return expression.operator.type == TokenType.BANG or self.is_number(expression.right)
+        if isinstance(expression, expr.Logical):
+            return self.is_pure(expression.left, variables) and self.is_pure(expression.right, variables)
+        if isinstance(expression, expr.Binary):
+            if not (self.is_pure(expression.left, variables) and self.is_pure(expression.right, variables)):
+                return False
+            operator = expression.operator.type
+            if operator in [TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL]:
+                return True
+            if operator not in NUMERIC_OPERANDS and operator != TokenType.PLUS:
+                return False
+            if not (self.is_number(expression.left) and self.is_number(expression.right)):
+                return False
+            if operator in [TokenType.SLASH, TokenType.PERCENT]:
+                is_constant, divisor = self.constant(expression.right)
+                return is_constant and divisor != 0
+            return True
+        return False
+
+    def invariant_loop(self, expression: expr.Expr) -> Optional[Loop]:
+        # The outermost loop this expression can be hoisted out of, if any
+        if not self.loops or not isinstance(expression, (expr.Binary, expr.Unary, expr.Logical, expr.Grouping)):
+            return None
+
+        variables = set()
+        if not self.is_pure(expression, variables) or not variables:
+            return None  # (with no variables it'll just be folded)
+        if any(binding.assigned_by_closure for binding in variables):
+            return None
+
+        for loop in self.loops:
+            if not variables & loop.variables:
+                return loop
+        return None
+
+    # Statements
+
+    def visit_expression_stmt(self, statement: stmt.Expression) -> Optional[stmt.Stmt]:
+        expression = self.expression(statement.expression)
+        if isinstance(expression, expr.Literal):
+            return None
+        return stmt.Expression(expression)
+
+    def visit_print_stmt(self, statement: stmt.Print) -> stmt.Stmt:
+        return stmt.Print(self.expression(statement.expression))
+
+    def visit_assert_stmt(self, statement: stmt.Assert) -> stmt.Stmt:
+        return stmt.Assert(statement.assert_token, self.expression(statement.expression))
+
+    def visit_var_stmt(self, statement: stmt.Var) -> stmt.Stmt:
+        initializer = None
+        if statement.initializer is not None:
+            initializer = self.expression(statement.initializer)
+
+        binding = self.scopes.declarations[statement]
+        if binding is not None and not binding.assigned:
+            if initializer is None:
+                self.constants[binding] = None
+            elif isinstance(initializer, expr.Literal):
+                self.constants[binding] = initializer.value
+
+        return stmt.Var(statement.name, initializer)
+
+    def visit_block_stmt(self, statement: stmt.Block) -> stmt.Stmt:
+        return stmt.Block(self.optimize_block(statement.statements))
+
+    def visit_if_stmt(self, statement: stmt.If) -> Optional[stmt.Stmt]:
+        condition = self.expression(statement.condition)
+
+        if isinstance(condition, expr.Literal):
+            branch = statement.then_branch if is_truthy(condition.value) else statement.else_branch
+            if branch is None:
+                return None
+            return branch.accept(self)
+
+        else_branch = None
+        if statement.else_branch is not None:
+            else_branch = self.statement(statement.else_branch)
+        return stmt.If(condition, self.statement(statement.then_branch), else_branch)
+
+    def visit_while_stmt(self, statement: stmt.While) -> Optional[stmt.Stmt]:
+        loop = Loop(self.scopes.loop_variables[statement])
+        self.loops.append(loop)
+        condition = self.expression(statement.condition)
+        body = self.statement(statement.body)
+        self.loops.pop()
+
+        if isinstance(condition, expr.Literal) and not is_truthy(condition.value):
+            return None
+
+        optimized = stmt.While(condition, body)
+        if loop.hoisted:
+            return stmt.Block(loop.hoisted + [optimized])
+        return optimized
+
+    def visit_return_stmt(self, statement: stmt.Return) -> stmt.Stmt:
+        value = None
+        if statement.value is not None:
+            value = self.expression(statement.value)
+        return stmt.Return(statement.keyword, value)
+
+    def visit_function_stmt(self, statement: stmt.Function) -> stmt.Stmt:
+        # a function body runs whenever it's called, so nothing inside it can
+        # be hoisted out of the loops around its declaration
+        loops, self.loops = self.loops, []
+        body = self.optimize_block(statement.body)
+        self.loops = loops
+        return stmt.Function(statement.name, statement.params, body)
+
+    def visit_class_stmt(self, statement: stmt.Class) -> stmt.Stmt:
+        methods = [self.visit_function_stmt(method) for method in statement.methods]
+        return stmt.Class(statement.name, statement.superclass, methods)
+
+    # Expressions
+
+    def visit_literal_expr(self, expression: expr.Literal) -> expr.Expr:
+        return expression
+
+    def visit_grouping_expr(self, expression: expr.Grouping) -> expr.Expr:
+        # groupings only matter to the parser
+        return self.expression(expression.expression)
+
+    def visit_variable_expr(self, expression: expr.Variable) -> expr.Expr:
+        binding = self.scopes.references.get(expression)
+        if binding in self.constants:
+            return expr.Literal(self.constants[binding])
+        return expression
+
+    def visit_assign_expr(self, expression: expr.Assign) -> expr.Expr:
+        return expr.Assign(expression.name, self.expression(expression.value))
+
+    def visit_unary_expr(self, expression: expr.Unary) -> expr.Expr:
+        right = self.expression(expression.right)
+
+        if isinstance(right, expr.Literal):
+            if expression.operator.type == TokenType.BANG:
+                return expr.Literal(not is_truthy(right.value))
+            if type(right.value) is float:
+                return expr.Literal(-1 * right.value)
+
+        return expr.Unary(expression.operator, right)
+
+    def visit_binary_expr(self, expression: expr.Binary) -> expr.Expr:
+        left = self.expression(expression.left)
+        right = self.expression(expression.right)
+
+        if isinstance(left, expr.Literal) and isinstance(right, expr.Literal):
+            folded, value = fold_binary(expression.operator, left.value, right.value)
+            if folded:
+                return expr.Literal(value)
+
+        return expr.Binary(left, expression.operator, right)
+
+    def visit_logical_expr(self, expression: expr.Logical) -> expr.Expr:
+        left = self.expression(expression.left)
+
+        if isinstance(left, expr.Literal):
+            if expression.operator.type == TokenType.OR:
+                short_circuits = is_truthy(left.value)
+            else:
+                short_circuits = not is_truthy(left.value)
+            if short_circuits:
+                return left
+            return self.expression(expression.right)
+
+        return expr.Logical(left, expression.operator, self.expression(expression.right))
+
+    def visit_call_expr(self, expression: expr.Call) -> expr.Expr:
+        callee = self.expression(expression.callee)
+        arguments = [self.expression(argument) for argument in expression.arguments]
+        return expr.Call(callee, expression.paren, arguments)
+
+    def visit_get_expr(self, expression: expr.Get) -> expr.Expr:
+        return expr.Get(self.expression(expression.object), expression.name)
+
+    def visit_set_expr(self, expression: expr.Set) -> expr.Expr:
+        return expr.Set(self.expression(expression.object), expression.name, self.expression(expression.value))
+
+    def visit_this_expr(self, expression: expr.This) -> expr.Expr:
+        return expression
+
+    def visit_super_expr(self, expression: expr.Super) -> expr.Expr:
+        return expression
@@ -1,23 +1,81 @@
 from pylox.token_type import TokenType, KEYWORDS
 from pylox.token import Token
+from pylox.token_store import TokenStore
 from pylox.exceptions import ParseError
-from typing import List
+from typing import Iterator, List, Union
 
 from pylox import stmt
 from pylox import expr
 
+class TokenStream:
+
+    # Lets the Parser index into a token iterator like a list. The parser only
+    # ever looks at the current token and the one before it, so only those are
+    # kept, and tokens are pulled from the iterator as the parser advances.
+
+    def __init__(self, tokens: Iterator[Token]):
+        self.tokens = tokens
+        self.window: List[Token] = []
+        # the index of the first token in `window`
+        self.offset = 0
+        self.types = TokenTypes(self)
+
+    def __getitem__(self, index: int) -> Token:
+        window = self.window
+        while index >= self.offset + len(window):
+            window.append(next(self.tokens))
+            if len(window) > 2:
+                del window[0]
+                self.offset += 1
+        return window[index - self.offset]
+
+
+class TokenTypes:
+
+    # The types of a TokenStream's tokens, for the Parser's lookahead
+
+    def __init__(self, stream: TokenStream):
+        self.stream = stream
+
+    def __getitem__(self, index: int) -> TokenType:
+        return self.stream[index].type
+
+
 class Parser:
-    def __init__(self, tokens, runtime):
+    def __init__(self, tokens: Union[List[Token], TokenStore, Iterator[Token]], runtime):
         self.tokens = tokens
         self.current = 0
         self.runtime = runtime
 
+    @property
+    def tokens(self) -> Union[List[Token], TokenStore, TokenStream]:
+        return self._tokens
+
+    @tokens.setter
+    def tokens(self, tokens: Union[List[Token], TokenStore, Iterator[Token]]) -> None:
+        # Lookahead only needs each token's type, so the parser checks these by
+        # index and a TokenStore only builds the Tokens that end up in the tree.
+        # Any other iterable of tokens is read lazily, see TokenStream.
+        if isinstance(tokens, TokenStore):
+            self.types = tokens.token_types()
+        elif isinstance(tokens, list):
+            self.types = [token.type for token in tokens]
+        else:
+            tokens = TokenStream(iter(tokens))
+            self.types = tokens.types
+        self._tokens = tokens
+
     def parse(self) -> List[stmt.Stmt]:
         statements = []
         while not self.is_at_end():
             statements.append(self.declaration())
         return statements
 
+    def parse_stream(self) -> Iterator[stmt.Stmt]:
+        """Yields each top-level declaration as soon as it's parsed"""
+        while not self.is_at_end():
+            yield self.declaration()
+
     def declaration(self) -> stmt.Stmt:
         try:
             if self.match(TokenType.CLASS):
@@ -30,20 +88,25 @@ class Parser:
         except ParseError:
             self.synchronize()
             return None
+        except RecursionError:
+            # nested deeper than python's stack allows, e.g. thousands of parentheses
+            self.error(self.peek(), "Too much nesting.")
+            self.synchronize()
+            return None
 
     def class_declaration(self) -> stmt.Stmt:
         name = self.consume(TokenType.IDENTIFIER, "Expect class name.")
 
         superclass = None
         if self.match(TokenType.LESS):
-            self.consume(TokenType.IDENTIFIER, "Expect superclass name")
+            self.expect(TokenType.IDENTIFIER, "Expect superclass name")
             superclass = expr.Variable(self.previous())
 
-        self.consume(TokenType.LEFT_BRACE, "Expect '{' before class body.")
+        self.expect(TokenType.LEFT_BRACE, "Expect '{' before class body.")
         methods = []
         while not self.check(TokenType.RIGHT_BRACE) and not self.is_at_end():
             methods.append(self.function("method"))
-        self.consume(TokenType.RIGHT_BRACE, "expect '}' after class body.")
+        self.expect(TokenType.RIGHT_BRACE, "expect '}' after class body.")
 
         return stmt.Class(name, superclass, methods)
 
@@ -52,7 +115,7 @@ class Parser:
 
     def function(self, kind: str) -> stmt.Function:
         name = self.consume(TokenType.IDENTIFIER, f"Expect {kind} name.")
-        self.consume(TokenType.LEFT_PAREN, f"Expect '(' after {kind} name.")
+        self.expect(TokenType.LEFT_PAREN, f"Expect '(' after {kind} name.")
         parameters = []
         if not self.check(TokenType.RIGHT_PAREN):
             while True:
@@ -61,8 +124,8 @@ class Parser:
                 parameters.append(self.consume(TokenType.IDENTIFIER, "Expect parameter name."))
                 if not self.match(TokenType.COMMA):
                     break
-        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
-        self.consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body")
+        self.expect(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
+        self.expect(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body")
         body = self.block()
         return stmt.Function(name, parameters, body)
 
@@ -137,13 +200,13 @@ class Parser:
         if not self.check(TokenType.SEMICOLON):
             value = self.expression()
         
-        self.consume(TokenType.SEMICOLON, "Expect ';' after return value.")
+        self.expect(TokenType.SEMICOLON, "Expect ';' after return value.")
         return stmt.Return(keyword, value)
 
     def while_statement(self) -> stmt.Stmt:
-        self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
+        self.expect(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
         condition = self.expression()
-        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
+        self.expect(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
         body = self.statement()
 
         return stmt.While(condition, body)
@@ -151,7 +214,7 @@ class Parser:
     def for_statement(self) -> stmt.Stmt:
         """This parses the `for` syntax into a while loop AST"""
 
-        self.consume(TokenType.LEFT_PAREN, "Expected '(' after 'if'.")
+        self.expect(TokenType.LEFT_PAREN, "Expected '(' after 'if'.")
         if self.match(TokenType.SEMICOLON):
             initializer = None
         elif self.match(TokenType.VAR):
@@ -163,13 +226,13 @@ class Parser:
         if not self.check(TokenType.SEMICOLON):
             condition = self.expression()
         
-        self.consume(TokenType.SEMICOLON, "Expected ';' after loop condition.")
+        self.expect(TokenType.SEMICOLON, "Expected ';' after loop condition.")
 
         increment = None
         if not self.check(TokenType.RIGHT_PAREN):
             increment = self.expression()
         
-        self.consume(TokenType.RIGHT_PAREN, "Expected ')' after for clauses.")
+        self.expect(TokenType.RIGHT_PAREN, "Expected ')' after for clauses.")
 
         body = self.statement()
 
@@ -184,9 +247,9 @@ class Parser:
         return body
 
     def if_statement(self) -> stmt.Stmt:
-        self.consume(TokenType.LEFT_PAREN, "Expected '(' after 'if'.")
+        self.expect(TokenType.LEFT_PAREN, "Expected '(' after 'if'.")
         condition = self.expression()
-        self.consume(TokenType.RIGHT_PAREN, "Expected ')' after if condition.")
+        self.expect(TokenType.RIGHT_PAREN, "Expected ')' after if condition.")
         then_branch = self.statement()
         else_branch = None
         if self.match(TokenType.ELSE):
@@ -198,23 +261,23 @@ class Parser:
         statements = []
         while not self.check(TokenType.RIGHT_BRACE) and not self.is_at_end():
             statements.append(self.declaration())
-        self.consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
+        self.expect(TokenType.RIGHT_BRACE, "Expect '}' after block.")
         return statements
 
     def print_statement(self) -> stmt.Stmt:
         value = self.expression()
-        self.consume(TokenType.SEMICOLON, "Expect ';' after value.")
+        self.expect(TokenType.SEMICOLON, "Expect ';' after value.")
         return stmt.Print(value)
 
     def assert_statement(self) -> stmt.Stmt:
         assert_token = self.previous() # need this to report the line number
         value = self.expression()
-        self.consume(TokenType.SEMICOLON, "Expect ';' after expression.")
+        self.expect(TokenType.SEMICOLON, "Expect ';' after expression.")
         return stmt.Assert(assert_token, value)
 
     def expression_statement(self) -> stmt.Stmt:
         expression = self.expression()
-        self.consume(TokenType.SEMICOLON, "Expect ';' after expression.")
+        self.expect(TokenType.SEMICOLON, "Expect ';' after expression.")
         return stmt.Expression(expression)
 
     def var_declaration(self) -> stmt.Var:
@@ -223,7 +286,7 @@ class Parser:
         if self.match(TokenType.EQUAL):
             initializer = self.expression()
         
-        self.consume(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
+        self.expect(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
         return stmt.Var(name, initializer)
 
     def comparison(self) -> expr.Expr:
@@ -244,7 +307,7 @@ class Parser:
 
         for t in types:
             if self.check(t):
-                self.advance()
+                self.current += 1
                 return True
 
         return False
@@ -272,12 +335,15 @@ class Parser:
 
     def unary(self):
 
-        if self.match(TokenType.BANG, TokenType.MINUS):
-            operator = self.previous()
-            right = self.unary()
-            return expr.Unary(operator, right)
+        # a loop rather than recursion, so long runs of `!` or `-` can't overflow python's stack
+        operators = []
+        while self.match(TokenType.BANG, TokenType.MINUS):
+            operators.append(self.previous())
 
-        return self.call()
+        expression = self.call()
+        for operator in reversed(operators):
+            expression = expr.Unary(operator, expression)
+        return expression
 
 
     def primary(self) -> Token:
@@ -294,7 +360,7 @@ class Parser:
 
         if self.match(TokenType.SUPER):
             keyword = self.previous()
-            self.consume(TokenType.DOT, "Expect '.' after 'super'.")
+            self.expect(TokenType.DOT, "Expect '.' after 'super'.")
             method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name.")
             return expr.Super(keyword, method)
 
@@ -306,7 +372,7 @@ class Parser:
 
         if self.match(TokenType.LEFT_PAREN):
             expression = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+            self.expect(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
             return expr.Grouping(expression)
 
         raise self.error(self.peek(), "Expect expression.")
@@ -344,7 +410,7 @@ class Parser:
     def check(self, t: TokenType) -> bool:
         if self.is_at_end():
             return False
-        return self.peek().type == t
+        return self.types[self.current] == t
 
     def advance(self) -> Token:
         if not self.is_at_end():
@@ -352,7 +418,7 @@ class Parser:
         return self.previous()
 
     def is_at_end(self) -> bool:
-        return self.peek().type == TokenType.EOF
+        return self.types[self.current] == TokenType.EOF
 
     def peek(self) -> Token:
         return self.tokens[self.current]
@@ -367,6 +433,15 @@ class Parser:
 
         raise self.error(self.peek(), message)
 
+    def expect(self, t: TokenType, message: str) -> None:
+        """Like `consume`, for tokens the tree doesn't keep"""
+
+        if self.check(t):
+            self.current += 1
+            return
+
+        raise self.error(self.peek(), message)
+
     def error(self, token: Token, message: str) -> None:
         if token.type == TokenType.EOF:
             self.runtime.report(token.line, "at end", message)
@@ -377,9 +452,9 @@ class Parser:
     def synchronize(self):
         self.advance()
         while not self.is_at_end():
-            if self.previous().type == TokenType.SEMICOLON:
+            if self.types[self.current - 1] == TokenType.SEMICOLON:
                 return
-            if self.peek().type in KEYWORDS:
+            if self.types[self.current] in KEYWORDS:
                 return
 
             self.advance()
@@ -0,0 +1,332 @@
+from pylox import stmt
+from pylox.interpreter import Interpreter
+from pylox.tracing import SCRIPT, first_line
+
+import collections
+import sys
+import threading
+import time
+from types import FrameType
+from typing import DefaultDict, Dict, List, Optional, TextIO, Tuple
+
+# How often SamplingProfiler samples by default, in seconds. The timer thread
+# has to take the GIL from the program to sample it, which python only hands
+# over every sys.getswitchinterval() (5ms by default), so sampling more often
+# mostly just adds overhead.
+SAMPLE_INTERVAL = 0.005
+
+
+class Stats:
+
+    # What a profile found for one Lox function or line. Inclusive time counts
+    # everything run from inside it, exclusive time only what ran in it
+    # directly. `count` is the number of calls to a function, or the number of
+    # times a line ran (deterministic) or was sampled (sampling).
+
+    __slots__ = ("count", "inclusive", "exclusive")
+
+    def __init__(self):
+        self.count = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class Profiler:
+
+    # Profiles a program run by the tree-walking Interpreter, per Lox function
+    # and per line. As the Interpreter's call hooks, LoxFunction.call_in calls
+    # `enter` and `exit` around every call, and `replace` when a tail call
+    # takes a call's place, to keep a shadow stack of the Lox functions
+    # running. Subclasses work out where the time goes from that stack and the
+    # statements being executed.
+
+    mode = ""
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        # the declarations of the running Lox functions, innermost last
+        self.stack: List[stmt.Function] = []
+        self.functions: Dict[str, Stats] = {SCRIPT: Stats()}
+        self.lines: Dict[int, Stats] = {}
+        # time by the stack of functions it was spent in, for flame graphs
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        self.labels: Dict[stmt.Function, str] = {}
+        self.statement_lines: Dict[stmt.Stmt, Optional[int]] = {}
+        self.elapsed = 0.0
+
+    def label(self, declaration: stmt.Function) -> str:
+        label = self.labels.get(declaration)
+        if label is None:
+            label = self.labels[declaration] = f"{declaration.name.lexeme}:{declaration.name.line}"
+            self.functions[label] = Stats()
+        return label
+
+    def line(self, statement: stmt.Stmt) -> Optional[int]:
+        if statement not in self.statement_lines:
+            self.statement_lines[statement] = first_line(statement)
+        return self.statement_lines[statement]
+
+    def start(self) -> None:
+        self.interpreter.call_hooks = self
+        self.started = time.perf_counter()
+
+    def stop(self) -> None:
+        self.elapsed = time.perf_counter() - self.started
+        self.interpreter.call_hooks = None
+        self.functions[SCRIPT].count = 1
+        self.functions[SCRIPT].inclusive = self.elapsed
+
+    def enter(self, function, arguments) -> None:
+        self.stack.append(function.declaration)
+
+    def replace(self, function, arguments) -> None:
+        self.stack[-1] = function.declaration
+
+    def exit(self, value) -> None:
+        self.stack.pop()
+
+    def describe(self) -> str:
+        return self.mode
+
+    def report(self, out: TextIO, limit: int = 20) -> None:
+        """Writes the hottest functions and lines, by exclusive time"""
+
+        out.write(f"Profile ({self.describe()}), {self.elapsed:.3f}s in total\n\n")
+        self.write_table(out, "function", self.functions.items(), limit)
+        out.write("\n")
+        self.write_table(out, "line", ((f"line {line}", stats) for line, stats in self.lines.items()), limit)
+
+    def write_table(self, out: TextIO, name: str, rows, limit: int) -> None:
+        total = self.elapsed or 1.0
+        rows = sorted(rows, key=lambda row: row[1].exclusive, reverse=True)[:limit]
+        width = max([len(name)] + [len(label) for label, _ in rows])
+
+        count = "calls" if name == "function" else self.line_count
+        out.write(f"{name:<{width}}  {count:>9}  {'inclusive':>17}  {'exclusive':>17}\n")
+        for label, stats in rows:
+            out.write(
+                f"{label:<{width}}  {stats.count:>9}"
+                f"  {stats.inclusive:>9.4f}s {100 * stats.inclusive / total:>5.1f}%"
+                f"  {stats.exclusive:>9.4f}s {100 * stats.exclusive / total:>5.1f}%\n"
+            )
+
+    def write_collapsed(self, out: TextIO) -> None:
+        """Writes the time in each stack of functions, in microseconds, as flamegraph.pl reads it"""
+
+        for stack, seconds in sorted(self.stacks.items()):
+            microseconds = round(seconds * 1_000_000)
+            if microseconds:
+                out.write(f"{';'.join(stack)} {microseconds}\n")
+
+
+class SamplingProfiler(Profiler):
+
+    # Samples the running program from a timer thread every `interval`
+    # seconds. The main thread only keeps the shadow stack and counts calls,
+    # and each sample records that stack along with the lines of the
+    # statements python's own stack shows Interpreter.execute running. The
+    # samples are only added up into times per function and line once the
+    # profile stops, to keep the time each one takes from the program down.
+
+    mode = "sampling"
+    line_count = "samples"
+
+    def __init__(self, interpreter: Interpreter, interval: float = SAMPLE_INTERVAL):
+        super().__init__(interpreter)
+        self.interval = interval
+        self.samples = 0
+        self.calls: DefaultDict[stmt.Function, int] = collections.defaultdict(int)
+        # time by the stack of function declarations it was sampled in
+        self.sampled_stacks: DefaultDict[Tuple[stmt.Function, ...], float] = collections.defaultdict(float)
+        # [samples, time] by the lines of the statements running, innermost first
+        self.sampled_lines: Dict[Tuple[int, ...], List[float]] = {}
+        # the lines running from each Interpreter.execute frame seen in
+        # python's stack outwards, so each sample only has to look at the
+        # frames that started since the one before
+        self.frame_lines: Dict[FrameType, Tuple[int, ...]] = {}
+        self.stopping = threading.Event()
+
+    def describe(self) -> str:
+        return f"sampling, {self.samples} samples every {1000 * self.interval:g}ms"
+
+    # enter, replace and exit run for every Lox call, so do as little as they can
+
+    def enter(self, function, arguments) -> None:
+        declaration = function.declaration
+        self.stack.append(declaration)
+        self.calls[declaration] += 1
+
+    def replace(self, function, arguments) -> None:
+        declaration = function.declaration
+        self.stack[-1] = declaration
+        self.calls[declaration] += 1
+
+    def start(self) -> None:
+        self.thread_id = threading.get_ident()
+        self.sampler = threading.Thread(target=self.sample_until_stopped, name="pylox-profiler", daemon=True)
+        super().start()
+        self.sampler.start()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.sampler.join()
+        super().stop()
+        self.frame_lines.clear()
+
+        for declarations, weight in self.sampled_stacks.items():
+            stack = (SCRIPT,) + tuple(map(self.label, declarations))
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + weight
+            for label in set(stack[1:]):
+                self.functions[label].inclusive += weight
+            self.functions[stack[-1]].exclusive += weight
+        for declaration, calls in self.calls.items():
+            self.functions[self.label(declaration)].count = calls
+
+        for lines, (samples, weight) in self.sampled_lines.items():
+            for line in set(lines):
+                stats = self.lines.get(line)
+                if stats is None:
+                    stats = self.lines[line] = Stats()
+                stats.count += samples
+                stats.inclusive += weight
+            if lines:
+                self.lines[lines[0]].exclusive += weight
+
+    def sample_until_stopped(self) -> None:
+        last = time.perf_counter()
+        while not self.stopping.wait(self.interval):
+            now = time.perf_counter()
+            self.sample(now - last)
+            last = now
+
+    def sample(self, weight: float) -> None:
+        self.samples += 1
+        self.sampled_stacks[tuple(self.stack)] += weight
+
+        # python frames newer than the innermost one seen before, which are
+        # the only ones whose lines aren't known yet
+        frame_lines = self.frame_lines
+        started = []
+        frame = sys._current_frames().get(self.thread_id)
+        while frame is not None and frame not in frame_lines:
+            if frame.f_code is EXECUTE:
+                started.append(frame)
+            frame = frame.f_back
+        lines = frame_lines[frame] if frame is not None else ()
+
+        if len(frame_lines) > 4 * len(started) + 10_000:
+            # forget the frames that have finished since they were seen
+            frame_lines.clear()
+        for frame in reversed(started):
+            line = self.line(frame.f_locals["statement"])
+            if line is not None:
+                lines = (line,) + lines
+            frame_lines[frame] = lines
+
+        entry = self.sampled_lines.get(lines)
+        if entry is None:
+            entry = self.sampled_lines[lines] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += weight
+
+
+class DeterministicProfiler(Profiler):
+
+    # Times every Lox call and every statement the Interpreter executes, so
+    # counts and times are exact but the program runs several times slower.
+    # Statements are timed by standing in for the Interpreter's `execute`.
+
+    mode = "deterministic"
+    line_count = "runs"
+
+    def __init__(self, interpreter: Interpreter):
+        super().__init__(interpreter)
+        # per running call: when it started and how long its callees took
+        self.frames: List[List[float]] = []
+        # per running statement: its line, when it started and how long nested statements took
+        self.statements: List[Tuple[Optional[int], float, List[float]]] = []
+        self.active_functions: Dict[str, int] = {}
+        self.active_lines: Dict[int, int] = {}
+        # time spent in calls made from the top level of the script
+        self.in_functions = 0.0
+
+    def start(self) -> None:
+        super().start()
+        self.interpreter.execute = self.execute
+
+    def stop(self) -> None:
+        del self.interpreter.execute
+        super().stop()
+        self.functions[SCRIPT].exclusive = self.elapsed - self.in_functions
+        self.stacks[(SCRIPT,)] = self.elapsed - self.in_functions
+
+    def enter(self, function, arguments) -> None:
+        label = self.label(function.declaration)
+        self.stack.append(function.declaration)
+        self.functions[label].count += 1
+        self.active_functions[label] = self.active_functions.get(label, 0) + 1
+        self.frames.append([time.perf_counter(), 0.0])
+
+    def replace(self, function, arguments) -> None:
+        self.exit(None)
+        self.enter(function, arguments)
+
+    def exit(self, value) -> None:
+        now = time.perf_counter()
+        started, callees = self.frames.pop()
+        elapsed = now - started
+        if self.frames:
+            self.frames[-1][1] += elapsed
+        else:
+            self.in_functions += elapsed
+
+        stack = (SCRIPT,) + tuple(self.label(declaration) for declaration in self.stack)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - callees
+
+        label = stack[-1]
+        self.stack.pop()
+        stats = self.functions[label]
+        stats.exclusive += elapsed - callees
+        self.active_functions[label] -= 1
+        # a recursive call's time is already part of the outermost call's
+        if not self.active_functions[label]:
+            stats.inclusive += elapsed
+
+    def execute(self, statement: stmt.Stmt):
+        line = self.line(statement)
+        if line is None and self.statements:
+            # statements without tokens of their own, like `print 1;`, count
+            # towards the statement they're in
+            line = self.statements[-1][0]
+        if line is not None:
+            self.active_lines[line] = self.active_lines.get(line, 0) + 1
+
+        nested = [0.0]
+        self.statements.append((line, time.perf_counter(), nested))
+        try:
+            return statement.accept(self.interpreter)
+        finally:
+            _, started, _ = self.statements.pop()
+            elapsed = time.perf_counter() - started
+            if self.statements:
+                self.statements[-1][2][0] += elapsed
+
+            if line is not None:
+                stats = self.lines.get(line)
+                if stats is None:
+                    stats = self.lines[line] = Stats()
+                stats.count += 1
+                stats.exclusive += elapsed - nested[0]
+                self.active_lines[line] -= 1
+                if not self.active_lines[line]:
+                    stats.inclusive += elapsed
+
+
+EXECUTE = Interpreter.execute.__code__
+
+# Profilers selectable with `pylox --profile --profile-mode=<mode>` (lox.py
+# lists the same modes, so it only imports this module when profiling)
+PROFILERS = {
+    "sampling": SamplingProfiler,
+    "deterministic": DeterministicProfiler,
+}
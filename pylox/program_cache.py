@@ -0,0 +1,132 @@
+import gc
+import hashlib
+import os
+import pickle
+from typing import Any, List, Optional, Tuple, Union
+
+from pylox import __version__
+from pylox import expr, stmt
+from pylox.counted_loop import CountedLoop
+
+# Where cached programs are kept, next to the scripts they were compiled from
+CACHE_DIR = "__pyloxcache__"
+
+# Bumped whenever the Resolver lays scopes out differently, since the cached
+# annotations hold its depths and slots
+CACHE_FORMAT = 2
+
+# How much of a script is hashed at a time
+HASH_CHUNK_SIZE = 1 << 16
+
+# A call the Resolver made to the engine, as the name of the hook and its arguments
+Annotation = Tuple[str, Tuple[Any, ...]]
+
+
+class Annotations:
+
+    # Passes the Resolver's calls through to an engine, if given one, keeping
+    # a record of them so they can be made again on a program loaded from the
+    # cache. The record is kept rather than any engine's own tables, so one
+    # cached program serves every engine.
+
+    def __init__(self, interpreter=None):
+        self.interpreter = interpreter
+        self.calls: List[Annotation] = []
+
+    def record(self, name: str, *arguments) -> None:
+        self.calls.append((name, arguments))
+        if self.interpreter is not None:
+            getattr(self.interpreter, name)(*arguments)
+
+    def resolve(self, expression: expr.Expr, depth: int, slot: int) -> None:
+        self.record("resolve", expression, depth, slot)
+
+    def resolve_tail_call(self, expression: expr.Call) -> None:
+        self.record("resolve_tail_call", expression)
+
+    def resolve_counted_loop(self, loop: CountedLoop) -> None:
+        self.record("resolve_counted_loop", loop)
+
+    def resolve_empty_scope(self, node: Union[stmt.Block, stmt.Function]) -> None:
+        self.record("resolve_empty_scope", node)
+
+
+def replay(calls: List[Annotation], interpreter) -> None:
+    for name, arguments in calls:
+        getattr(interpreter, name)(*arguments)
+
+
+class ProgramCache:
+
+    # The cached program for one script: its resolved (and, with -O,
+    # optimized) syntax tree and the Resolver's annotations, pickled together
+    # so the annotations refer to the same nodes when they're loaded. Each
+    # entry starts with a header naming the pylox version and cache format,
+    # whether the program was optimized and the hash of the script it came
+    # from, and is only used if they all match. Like __pycache__, entries are
+    # trusted: anyone who can write to the cache directory can run code
+    # through it.
+
+    def __init__(self, script_path: str, optimize: bool):
+        directory, name = os.path.split(os.path.abspath(script_path))
+        self.path = os.path.join(directory, CACHE_DIR, name + ".pickle")
+
+        # read in chunks, since hashlib.file_digest needs python 3.11
+        sha256 = hashlib.sha256()
+        with open(script_path, "rb") as ifp:
+            while chunk := ifp.read(HASH_CHUNK_SIZE):
+                sha256.update(chunk)
+        self.header = f"pylox {__version__}.{CACHE_FORMAT} {'O' if optimize else '-'} {sha256.hexdigest()}\n".encode()
+
+    def load(self) -> Optional[Tuple[List[stmt.Stmt], List[Annotation]]]:
+        """Returns the cached program, or None if there's no valid entry for the script"""
+
+        try:
+            with open(self.path, "rb") as ifp:
+                data = ifp.read()
+        except OSError:
+            return None
+
+        if not data.startswith(self.header):
+            return None
+        # Loading creates a node for every expression and statement, and with
+        # the cycle collector running it keeps rescanning them all on the way
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            statements, calls = pickle.loads(memoryview(data)[len(self.header):])
+        except Exception:
+            # truncated or otherwise corrupt, so it's compiled and written again
+            return None
+        finally:
+            if collecting:
+                gc.enable()
+        return statements, calls
+
+    def store(self, statements: List[stmt.Stmt], calls: List[Annotation]) -> None:
+        # as in load, nothing pickling creates is garbage, so the collector is kept out of it
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            data = pickle.dumps((statements, calls), pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # too deeply nested to pickle, the program just isn't cached
+            return
+        finally:
+            if collecting:
+                gc.enable()
+
+        # written to a temporary file first so a concurrent run never reads
+        # half an entry, and skipped if the directory isn't writable
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, "wb") as ofp:
+                ofp.write(self.header)
+                ofp.write(data)
+            os.replace(temporary, self.path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
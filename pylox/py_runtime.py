@@ -0,0 +1,170 @@
+# Runtime support for programs produced by pylox/transpiler.py. The generated
+# python code inlines the common cases (numeric checks, truthiness, calls to
+# plain functions) and falls back to these helpers for everything else.
+
+from pylox.exceptions import LoxRuntimeError, LoxAssertionError
+from pylox.lox_callable import LoxCallable
+from pylox.token import Token
+
+from types import FunctionType
+from typing import Dict
+
+
+class Class:
+
+    def __init__(self, name: str, superclass: 'Class', methods: Dict[str, FunctionType]):
+        self.name = name
+        self.superclass = superclass
+
+        # copy-down inheritance: methods can't change after the class is declared,
+        # so a single flat table is enough for every lookup
+        self.methods = {}
+        if superclass is not None:
+            self.methods.update(superclass.methods)
+        self.methods.update(methods)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Instance:
+
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: Class):
+        self.klass = klass
+        self.fields = {}
+
+    def __str__(self) -> str:
+        return self.klass.name + " instance"
+
+
+class BoundMethod:
+
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: Instance, method: FunctionType):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self) -> str:
+        return stringify(self.method)
+
+
+# Lox functions are plain python functions named `<lox name>_<n>`
+def function_name(function: FunctionType) -> str:
+    return function.__name__.rsplit("_", 1)[0]
+
+
+def stringify(value: object) -> str:
+    if type(value) is FunctionType:
+        return f"< fn {function_name(value)} >"
+    return str(value)
+
+
+def operands_error(operator: Token):
+    raise LoxRuntimeError(operator, "Operands must be numbers.")
+
+
+def operand_error(operator: Token):
+    raise LoxRuntimeError(operator, "Operand must be a numbers.")
+
+
+def plus_error(operator: Token):
+    raise LoxRuntimeError(operator, "Runtime Error: Operands must be two numbers or two strings")
+
+
+def divide_by_zero(operator: Token):
+    raise LoxRuntimeError(operator, "Runtime Error: Cannot Divide by zero.")
+
+
+def modulo_by_zero(operator: Token):
+    raise LoxRuntimeError(operator, "Runtime Error: Cannot Modulo by zero.")
+
+
+def undefined_variable(name: Token):
+    raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+
+
+def assertion_failed(line: int):
+    raise LoxAssertionError(line, "Assertion Error")
+
+
+def assign_global(global_values: dict, name: Token, value: object) -> object:
+    if name.lexeme not in global_values:
+        undefined_variable(name)
+    global_values[name.lexeme] = value
+    return value
+
+
+def set_cell(cell: list, value: object) -> object:
+    cell[0] = value
+    return value
+
+
+def get_property(obj: object, name: str, token: Token) -> object:
+    if type(obj) is not Instance:
+        raise LoxRuntimeError(token, "Only class instances have properties.")
+    if name in obj.fields:
+        return obj.fields[name]
+    method = obj.klass.methods.get(name)
+    if method is None:
+        raise LoxRuntimeError(token, f"Undefined property {name}.")
+    return BoundMethod(obj, method)
+
+
+def check_instance(obj: object, token: Token) -> Instance:
+    if type(obj) is not Instance:
+        raise LoxRuntimeError(token, "Only instances have fields.")
+    return obj
+
+
+def set_property(obj: Instance, name: str, value: object) -> object:
+    obj.fields[name] = value
+    return value
+
+
+def check_superclass(superclass: object, token: Token) -> Class:
+    if type(superclass) is not Class:
+        raise LoxRuntimeError(token, "Superclass must be a class.")
+    return superclass
+
+
+def super_method(superclass: Class, receiver: Instance, name: str, token: Token) -> BoundMethod:
+    method = superclass.methods.get(name)
+    if method is None:
+        raise LoxRuntimeError(token, f"Undefined property {name}.")
+    return BoundMethod(receiver, method)
+
+
+def check_arity(paren: Token, arity: int, arguments: tuple) -> None:
+    if len(arguments) != arity:
+        raise LoxRuntimeError(paren, f"Expected {arity} arguments but got {len(arguments)}.")
+
+
+def call(paren: Token, callee: object, *arguments) -> object:
+    if type(callee) is FunctionType:
+        check_arity(paren, callee.__code__.co_argcount, arguments)
+        return callee(*arguments)
+
+    if type(callee) is BoundMethod:
+        method = callee.method
+        check_arity(paren, method.__code__.co_argcount - 1, arguments)
+        return method(callee.receiver, *arguments)
+
+    if type(callee) is Class:
+        instance = Instance(callee)
+        initializer = callee.methods.get("init")
+        if initializer is None:
+            check_arity(paren, 0, arguments)
+        else:
+            check_arity(paren, initializer.__code__.co_argcount - 1, arguments)
+            initializer(instance, *arguments)
+        return instance
+
+    if isinstance(callee, LoxCallable):
+        check_arity(paren, callee.arity(), arguments)
+        # native functions don't have an interpreter to call back into
+        return callee.call(None, list(arguments))
+
+    raise LoxRuntimeError(paren, "Can only call functions and classes.")
@@ -1,5 +1,6 @@
 from pylox import expr, stmt
 from pylox.token import Token
+from pylox.counted_loop import CountedLoop
 from enum import Enum, auto
 
 from typing import Union, List
@@ -17,19 +18,45 @@ class ClassType(Enum):
     CLASS = auto()
     SUBCLASS = auto()
 
+def declares_names(statements: List[stmt.Stmt]) -> bool:
+    """Whether a block or function body declares anything in its own scope"""
+    return any(isinstance(statement, (stmt.Var, stmt.Function, stmt.Class)) for statement in statements)
+
+
 class Resolver(expr.Visitor, stmt.Visitor):
 
     def __init__(self, interpreter, runtime):
         self.interpreter = interpreter
         self.runtime = runtime
         self.scopes = []
+        # parallel to `scopes`: the slot each local occupies in its Environment
+        self.slots = []
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
+        # counted `for` loops being resolved, see CountedLoop
+        self.counted_loops = []
+        # subexpressions still to be resolved, see resolve_expression
+        self.pending: List[expr.Expr] = []
 
     def visit_block_stmt(self, statement: stmt.Block) -> None:
-        self.begin_scope()
-        self.resolve(statement.statements)
-        self.end_scope()
+        loop = CountedLoop.match(statement)
+        if loop is not None:
+            self.counted_loops.append(loop)
+
+        # A block that declares nothing doesn't get a scope, so the engines
+        # can run it in the enclosing Environment instead of allocating one
+        if declares_names(statement.statements):
+            self.begin_scope()
+            self.resolve(statement.statements)
+            self.end_scope()
+        else:
+            self.interpreter.resolve_empty_scope(statement)
+            self.resolve(statement.statements)
+
+        if loop is not None:
+            self.counted_loops.pop()
+            if loop.eligible:
+                self.interpreter.resolve_counted_loop(loop)
     
     # Since python doesn't have function overloading we have to merge a few jlox 
     # functions into one here. TODO: Clean this up and improve readability
@@ -39,14 +66,34 @@ class Resolver(expr.Visitor, stmt.Visitor):
             for statement in expression:
                 self.resolve(statement)
 
+        elif isinstance(expression, expr.Expr):
+            self.resolve_expression(expression)
+
         else:
             expression.accept(self)
-        
+
+    def resolve_expression(self, expression: expr.Expr) -> None:
+        # Expressions can nest far deeper than statements (a chain of `+` is as
+        # deep as it is long), so they're resolved from a work list rather than
+        # by recursing: visiting one only adds its subexpressions to `pending`.
+        # None of them opens a scope, so the order they're visited in only
+        # matters for the order errors are reported in.
+        pending = self.pending
+        pending.append(expression)
+        while pending:
+            pending.pop().accept(self)
+
+    def resolve_later(self, *expressions: expr.Expr) -> None:
+        # pushed in reverse, so they're still resolved left to right
+        self.pending.extend(reversed(expressions))
+
     def begin_scope(self):
         self.scopes.append({})
+        self.slots.append({})
 
     def end_scope(self):
         self.scopes.pop()
+        self.slots.pop()
 
     def visit_var_stmt(self, statement: stmt.Var):
         self.declare(statement.name)
@@ -63,28 +110,49 @@ class Resolver(expr.Visitor, stmt.Visitor):
     def resolve_local(self, expression: expr.Expr, name: Token) -> None:
         for i in range(len(self.scopes)-1, -1, -1):
             if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(expression, len(self.scopes)-1-i)
+                self.interpreter.resolve(expression, len(self.scopes)-1-i, self.slots[i][name.lexeme])
                 return
 
     def visit_assign_expr(self, expression: expr.Assign) -> None:
-        self.resolve(expression.value)
+        self.resolve_later(expression.value)
         self.resolve_local(expression, expression.name)
 
+        for loop in self.counted_loops:
+            if expression.name.lexeme == loop.name.lexeme and expression is not loop.increment:
+                loop.eligible = False
+
     def visit_function_stmt(self, statement: stmt.Function) -> None:
+        self.capture_counted_loops()
         self.declare(statement.name)
         self.define(statement.name)
         self.resolve_function(statement, FunctionType.FUNCTION)
 
+    def capture_counted_loops(self) -> None:
+        # functions and methods declared in a loop's body could capture its
+        # counter or body scope, so those loops have to run normally
+        for loop in self.counted_loops:
+            loop.eligible = False
+
     def resolve_function(self, function: stmt.Function, function_type: FunctionType):
         enclosing_function = self.current_function
         self.current_function = function_type
         
-        self.begin_scope()
-        for param in function.params:
-            self.declare(param)
-            self.define(param)
-        self.resolve(function.body)
-        self.end_scope()
+        is_method = function_type in (FunctionType.METHOD, FunctionType.INITIALIZER)
+        if is_method or function.params or declares_names(function.body):
+            self.begin_scope()
+            if is_method:
+                # `this` is bound straight into the method's own scope, in the
+                # slot before its parameters, rather than one around it
+                self.scopes[-1]["this"] = True
+                self.slots[-1]["this"] = 0
+            for param in function.params:
+                self.declare(param)
+                self.define(param)
+            self.resolve(function.body)
+            self.end_scope()
+        else:
+            self.interpreter.resolve_empty_scope(function)
+            self.resolve(function.body)
         self.current_function = enclosing_function
 
     def visit_expression_stmt(self, statement: stmt.Expression) -> None:
@@ -111,7 +179,11 @@ class Resolver(expr.Visitor, stmt.Visitor):
                 self.runtime.error(statement.keyword.line, "Can't return a value from an initialzier.")
             self.resolve(statement.value)
 
+            if isinstance(statement.value, expr.Call):
+                self.interpreter.resolve_tail_call(statement.value)
+
     def visit_class_stmt(self, statement: stmt.Class) -> None:
+        self.capture_counted_loops()
         enclosing_class = self.current_class
         self.current_class = ClassType.CLASS
         
@@ -121,15 +193,13 @@ class Resolver(expr.Visitor, stmt.Visitor):
         if statement.superclass is not None:
             self.current_class = ClassType.SUBCLASS
             if statement.name.lexeme == statement.superclass.name.lexeme:
-                self.runtime.error(statement.superclass.name, "A class can't inherit from itself")
+                self.runtime.error(statement.superclass.name.line, "A class can't inherit from itself")
             self.resolve(statement.superclass)
 
         if statement.superclass is not None:
             self.begin_scope()
             self.scopes[-1]["super"] = True
-
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
+            self.slots[-1]["super"] = 0
 
         for method in statement.methods:
             declaration = FunctionType.METHOD
@@ -140,23 +210,21 @@ class Resolver(expr.Visitor, stmt.Visitor):
         if statement.superclass is not None:
             self.end_scope()
 
-        self.end_scope()
         self.current_class = enclosing_class
 
     def visit_super_expr(self, expression: expr.Super) -> None:
         if self.current_class == ClassType.NONE:
-            self.runtime.error(expression.keyword, "Can't use 'super' outside of a class.")
+            self.runtime.error(expression.keyword.line, "Can't use 'super' outside of a class.")
         elif self.current_class != ClassType.SUBCLASS:
-            self.runtime.error(expression.keyword, "Can't use 'super' in a class with no superclass.")
+            self.runtime.error(expression.keyword.line, "Can't use 'super' in a class with no superclass.")
 
         self.resolve_local(expression, expression.keyword)
 
     def visit_get_expr(self, expression: expr.Get) -> None:
-        self.resolve(expression.object)
+        self.resolve_later(expression.object)
 
     def visit_set_expr(self, expression: expr.Set) -> None:
-        self.resolve(expression.value)
-        self.resolve(expression.object)
+        self.resolve_later(expression.value, expression.object)
 
     def visit_this_expr(self, expression: expr.This) -> None:
         
@@ -171,27 +239,22 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve(statement.body)
 
     def visit_binary_expr(self, expression: expr.Binary) -> None:
-        self.resolve(expression.left)
-        self.resolve(expression.right)
+        self.resolve_later(expression.left, expression.right)
 
     def visit_call_expr(self, expression: expr.Call) -> None:
-        self.resolve(expression.callee)
-
-        for argument in expression.arguments:
-            self.resolve(argument)
+        self.resolve_later(expression.callee, *expression.arguments)
 
     def visit_grouping_expr(self, expression: expr.Grouping) -> None:
-        self.resolve(expression.expression)
+        self.resolve_later(expression.expression)
 
     def visit_literal_expr(self, expression: expr.Literal) -> None:
         pass
 
     def visit_logical_expr(self, expression: expr.Logical) -> None:
-        self.resolve(expression.left)
-        self.resolve(expression.right)
+        self.resolve_later(expression.left, expression.right)
 
     def visit_unary_expr(self, expression: expr.Unary) -> None:
-        self.resolve(expression.right)
+        self.resolve_later(expression.right)
 
     def declare(self, name: Token) -> None:
         if not self.scopes:
@@ -199,6 +262,8 @@ class Resolver(expr.Visitor, stmt.Visitor):
         scope = self.scopes[-1]
         if name.lexeme in scope:
             self.runtime.error(name.line, f"Already declared variable {name.lexeme} in this scope.")
+        else:
+            self.slots[-1][name.lexeme] = len(self.slots[-1])
         scope[name.lexeme] = False
 
     def define(self, name: Token) -> None:
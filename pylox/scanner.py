@@ -1,7 +1,10 @@
 from pylox.token_type import TokenType
 from pylox.token import Token
+from pylox.token_store import TokenStore
 
-from typing import List, Union
+import re
+import sys
+from typing import Iterable, Iterator, List, Optional, Union
 
 
 class Scanner:
@@ -43,9 +46,24 @@ class Scanner:
             self.start = self.current
             self.scan_token()
 
-        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        self.start = self.current
+        self.add_token(TokenType.EOF)
         return self.tokens
 
+    def stream_tokens(self) -> Iterator[Token]:
+        """Yields tokens as they're scanned rather than collecting them all"""
+
+        while not self.is_at_end():
+            self.start = self.current
+            self.scan_token()
+            yield from self.tokens
+            self.tokens.clear()
+
+        self.start = self.current
+        self.add_token(TokenType.EOF)
+        yield from self.tokens
+        self.tokens.clear()
+
     def scan_token(self):
         c = self.advance()
         match c:
@@ -114,7 +132,7 @@ class Scanner:
                     self.identifier()
 
                 else:
-                    print(f"Unexpected Character {c} on line {self.line}")
+                    self.lox.unexpected_character(self.line, c)
 
     def match(self, expected) -> bool:
 
@@ -144,8 +162,10 @@ class Scanner:
         while self.is_valid_identifier(self.peek()):
             self.advance()
 
-        text = self.source[self.start : self.current]
-        self.add_token(self.keywords.get(text, TokenType.IDENTIFIER))
+        # names repeat throughout a program, so every token for the same name
+        # shares one string
+        text = sys.intern(self.source[self.start : self.current])
+        self.tokens.append(Token(self.keywords.get(text, TokenType.IDENTIFIER), text, None, self.line))
 
     @staticmethod
     def is_valid_identifier(c: str):
@@ -184,3 +204,225 @@ class Scanner:
         if self.current + 1 > len(self.source):
             return "\0"
         return self.source[self.current + 1]
+
+
+class TokenStoreScanner(Scanner):
+
+    # Scans into a TokenStore instead of a list of Tokens, recording where each
+    # lexeme is in the source rather than slicing it out
+
+    def __init__(self, source, runtime):
+        super().__init__(source, runtime)
+        self.tokens = TokenStore(source)
+
+    def identifier(self) -> None:
+        while self.is_valid_identifier(self.peek()):
+            self.advance()
+
+        text = self.source[self.start : self.current]
+        self.add_token(self.keywords.get(text, TokenType.IDENTIFIER))
+
+    def add_token(
+        self, type: TokenType, literal: Union[float, str, None] = None
+    ) -> None:
+        # literals are parsed from the lexeme again when a Token is built
+        self.tokens.append(type, self.start, self.current - self.start, self.line)
+
+
+def final_matches(matches: Iterator[re.Match], limit: int) -> Iterator[re.Match]:
+    # the matches that end by `limit`, stopping at the first that doesn't
+    for match in matches:
+        if match.end() > limit:
+            return
+        yield match
+
+
+class RegexScanner(Scanner):
+
+    # Produces exactly the same tokens, lines and errors as Scanner, but
+    # matches a whole token at a time with one compiled regular expression
+    # instead of stepping through the source a character at a time. Every
+    # position in the source matches one of the alternatives, with `other`
+    # catching the unexpected characters.
+
+    pattern = re.compile(
+        r"""
+        (?P<identifier>[^\W\d]\w*)
+        | (?P<space>[ \t\r]+)
+        | (?P<newline>\n)
+        | (?P<comment>//[^\n]*)
+        | (?P<operator>[!=<>]=?|[(){},.\-+;*%/])
+        | (?P<number>\d+(?:\.\d+)?)
+        | (?P<string>"[^"]*")
+        | (?P<unterminated>"[^"]*)
+        | (?P<other>.)
+        """,
+        re.VERBOSE,
+    )
+
+    operators = {
+        "(": TokenType.LEFT_PAREN,
+        ")": TokenType.RIGHT_PAREN,
+        "{": TokenType.LEFT_BRACE,
+        "}": TokenType.RIGHT_BRACE,
+        ",": TokenType.COMMA,
+        ".": TokenType.DOT,
+        "-": TokenType.MINUS,
+        "+": TokenType.PLUS,
+        ";": TokenType.SEMICOLON,
+        "*": TokenType.STAR,
+        "%": TokenType.PERCENT,
+        "/": TokenType.SLASH,
+        "!": TokenType.BANG,
+        "!=": TokenType.BANG_EQUAL,
+        "=": TokenType.EQUAL,
+        "==": TokenType.EQUAL_EQUAL,
+        "<": TokenType.LESS,
+        "<=": TokenType.LESS_EQUAL,
+        ">": TokenType.GREATER,
+        ">=": TokenType.GREATER_EQUAL,
+    }
+
+    def scan_tokens(self) -> List[Token]:
+        self.tokens.extend(self.stream_tokens())
+        return self.tokens
+
+    def stream_tokens(self, chunks: Optional[Iterable[str]] = None) -> Iterator[Token]:
+        """Yields tokens as they're matched, from `chunks` of source if given
+
+        A match that ends within two characters of the end of the source read
+        so far could still grow (`1` into `1.5`, `=` into `==`, an unfinished
+        string or comment), so it's matched again once the next chunk arrives.
+        """
+
+        keywords = self.keywords
+        operators = self.operators
+        line = self.line
+
+        if chunks is None:
+            chunks, buffer = iter(()), self.source
+        else:
+            chunks, buffer = iter(chunks), ""
+
+        while True:
+            chunk = next(chunks, None)
+            at_end = chunk is None
+            if not at_end:
+                buffer += chunk
+
+            matches = self.pattern.finditer(buffer)
+            if not at_end:
+                matches = final_matches(matches, len(buffer) - 2)
+
+            match = None
+            for match in matches:
+                kind = match.lastgroup
+                text = match.group()
+
+                if kind == "identifier":
+                    text = sys.intern(text)
+                    yield Token(keywords.get(text, TokenType.IDENTIFIER), text, None, line)
+                elif kind == "operator":
+                    yield Token(operators[text], text, None, line)
+                elif kind == "newline":
+                    line += 1
+                elif kind == "number":
+                    yield Token(TokenType.NUMBER, text, float(text), line)
+                elif kind == "string":
+                    # like Scanner, the token is on the line the string ends on
+                    line += text.count("\n")
+                    yield Token(TokenType.STRING, text, text[1:-1], line)
+                elif kind == "unterminated":
+                    line += text.count("\n")
+                    self.lox.error(line, "unterminated string.")
+                elif kind == "other":
+                    self.lox.unexpected_character(line, text)
+
+            if at_end:
+                break
+            if match is not None:
+                buffer = buffer[match.end():]
+
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
+
+
+class MappedScanner(RegexScanner):
+
+    # Scans the bytes of a memory-mapped file into a TokenStore without ever
+    # decoding the whole file into a str: lexemes are decoded from slices of
+    # the mapping only when the Parser builds their Tokens. Identifiers are
+    # matched as ASCII, so files with other characters outside their strings
+    # and comments are left to the str scanners. Like a file read in text
+    # mode, `\r\n` and `\r` are line breaks.
+
+    pattern = re.compile(
+        rb"""
+        (?P<identifier>[A-Za-z_]\w*)
+        | (?P<space>[ \t]+)
+        | (?P<newline>\r\n?|\n)
+        | (?P<comment>//[^\r\n]*)
+        | (?P<operator>[!=<>]=?|[(){},.\-+;*%/])
+        | (?P<number>\d+(?:\.\d+)?)
+        | (?P<string>"[^"]*")
+        | (?P<unterminated>"[^"]*)
+        | (?P<wide>[\x80-\xff])
+        | (?P<other>.)
+        """,
+        re.VERBOSE,
+    )
+
+    keywords = {text.encode(): type for text, type in Scanner.keywords.items()}
+    operators = {text.encode(): type for text, type in RegexScanner.operators.items()}
+
+    def __init__(self, source: memoryview, runtime):
+        super().__init__(source, runtime)
+        self.tokens = TokenStore(source)
+
+    def scan_tokens(self) -> Optional[TokenStore]:
+        """Returns the file's tokens, or None if it isn't ASCII outside strings and comments"""
+
+        tokens = self.tokens
+        keywords = self.keywords
+        operators = self.operators
+        line = self.line
+        # reported once the whole file is known to be scannable as bytes
+        problems = []
+
+        for match in self.pattern.finditer(self.source):
+            kind = match.lastgroup
+            start, end = match.span()
+
+            if kind == "identifier":
+                tokens.append(keywords.get(match.group(), TokenType.IDENTIFIER), start, end - start, line)
+            elif kind == "operator":
+                tokens.append(operators[match.group()], start, end - start, line)
+            elif kind == "newline":
+                line += 1
+            elif kind == "number":
+                tokens.append(TokenType.NUMBER, start, end - start, line)
+            elif kind == "string":
+                line += line_breaks(match.group())
+                tokens.append(TokenType.STRING, start, end - start, line)
+            elif kind == "unterminated":
+                line += line_breaks(match.group())
+                problems.append((line, None))
+            elif kind == "wide":
+                return None
+            elif kind == "other":
+                problems.append((line, match.group().decode()))
+
+        for problem_line, text in problems:
+            if text is None:
+                self.lox.error(problem_line, "unterminated string.")
+            else:
+                self.lox.unexpected_character(problem_line, text)
+
+        self.line = line
+        self.start = self.current = len(self.source)
+        tokens.append(TokenType.EOF, self.start, 0, line)
+        return tokens
+
+
+def line_breaks(text: bytes) -> int:
+    return text.count(b"\n") + text.count(b"\r") - text.count(b"\r\n")
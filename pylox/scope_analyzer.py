@@ -0,0 +1,226 @@
+from pylox import expr
+from pylox import stmt
+
+from typing import Dict, List, Optional, Set
+
+
+class FunctionInfo:
+
+    def __init__(self, enclosing: Optional['FunctionInfo']):
+        self.enclosing = enclosing
+        # variables from enclosing functions used here (or in nested functions),
+        # these are passed in as keyword-only default arguments
+        self.free: List['Binding'] = []
+
+
+class Binding:
+
+    # A single Lox variable declaration and the python name it's given
+
+    def __init__(self, python_name: str, function: FunctionInfo, kind: str):
+        self.python_name = python_name
+        self.function = function
+        self.kind = kind  # one of "var", "param", "function", "class", "this", "super"
+        self.captured = False
+        self.assigned = False
+        # assigned from a function other than the one that declares it
+        self.assigned_by_closure = False
+        # every expression stored by a `var` declaration or an assignment, with
+        # None standing for a declaration without an initializer
+        self.values: List[Optional[expr.Expr]] = []
+
+    @property
+    def is_cell(self) -> bool:
+        # Captured variables are passed to closures when the closure is created.
+        # That's only safe if the value can't change afterwards, otherwise the
+        # variable is boxed in a single element list.
+        return self.captured and (self.assigned or self.kind in ["function", "class"])
+
+
+class ScopeAnalyzer(expr.Visitor, stmt.Visitor):
+
+    # Works out which declaration each local Lox variable refers to, which
+    # variables are captured or assigned by closures, and which are declared or
+    # assigned inside each loop. Used by the transpiler (Lox has block scoping
+    # and python doesn't, so every local declaration gets its own uniquely named
+    # python variable) and by the optimizer.
+
+    def __init__(self):
+        self.counter = 0
+        self.scopes: List[Dict[str, Binding]] = []
+        self.function = FunctionInfo(None)
+
+        self.references: Dict[expr.Expr, Binding] = {}
+        self.declarations: Dict[stmt.Stmt, Binding] = {}
+        self.params: Dict[stmt.Function, List[Binding]] = {}
+        self.functions: Dict[stmt.Function, FunctionInfo] = {}
+        self.this_bindings: Dict[object, Binding] = {}
+        self.super_bindings: Dict[stmt.Class, Binding] = {}
+
+        self.loops: List[stmt.While] = []
+        self.loop_variables: Dict[stmt.While, Set[Binding]] = {}
+
+    def analyze(self, statements: List[stmt.Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def python_name(self, name: str) -> str:
+        # the numeric suffix keeps names unique and means a Lox identifier can
+        # never clash with a python keyword or one of the runtime helpers
+        # (the optimizer names its temporaries with a `$`, which python doesn't allow)
+        self.counter += 1
+        return f"{name.replace('$', '_')}_{self.counter}"
+
+    def declare(self, name: str, kind: str) -> Optional[Binding]:
+        if not self.scopes:
+            return None  # globals are looked up by name at runtime
+        binding = Binding(self.python_name(name), self.function, kind)
+        self.scopes[-1][name] = binding
+        for loop in self.loops:
+            self.loop_variables[loop].add(binding)
+        return binding
+
+    def reference(self, expression: expr.Expr, name: str) -> Optional[Binding]:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                binding = scope[name]
+                break
+        else:
+            return None
+
+        function = self.function
+        while function is not binding.function:
+            binding.captured = True
+            if binding not in function.free:
+                function.free.append(binding)
+            function = function.enclosing
+
+        self.references[expression] = binding
+        return binding
+
+    def analyze_function(self, declaration: stmt.Function, this_name: Optional[str] = None) -> None:
+        function = FunctionInfo(self.function)
+        self.functions[declaration] = function
+        self.function = function
+
+        if this_name is not None:
+            self.scopes.append({})
+            self.this_bindings[declaration] = self.declare(this_name, "this")
+
+        self.scopes.append({})
+        self.params[declaration] = [self.declare(param.lexeme, "param") for param in declaration.params]
+        for statement in declaration.body:
+            statement.accept(self)
+        self.scopes.pop()
+
+        if this_name is not None:
+            self.scopes.pop()
+
+        self.function = function.enclosing
+
+    def visit_var_stmt(self, statement: stmt.Var) -> None:
+        if statement.initializer is not None:
+            statement.initializer.accept(self)
+        binding = self.declarations[statement] = self.declare(statement.name.lexeme, "var")
+        if binding is not None:
+            binding.values.append(statement.initializer)
+
+    def visit_function_stmt(self, statement: stmt.Function) -> None:
+        self.declarations[statement] = self.declare(statement.name.lexeme, "function")
+        self.analyze_function(statement)
+
+    def visit_class_stmt(self, statement: stmt.Class) -> None:
+        self.declarations[statement] = self.declare(statement.name.lexeme, "class")
+
+        if statement.superclass is not None:
+            statement.superclass.accept(self)
+            self.scopes.append({})
+            self.super_bindings[statement] = self.declare("super", "super")
+
+        for method in statement.methods:
+            self.analyze_function(method, this_name="this")
+
+        if statement.superclass is not None:
+            self.scopes.pop()
+
+    def visit_block_stmt(self, statement: stmt.Block) -> None:
+        self.scopes.append({})
+        for s in statement.statements:
+            s.accept(self)
+        self.scopes.pop()
+
+    def visit_expression_stmt(self, statement: stmt.Expression) -> None:
+        statement.expression.accept(self)
+
+    def visit_print_stmt(self, statement: stmt.Print) -> None:
+        statement.expression.accept(self)
+
+    def visit_assert_stmt(self, statement: stmt.Assert) -> None:
+        statement.expression.accept(self)
+
+    def visit_return_stmt(self, statement: stmt.Return) -> None:
+        if statement.value is not None:
+            statement.value.accept(self)
+
+    def visit_if_stmt(self, statement: stmt.If) -> None:
+        statement.condition.accept(self)
+        statement.then_branch.accept(self)
+        if statement.else_branch is not None:
+            statement.else_branch.accept(self)
+
+    def visit_while_stmt(self, statement: stmt.While) -> None:
+        self.loops.append(statement)
+        self.loop_variables[statement] = set()
+        statement.condition.accept(self)
+        statement.body.accept(self)
+        self.loops.pop()
+
+    def visit_variable_expr(self, expression: expr.Variable) -> None:
+        self.reference(expression, expression.name.lexeme)
+
+    def visit_assign_expr(self, expression: expr.Assign) -> None:
+        expression.value.accept(self)
+        binding = self.reference(expression, expression.name.lexeme)
+        if binding is not None:
+            binding.assigned = True
+            binding.values.append(expression.value)
+            if binding.function is not self.function:
+                binding.assigned_by_closure = True
+            for loop in self.loops:
+                self.loop_variables[loop].add(binding)
+
+    def visit_this_expr(self, expression: expr.This) -> None:
+        self.reference(expression, "this")
+
+    def visit_super_expr(self, expression: expr.Super) -> None:
+        self.reference(expression, "super")
+        self.reference(expression.keyword, "this")
+
+    def visit_binary_expr(self, expression: expr.Binary) -> None:
+        expression.left.accept(self)
+        expression.right.accept(self)
+
+    def visit_logical_expr(self, expression: expr.Logical) -> None:
+        expression.left.accept(self)
+        expression.right.accept(self)
+
+    def visit_unary_expr(self, expression: expr.Unary) -> None:
+        expression.right.accept(self)
+
+    def visit_grouping_expr(self, expression: expr.Grouping) -> None:
+        expression.expression.accept(self)
+
+    def visit_literal_expr(self, expression: expr.Literal) -> None:
+        pass
+
+    def visit_get_expr(self, expression: expr.Get) -> None:
+        expression.object.accept(self)
+
+    def visit_set_expr(self, expression: expr.Set) -> None:
+        expression.object.accept(self)
+        expression.value.accept(self)
+
+    def visit_call_expr(self, expression: expr.Call) -> None:
+        expression.callee.accept(self)
+        for argument in expression.arguments:
+            argument.accept(self)
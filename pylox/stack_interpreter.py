@@ -0,0 +1,427 @@
+from pylox.types import LoxObject
+from pylox.exceptions import LoxRuntimeError, LoxAssertionError
+from pylox.token_type import TokenType
+from pylox.token import Token
+from pylox.environment import Environment, GlobalEnvironment
+from pylox.interpreter import ClockBuiltinFn
+from pylox.lox_callable import LoxCallable
+from pylox.lox_function import LoxFunction
+from pylox.lox_class import LoxClass
+from pylox.lox_instance import LoxInstance
+from pylox.counted_loop import CountedLoop
+
+from pylox import expr
+from pylox import stmt
+
+from typing import List, Optional, Union
+
+# How deep Lox calls can nest before a "Stack overflow." runtime error. Frames
+# live on the heap, so this is only limited by memory, not python's stack.
+MAX_CALL_DEPTH = 100_000
+
+
+class Frame:
+
+    # A Lox call in progress: the instance a method was called on, the
+    # environment to go back to when it returns, and how tall the work stack
+    # was when it started
+
+    __slots__ = ("function", "instance", "environment", "height")
+
+    def __init__(self, function: LoxFunction, instance: Optional[LoxInstance], environment: Environment, height: int):
+        self.function = function
+        self.instance = instance
+        self.environment = environment
+        self.height = height
+
+
+class StackInterpreter(expr.Visitor, stmt.Visitor):
+
+    # Runs the resolved syntax tree like the tree-walking Interpreter, but
+    # without recursing in python. Visiting a node doesn't evaluate it, it
+    # schedules the work for it: the node's children, followed by a step that
+    # combines their results. Steps are `(function, argument)` pairs on the
+    # `work` stack, and expression results are passed between them on the
+    # `values` stack. Lox calls push a Frame, and returning truncates the work
+    # stack back to where the call started.
+
+    def __init__(self, runtime, max_depth: int = MAX_CALL_DEPTH):
+        self.runtime = runtime
+        self.max_depth = max_depth
+        self.globals = GlobalEnvironment()
+        self.environment = self.globals
+        self.locals = {}
+        # blocks and functions that declare nothing, see Resolver.visit_block_stmt
+        self.empty_scopes = set()
+
+        self.work = []
+        self.values = []
+        self.frames: List[Frame] = []
+
+        self.globals.define("clock", ClockBuiltinFn())
+
+    def resolve(self, expression: expr.Expr, depth: int, slot: int) -> None:
+        self.locals[expression] = (depth, slot)
+
+    def resolve_tail_call(self, expression: expr.Call) -> None:
+        # no Lox call recurses in python here, in tail position or not
+        pass
+
+    def resolve_counted_loop(self, loop: CountedLoop) -> None:
+        # only the tree-walking Interpreter has a fast path for these
+        pass
+
+    def resolve_empty_scope(self, node: Union[stmt.Block, stmt.Function]) -> None:
+        self.empty_scopes.add(node)
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        try:
+            for statement in reversed(statements):
+                self.schedule(statement)
+            self.run()
+        except LoxRuntimeError as e:
+            self.reset()
+            self.runtime.runtime_error(e)
+        except LoxAssertionError as e:
+            self.reset()
+            self.runtime.assertion_error(e)
+
+    def run(self) -> None:
+        work = self.work
+        while work:
+            step, argument = work.pop()
+            step(argument)
+
+    def reset(self) -> None:
+        self.work.clear()
+        self.values.clear()
+        self.frames.clear()
+        self.environment = self.globals
+
+    def schedule(self, node) -> None:
+        self.work.append((node.accept, self))
+
+    # Statements
+
+    def visit_expression_stmt(self, statement: stmt.Expression) -> None:
+        self.work.append((self.discard, None))
+        self.schedule(statement.expression)
+
+    def discard(self, _) -> None:
+        self.values.pop()
+
+    def visit_print_stmt(self, statement: stmt.Print) -> None:
+        self.work.append((self.print, None))
+        self.schedule(statement.expression)
+
+    def print(self, _) -> None:
+        print(str(self.values.pop()))
+
+    def visit_assert_stmt(self, statement: stmt.Assert) -> None:
+        self.work.append((self.check_assertion, statement))
+        self.schedule(statement.expression)
+
+    def check_assertion(self, statement: stmt.Assert) -> None:
+        if not self.is_truthy(self.values.pop()):
+            raise LoxAssertionError(statement.assert_token.line, "Assertion Error")
+
+    def visit_var_stmt(self, statement: stmt.Var) -> None:
+        if statement.initializer is None:
+            self.environment.define(statement.name.lexeme, None)
+            return
+        self.work.append((self.define, statement))
+        self.schedule(statement.initializer)
+
+    def define(self, statement: stmt.Var) -> None:
+        self.environment.define(statement.name.lexeme, self.values.pop())
+
+    def visit_block_stmt(self, statement: stmt.Block) -> None:
+        if statement not in self.empty_scopes:
+            self.work.append((self.restore, self.environment))
+            self.environment = Environment(self.environment)
+        for inner in reversed(statement.statements):
+            self.schedule(inner)
+
+    def restore(self, environment: Environment) -> None:
+        self.environment = environment
+
+    def visit_if_stmt(self, statement: stmt.If) -> None:
+        self.work.append((self.branch, statement))
+        self.schedule(statement.condition)
+
+    def branch(self, statement: stmt.If) -> None:
+        if self.is_truthy(self.values.pop()):
+            self.schedule(statement.then_branch)
+        elif statement.else_branch is not None:
+            self.schedule(statement.else_branch)
+
+    def visit_while_stmt(self, statement: stmt.While) -> None:
+        self.work.append((self.loop, statement))
+        self.schedule(statement.condition)
+
+    def loop(self, statement: stmt.While) -> None:
+        if self.is_truthy(self.values.pop()):
+            # check the condition again once the body has run
+            self.schedule(statement)
+            self.schedule(statement.body)
+
+    def visit_function_stmt(self, statement: stmt.Function) -> None:
+        function = LoxFunction(statement, self.environment, False)
+        self.environment.define(statement.name.lexeme, function)
+
+    def visit_class_stmt(self, statement: stmt.Class) -> None:
+        self.work.append((self.define_class, statement))
+        if statement.superclass is not None:
+            self.schedule(statement.superclass)
+        else:
+            self.values.append(None)
+
+    def define_class(self, statement: stmt.Class) -> None:
+        superclass = self.values.pop()
+        if statement.superclass is not None and not isinstance(superclass, LoxClass):
+            raise LoxRuntimeError(statement.superclass.name, "Superclass must be a class.")
+
+        method_environment = self.environment
+        if superclass is not None:
+            method_environment = Environment(self.environment, [superclass])
+
+        methods = {}
+        for method in statement.methods:
+            methods[method.name.lexeme] = LoxFunction(method, method_environment, method.name.lexeme == "init")
+
+        self.environment.define(statement.name.lexeme, LoxClass(statement.name.lexeme, superclass, methods))
+
+    def visit_return_stmt(self, statement: stmt.Return) -> None:
+        self.work.append((self.finish_call, None))
+        if statement.value is not None:
+            self.schedule(statement.value)
+        else:
+            self.values.append(None)
+
+    # Calls
+
+    def visit_call_expr(self, expression: expr.Call) -> None:
+        self.work.append((self.call, expression))
+        for argument in reversed(expression.arguments):
+            self.schedule(argument)
+        self.schedule(expression.callee)
+
+    def call(self, expression: expr.Call) -> None:
+        values = self.values
+        count = len(expression.arguments)
+        arguments = values[len(values) - count:]
+        del values[len(values) - count:]
+        callee = values.pop()
+
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(expression.paren, "Can only call functions and classes.")
+
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(expression.paren, f"Expected {callee.arity()} arguments but got { len(arguments) }.")
+
+        if isinstance(callee, LoxFunction):
+            self.enter(expression.paren, callee, callee.instance, arguments)
+
+        elif isinstance(callee, LoxClass):
+            instance = LoxInstance(callee)
+            if callee.initializer is None:
+                values.append(instance)
+            else:
+                self.enter(expression.paren, callee.initializer, instance, arguments)
+
+        else:
+            values.append(callee.call(self, arguments))
+
+    def enter(self, paren: Token, function: LoxFunction, instance: Optional[LoxInstance],
+              arguments: List[LoxObject]) -> None:
+        if len(self.frames) >= self.max_depth:
+            raise LoxRuntimeError(paren, "Stack overflow.")
+
+        # the same call frame layout as LoxFunction.call_in
+        self.frames.append(Frame(function, instance, self.environment, len(self.work)))
+        if instance is not None:
+            self.environment = Environment(function.closure, [instance, *arguments])
+        elif function.declaration in self.empty_scopes:
+            self.environment = function.closure
+        else:
+            self.environment = Environment(function.closure, arguments)
+
+        # runs if the body finishes without a return statement
+        self.work.append((self.fall_off_end, None))
+        for statement in reversed(function.declaration.body):
+            self.schedule(statement)
+
+    def fall_off_end(self, _) -> None:
+        self.values.append(None)
+        self.finish_call(None)
+
+    def finish_call(self, _) -> None:
+        # The return value is on top of the value stack. Anything the function
+        # still had scheduled (the rest of its body, restoring block scopes) is
+        # dropped along with its frame.
+        frame = self.frames.pop()
+        del self.work[frame.height:]
+        self.environment = frame.environment
+
+        if frame.function.is_initializer:
+            self.values[-1] = frame.instance
+
+    # Expressions
+
+    def visit_literal_expr(self, expression: expr.Literal) -> None:
+        self.values.append(expression.value)
+
+    def visit_grouping_expr(self, expression: expr.Grouping) -> None:
+        self.schedule(expression.expression)
+
+    def visit_variable_expr(self, expression: expr.Variable) -> None:
+        self.values.append(self.look_up_variable(expression.name, expression))
+
+    def visit_this_expr(self, expression: expr.This) -> None:
+        self.values.append(self.look_up_variable(expression.keyword, expression))
+
+    def look_up_variable(self, name: Token, expression: expr.Expr) -> LoxObject:
+        distance, slot = self.resolved(name, expression)
+        if distance is None:
+            return self.globals.get_slot(name, slot)
+        return self.environment.get_at(distance, slot)
+
+    def resolved(self, name: Token, expression: expr.Expr):
+        # globals are cached in `locals` on first use, see Interpreter.resolved
+        resolved = self.locals.get(expression, None)
+        if resolved is None:
+            resolved = self.locals[expression] = (None, self.globals.slot(name.lexeme))
+        return resolved
+
+    def visit_assign_expr(self, expression: expr.Assign) -> None:
+        self.work.append((self.assign, expression))
+        self.schedule(expression.value)
+
+    def assign(self, expression: expr.Assign) -> None:
+        # the value stays on the stack as the result of the assignment
+        value = self.values[-1]
+        distance, slot = self.resolved(expression.name, expression)
+        if distance is None:
+            self.globals.assign_slot(expression.name, slot, value)
+        else:
+            self.environment.assign_at(distance, slot, value)
+
+    def visit_logical_expr(self, expression: expr.Logical) -> None:
+        self.work.append((self.logical, expression))
+        self.schedule(expression.left)
+
+    def logical(self, expression: expr.Logical) -> None:
+        # the left operand is the result if it short-circuits
+        left = self.values[-1]
+        if expression.operator.type == TokenType.OR:
+            if self.is_truthy(left):
+                return
+        elif not self.is_truthy(left):
+            return
+
+        self.values.pop()
+        self.schedule(expression.right)
+
+    def visit_unary_expr(self, expression: expr.Unary) -> None:
+        self.work.append((self.unary, expression))
+        self.schedule(expression.right)
+
+    def unary(self, expression: expr.Unary) -> None:
+        right = self.values.pop()
+
+        match expression.operator.type:
+            case TokenType.BANG:
+                self.values.append(not self.is_truthy(right))
+            case TokenType.MINUS:
+                if type(right) != float:
+                    raise LoxRuntimeError(expression.operator, "Operand must be a numbers.")
+                self.values.append(-1 * right)
+
+    def visit_binary_expr(self, expression: expr.Binary) -> None:
+        self.work.append((self.binary, expression))
+        self.schedule(expression.right)
+        self.schedule(expression.left)
+
+    def binary(self, expression: expr.Binary) -> None:
+        right = self.values.pop()
+        left = self.values.pop()
+        operator = expression.operator
+
+        match operator.type:
+            case TokenType.BANG_EQUAL:
+                self.values.append(left != right)
+                return
+            case TokenType.EQUAL_EQUAL:
+                self.values.append(left == right)
+                return
+            case TokenType.PLUS:
+                if (type(left) == type(right)) and type(left) in [str, float]:
+                    self.values.append(left + right)
+                    return
+                raise LoxRuntimeError(operator, "Runtime Error: Operands must be two numbers or two strings")
+
+        if not type(left) == type(right) == float:
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+
+        match operator.type:
+            case TokenType.GREATER:
+                self.values.append(left > right)
+            case TokenType.LESS:
+                self.values.append(left < right)
+            case TokenType.GREATER_EQUAL:
+                self.values.append(left >= right)
+            case TokenType.LESS_EQUAL:
+                self.values.append(left <= right)
+            case TokenType.MINUS:
+                self.values.append(left - right)
+            case TokenType.STAR:
+                self.values.append(left * right)
+            case TokenType.SLASH:
+                if right == 0:
+                    raise LoxRuntimeError(operator, "Runtime Error: Cannot Divide by zero.")
+                self.values.append(left / right)
+            case TokenType.PERCENT:
+                if right == 0:
+                    raise LoxRuntimeError(operator, "Runtime Error: Cannot Modulo by zero.")
+                self.values.append(left % right)
+
+    def visit_get_expr(self, expression: expr.Get) -> None:
+        self.work.append((self.get, expression))
+        self.schedule(expression.object)
+
+    def get(self, expression: expr.Get) -> None:
+        obj = self.values.pop()
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(expression.name, "Only class instances have properties.")
+        self.values.append(obj.get_attr(expression.name))
+
+    def visit_set_expr(self, expression: expr.Set) -> None:
+        self.work.append((self.set_value, expression))
+        self.schedule(expression.object)
+
+    def set_value(self, expression: expr.Set) -> None:
+        # like the tree-walker, check the object before evaluating the value
+        if not isinstance(self.values[-1], LoxInstance):
+            raise LoxRuntimeError(expression.name, "Only instances have fields.")
+        self.work.append((self.set, expression))
+        self.schedule(expression.value)
+
+    def set(self, expression: expr.Set) -> None:
+        value = self.values.pop()
+        obj = self.values.pop()
+        obj.set_attr(expression.name, value)
+        self.values.append(value)
+
+    def visit_super_expr(self, expression: expr.Super) -> None:
+        distance, slot = self.locals.get(expression)
+        superclass = self.environment.get_at(distance, slot)
+        instance = self.environment.get_at(distance - 1, 0)
+
+        method = superclass.find_method(expression.method.lexeme)
+        if method is None:
+            raise LoxRuntimeError(expression.method, f"Undefined property {expression.method.lexeme}.")
+        self.values.append(method.bind(instance))
+
+    @staticmethod
+    def is_truthy(value: LoxObject) -> bool:
+        return value is not None and value is not False
@@ -0,0 +1,114 @@
+from pylox import expr, stmt
+from pylox.environment import Environment, GlobalEnvironment
+from pylox.exceptions import LoxReturn
+from pylox.interpreter import Interpreter
+from pylox.lox_function import LoxFunction, TAIL_CALL
+from pylox.lox_instance import LoxInstance
+
+import collections
+import sys
+from typing import Counter, Dict, TextIO
+
+# The counter for calls to each of these functions
+COUNTERS = {
+    LoxFunction.call_in: "calls",
+    Environment.__init__: "environments",
+    LoxInstance.__init__: "instances",
+    LoxFunction.__init__: "functions",
+    LoxFunction.bind: "bound methods",
+    LoxReturn.__init__: "returns raised",
+    GlobalEnvironment.get_slot: "global lookups",
+    Environment.get_at: "local lookups",
+    GlobalEnvironment.assign_slot: "global assignments",
+    Environment.assign_at: "local assignments",
+}
+
+# Every counter, in the order they're reported, and what it counts
+DESCRIPTIONS = {
+    "calls": "Lox function calls, including tail calls",
+    "tail calls": "calls made in place of the calling function's return",
+    "environments": "Environments created for scopes and calls",
+    "instances": "LoxInstances created",
+    "functions": "LoxFunctions created, including bound methods",
+    "bound methods": "methods bound to an instance",
+    "returns raised": "LoxReturn exceptions raised",
+    "global lookups": "reads of global variables",
+    "local lookups": "reads of local variables and `this`",
+    "global assignments": "assignments to global variables",
+    "local assignments": "assignments to local variables",
+}
+
+CODES = {function.__code__: name for function, name in COUNTERS.items()}
+
+# the node type that each `accept` method visits
+NODES = {
+    node.accept.__code__: node.__name__
+    for module, base in [(expr, expr.Expr), (stmt, stmt.Stmt)]
+    for node in vars(module).values()
+    if isinstance(node, type) and issubclass(node, base) and node is not base
+}
+
+# the only places the Interpreter evaluates or executes nodes from, unlike the Resolver
+EVALUATORS = {Interpreter.evaluate.__code__, Interpreter.execute.__code__}
+
+# the functions that return TAIL_CALL when they make a tail call
+CALLERS = {Interpreter.call.__code__, Interpreter.invoke.__code__}
+
+
+class Stats:
+
+    # Counts what a program does as the tree-walking Interpreter runs it: the
+    # objects it allocates, the calls and returns it makes, its variable
+    # lookups and how many times each type of syntax tree node is evaluated or
+    # executed. The counts only depend on the program and the Interpreter,
+    # never on timing, so they make noise-free performance tests.
+    #
+    # Nothing in the Interpreter counts anything itself. While the Stats are
+    # started they're python's profile function for the thread (see
+    # sys.setprofile), which sees every call to the functions that create
+    # those objects or do those things. A program run without stats runs
+    # exactly the same code as before they existed, and one run with them
+    # several times slower.
+
+    def __init__(self):
+        self.counts: Counter[str] = collections.Counter({name: 0 for name in DESCRIPTIONS})
+        self.evaluations: Counter[str] = collections.Counter()
+        self.previous = None
+
+    def start(self) -> None:
+        self.previous = sys.getprofile()
+        sys.setprofile(self.event)
+
+    def stop(self) -> None:
+        sys.setprofile(self.previous)
+
+    def event(self, frame, event: str, arg) -> None:
+        if event == "call":
+            code = frame.f_code
+            name = CODES.get(code)
+            if name is not None:
+                self.counts[name] += 1
+            else:
+                node = NODES.get(code)
+                if node is not None and frame.f_back.f_code in EVALUATORS:
+                    self.evaluations[node] += 1
+        elif event == "return" and arg is TAIL_CALL and frame.f_code in CALLERS:
+            self.counts["calls"] += 1
+            self.counts["tail calls"] += 1
+
+    def as_dict(self) -> Dict[str, object]:
+        """The counts, with `evaluations` holding the count for each type of node"""
+
+        counts: Dict[str, object] = dict(self.counts)
+        counts["evaluations"] = dict(sorted(self.evaluations.items()))
+        return counts
+
+    def report(self, out: TextIO) -> None:
+        width = max(len(name) for name in DESCRIPTIONS)
+        out.write("Stats\n")
+        for name, description in DESCRIPTIONS.items():
+            out.write(f"  {name:<{width}}  {self.counts[name]:>10}  {description}\n")
+
+        out.write("Evaluations\n")
+        for node, count in self.evaluations.most_common():
+            out.write(f"  {node:<{width}}  {count:>10}\n")
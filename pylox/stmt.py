@@ -35,20 +35,31 @@ class Visitor(ABC):
 
 class Stmt(ABC):
 
+    __slots__ = ()
+
     def accept(visitor: Visitor):
         pass
 
 class Expression(Stmt):
 
+    __slots__ = ("expression",)
+    __match_args__ = ("expression",)
+
     def __init__(self, expression):
         self.expression = expression
 
     def accept(self, visitor: Visitor):
         return visitor.visit_expression_stmt(self)
 
+    def __reduce__(self):
+        return (Expression, (self.expression,))
+
 
 class Function(Stmt):
 
+    __slots__ = ("name", "params", "body")
+    __match_args__ = ("name", "params", "body")
+
     def __init__(self, name, params, body):
         self.name = name
         self.params = params
@@ -57,9 +68,15 @@ class Function(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_function_stmt(self)
 
+    def __reduce__(self):
+        return (Function, (self.name, self.params, self.body))
+
 
 class If(Stmt):
 
+    __slots__ = ("condition", "then_branch", "else_branch")
+    __match_args__ = ("condition", "then_branch", "else_branch")
+
     def __init__(self, condition, then_branch, else_branch):
         self.condition = condition
         self.then_branch = then_branch
@@ -68,18 +85,30 @@ class If(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_if_stmt(self)
 
+    def __reduce__(self):
+        return (If, (self.condition, self.then_branch, self.else_branch))
+
 
 class Print(Stmt):
 
+    __slots__ = ("expression",)
+    __match_args__ = ("expression",)
+
     def __init__(self, expression):
         self.expression = expression
 
     def accept(self, visitor: Visitor):
         return visitor.visit_print_stmt(self)
 
+    def __reduce__(self):
+        return (Print, (self.expression,))
+
 
 class Var(Stmt):
 
+    __slots__ = ("name", "initializer")
+    __match_args__ = ("name", "initializer")
+
     def __init__(self, name, initializer):
         self.name = name
         self.initializer = initializer
@@ -87,18 +116,30 @@ class Var(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_var_stmt(self)
 
+    def __reduce__(self):
+        return (Var, (self.name, self.initializer))
+
 
 class Block(Stmt):
 
+    __slots__ = ("statements",)
+    __match_args__ = ("statements",)
+
     def __init__(self, statements):
         self.statements = statements
 
     def accept(self, visitor: Visitor):
         return visitor.visit_block_stmt(self)
 
+    def __reduce__(self):
+        return (Block, (self.statements,))
+
 
 class Class(Stmt):
 
+    __slots__ = ("name", "superclass", "methods")
+    __match_args__ = ("name", "superclass", "methods")
+
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
@@ -107,9 +148,15 @@ class Class(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_class_stmt(self)
 
+    def __reduce__(self):
+        return (Class, (self.name, self.superclass, self.methods))
+
 
 class While(Stmt):
 
+    __slots__ = ("condition", "body")
+    __match_args__ = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -117,9 +164,15 @@ class While(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_while_stmt(self)
 
+    def __reduce__(self):
+        return (While, (self.condition, self.body))
+
 
 class Assert(Stmt):
 
+    __slots__ = ("assert_token", "expression")
+    __match_args__ = ("assert_token", "expression")
+
     def __init__(self, assert_token, expression):
         self.assert_token = assert_token
         self.expression = expression
@@ -127,9 +180,15 @@ class Assert(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_assert_stmt(self)
 
+    def __reduce__(self):
+        return (Assert, (self.assert_token, self.expression))
+
 
 class Return(Stmt):
 
+    __slots__ = ("keyword", "value")
+    __match_args__ = ("keyword", "value")
+
     def __init__(self, keyword, value):
         self.keyword = keyword
         self.value = value
@@ -137,4 +196,7 @@ class Return(Stmt):
     def accept(self, visitor: Visitor):
         return visitor.visit_return_stmt(self)
 
+    def __reduce__(self):
+        return (Return, (self.keyword, self.value))
+
 
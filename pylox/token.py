@@ -3,6 +3,12 @@ from typing import Union
 
 
 class Token:
+
+    # Every node in the syntax tree keeps its tokens, so they're slotted to
+    # keep large programs small
+    __slots__ = ("type", "lexeme", "literal", "line")
+    __match_args__ = ("type", "lexeme", "literal", "line")
+
     def __init__(
         self,
         token_type: TokenType,
@@ -17,3 +23,7 @@ class Token:
 
     def __str__(self):
         return f"{self.type} {self.lexeme} {self.literal}"
+
+    def __reduce__(self):
+        # pickled as a constructor call, like the syntax tree's nodes
+        return (Token, (self.type, self.lexeme, self.literal, self.line))
@@ -0,0 +1,71 @@
+from pylox.token_type import TokenType
+from pylox.token import Token
+
+from array import array
+import sys
+from typing import List, Union
+
+# TokenTypes by value, to turn the codes stored in a TokenStore back into types
+TOKEN_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+
+class TokenStore:
+
+    # Holds a scanned token stream as parallel arrays rather than a list of
+    # Tokens: for each token its type, where its lexeme starts in the source,
+    # its length and its line, in 13 bytes. Lexemes are sliced from the source,
+    # and the literal values of numbers and strings parsed from them, only when
+    # the Parser asks for a Token. The source can also be a memoryview of a
+    # mapped file's bytes, see MappedScanner.
+
+    def __init__(self, source: Union[str, memoryview]):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.lines = array("I")
+
+    def append(self, token_type: TokenType, start: int, length: int, line: int) -> None:
+        self.types.append(token_type.value)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.types)
+        token_type = TOKEN_TYPES[self.types[index]]
+        lexeme = self.lexeme(index)
+
+        literal = None
+        if token_type == TokenType.IDENTIFIER:
+            lexeme = sys.intern(lexeme)
+        elif token_type == TokenType.NUMBER:
+            literal = float(lexeme)
+        elif token_type == TokenType.STRING:
+            literal = lexeme[1:-1]
+        return Token(token_type, lexeme, literal, self.lines[index])
+
+    def type(self, index: int) -> TokenType:
+        return TOKEN_TYPES[self.types[index]]
+
+    def token_types(self) -> List[TokenType]:
+        return [TOKEN_TYPES[code] for code in self.types]
+
+    def lexeme(self, index: int) -> str:
+        start = self.starts[index]
+        lexeme = self.source[start : start + self.lengths[index]]
+        if isinstance(lexeme, str):
+            return lexeme
+        lexeme = str(lexeme, "utf-8")
+        # as if the file had been read in text mode
+        return lexeme.replace("\r\n", "\n").replace("\r", "\n") if "\r" in lexeme else lexeme
+
+    def line(self, index: int) -> int:
+        return self.lines[index]
+
+    def literal(self, index: int) -> Union[str, float, None]:
+        return self[index].literal
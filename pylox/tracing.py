@@ -0,0 +1,161 @@
+from pylox import expr, stmt
+from pylox.exceptions import LoxRuntimeError
+from pylox.lox_class import LoxClass
+from pylox.token import Token
+from pylox.types import LoxObject
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TextIO, Union
+
+# Called by a traced Interpreter as hook(event, name, line, arg), with the
+# events, names, lines and args that Tracer describes
+TraceHook = Callable[[str, str, int, Any], None]
+
+# The name of the code outside any Lox function
+SCRIPT = "<script>"
+
+
+def first_line(node: Union[expr.Expr, stmt.Stmt]) -> Optional[int]:
+    """The line of the first token in a syntax tree, if it has any"""
+
+    for field in node.__match_args__:
+        value = getattr(node, field)
+        if isinstance(value, Token):
+            return value.line
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if isinstance(child, (expr.Expr, stmt.Stmt)):
+                line = first_line(child)
+                if line is not None:
+                    return line
+    return None
+
+
+class Tracer:
+
+    # Passes what a program does to a trace hook (see Interpreter.settrace),
+    # as these events:
+    #
+    #   "call"         a Lox function or method is called. `line` is the line
+    #                  it's declared on and `arg` the list of its arguments.
+    #   "return"       it returns. `line` is the line of the last statement it
+    #                  ran (or its declaration's, without line events) and
+    #                  `arg` the value it returns, or None if a runtime error
+    #                  is unwinding it. A tail call returns from the calling
+    #                  function (with None) before its callee is called.
+    #   "instantiate"  a class is called to create an instance, before its
+    #                  initializer runs. `line` is the line of the call and
+    #                  `arg` the list of arguments.
+    #   "line"         a statement on a different line from the one before it
+    #                  is about to run, or one that already ran on this line
+    #                  runs again, as a loop on one line does. `arg` is None.
+    #
+    # `name` is the name of the function or class, or for "line" events the
+    # function running the statement (SCRIPT outside any).
+    #
+    # Nothing traces a program until a Tracer is installed. It then takes
+    # over the Interpreter's call hooks, and stands in for its `call` to see
+    # classes being called and for its `execute` for line events. All of them
+    # go back to how they were when it's removed.
+
+    def __init__(self, interpreter, hook: TraceHook, lines: bool = True):
+        self.interpreter = interpreter
+        self.hook = hook
+        self.lines = lines
+        # [name, line, statements run on that line] for each running function,
+        # with None for the statements until the first one runs
+        self.frames: List[List[Any]] = [[SCRIPT, 0, None]]
+        self.statement_lines: Dict[stmt.Stmt, Optional[int]] = {}
+
+    def install(self) -> None:
+        self.interpreter.call_hooks = self
+        self.interpreter.call = self.call
+        if self.lines:
+            self.interpreter.execute = self.execute
+
+    def remove(self) -> None:
+        self.interpreter.call_hooks = None
+        vars(self.interpreter).pop("call", None)
+        vars(self.interpreter).pop("execute", None)
+
+    def enter(self, function, arguments: List[LoxObject]) -> None:
+        name, line = function.declaration.name.lexeme, function.declaration.name.line
+        self.frames.append([name, line, None])
+        self.hook("call", name, line, arguments)
+
+    def replace(self, function, arguments: List[LoxObject]) -> None:
+        self.exit(None)
+        self.enter(function, arguments)
+
+    def exit(self, value: LoxObject) -> None:
+        name, line, _ = self.frames.pop()
+        self.hook("return", name, line, value)
+
+    def call(self, expression: expr.Call, callee: LoxObject, tail: bool = False):
+        if not isinstance(callee, LoxClass):
+            return type(self.interpreter).call(self.interpreter, expression, callee, tail)
+
+        # the arguments are evaluated first, as the Interpreter would
+        arguments = [self.interpreter.evaluate(argument) for argument in expression.arguments]
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(expression.paren, f"Expected {callee.arity()} arguments but got { len(arguments) }.")
+        self.hook("instantiate", callee.name, expression.paren.line, arguments)
+        return callee.call(self.interpreter, arguments)
+
+    def execute(self, statement: stmt.Stmt):
+        line = self.statement_lines.get(statement, 0)
+        if line == 0:
+            line = self.statement_lines[statement] = first_line(statement)
+
+        frame = self.frames[-1]
+        ran = frame[2]
+        if line is None:
+            line = frame[1]
+        if ran is None or line != frame[1] or statement in ran:
+            frame[1] = line
+            frame[2] = {statement}
+            self.hook("line", frame[0], line, None)
+        else:
+            ran.add(statement)
+        return statement.accept(self.interpreter)
+
+
+class ChromeTrace:
+
+    # A trace hook that writes Lox calls as Chrome trace events, which
+    # chrome://tracing, Perfetto and speedscope can show on a timeline. Each
+    # call becomes a slice with its line and arguments, and each instantiation
+    # an instant event. Events are written to `out` as they happen, in the
+    # trace format's JSON array form, which stays readable if the program
+    # never finishes. `close` ends the array.
+
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.started = time.perf_counter()
+        self.pid = os.getpid()
+        self.tid = threading.get_native_id()
+        self.separator = "[\n"
+
+    def __call__(self, event: str, name: str, line: int, arg: Any) -> None:
+        if event == "call":
+            record = {"ph": "B", "args": {"line": line, "arguments": [str(value) for value in arg]}}
+        elif event == "return":
+            record = {"ph": "E", "args": {"line": line, "value": str(arg)}}
+        elif event == "instantiate":
+            record = {"ph": "i", "s": "t", "args": {"line": line, "arguments": [str(value) for value in arg]}}
+        else:
+            return
+
+        record["name"] = name
+        record["ts"] = round((time.perf_counter() - self.started) * 1_000_000, 3)
+        record["pid"] = self.pid
+        record["tid"] = self.tid
+        self.out.write(self.separator)
+        self.out.write(json.dumps(record))
+        self.separator = ",\n"
+
+    def close(self) -> None:
+        self.out.write("[\n]\n" if self.separator == "[\n" else "\n]\n")
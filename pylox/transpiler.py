@@ -0,0 +1,555 @@
+from pylox.exceptions import LoxRuntimeError, LoxAssertionError
+from pylox.interpreter import ClockBuiltinFn
+from pylox.token import Token
+from pylox.token_type import TokenType
+from pylox import py_runtime
+from pylox.scope_analyzer import Binding, ScopeAnalyzer
+from pylox.counted_loop import CountedLoop
+
+from pylox import expr
+from pylox import stmt
+
+from collections import OrderedDict
+import math
+from types import CodeType, FunctionType
+from typing import Dict, List, Optional, Tuple, Union
+
+# How many translated programs to keep around, keyed by their source
+CODE_CACHE_SIZE = 128
+
+NUMERIC_OPERATORS = {
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.SLASH: "/",
+    TokenType.PERCENT: "%",
+    TokenType.GREATER: ">",
+    TokenType.GREATER_EQUAL: ">=",
+    TokenType.LESS: "<",
+    TokenType.LESS_EQUAL: "<=",
+}
+
+COMPARISON_OPERATORS = [
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    TokenType.EQUAL_EQUAL,
+    TokenType.BANG_EQUAL,
+]
+
+
+class Transpiler(expr.Visitor, stmt.Visitor):
+
+    # Translates a resolved Lox program into the source of a python function
+    # called `_main`. Statements are emitted line by line, expressions are
+    # returned as python source strings.
+
+    def __init__(self):
+        self.scopes = ScopeAnalyzer()
+        self.lines: List[str] = []
+        self.indent = 0
+        self.tokens: List[Token] = []
+        self.token_indices: Dict[int, int] = {}
+        self.temporaries = 0
+        self.initializer_this: Optional[str] = None
+
+    def transpile(self, statements: List[stmt.Stmt]) -> str:
+        self.scopes.analyze(statements)
+        self.emit("def _main():")
+        self.emit_suite(statements)
+        return "\n".join(self.lines) + "\n"
+
+    # Helpers for building source
+
+    def emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
+
+    def emit_suite(self, statements: List[stmt.Stmt]) -> None:
+        self.indent += 1
+        length = len(self.lines)
+        for statement in statements:
+            statement.accept(self)
+        if len(self.lines) == length:
+            self.emit("pass")
+        self.indent -= 1
+
+    def emit_body(self, statement: stmt.Stmt) -> None:
+        # the bodies of if/while statements, blocks don't need a new python scope
+        if isinstance(statement, stmt.Block):
+            self.emit_suite(statement.statements)
+        else:
+            self.emit_suite([statement])
+
+    def token(self, token: Token) -> str:
+        index = self.token_indices.get(id(token))
+        if index is None:
+            self.tokens.append(token)
+            index = len(self.tokens) - 1
+            self.token_indices[id(token)] = index
+        return f"T[{index}]"
+
+    def temporary(self) -> str:
+        self.temporaries += 1
+        return f"_t{self.temporaries}"
+
+    def expression(self, expression: expr.Expr) -> str:
+        return expression.accept(self)
+
+    def static_type(self, expression: expr.Expr) -> Optional[type]:
+        # The type an expression is guaranteed to have if it evaluates without
+        # raising an error, used to skip runtime checks.
+        if isinstance(expression, expr.Literal):
+            return type(expression.value)
+        if isinstance(expression, expr.Grouping):
+            return self.static_type(expression.expression)
+        if isinstance(expression, expr.Unary):
+            return bool if expression.operator.type == TokenType.BANG else float
+        if isinstance(expression, expr.Binary):
+            if expression.operator.type in COMPARISON_OPERATORS:
+                return bool
+            if expression.operator.type != TokenType.PLUS:
+                return float
+            left = self.static_type(expression.left)
+            if left in [float, str] and left == self.static_type(expression.right):
+                return left
+        if isinstance(expression, expr.Logical):
+            left = self.static_type(expression.left)
+            if left == bool and self.static_type(expression.right) == bool:
+                return bool
+        if isinstance(expression, expr.Assign):
+            return self.static_type(expression.value)
+        return None
+
+    def condition(self, expression: expr.Expr) -> str:
+        # Lox truthiness as a python boolean expression
+        source = self.expression(expression)
+        if self.static_type(expression) == bool:
+            return source
+        temp = self.temporary()
+        return f"(({temp} := {source}) is not None and {temp} is not False)"
+
+    def read(self, binding: Binding) -> str:
+        if binding.is_cell:
+            return f"{binding.python_name}[0]"
+        return binding.python_name
+
+    def emit_store(self, binding: Optional[Binding], name: Token, value: str) -> None:
+        # defining a new variable, as opposed to assigning an existing one
+        if binding is None:
+            self.emit(f"G[{name.lexeme!r}] = {value}")
+        elif binding.is_cell:
+            self.emit(f"{binding.python_name} = [{value}]")
+        else:
+            self.emit(f"{binding.python_name} = {value}")
+
+    def function_signature(self, name: str, declaration: stmt.Function, this: Optional[Binding] = None) -> str:
+        params = [binding.python_name for binding in self.scopes.params[declaration]]
+        if this is not None:
+            params.insert(0, this.python_name)
+        free = self.scopes.functions[declaration].free
+        if free:
+            params.append("*")
+            params.extend(f"{binding.python_name}={binding.python_name}" for binding in free)
+        return f"def {name}({', '.join(params)}):"
+
+    def emit_function(self, name: str, declaration: stmt.Function, this: Optional[Binding] = None,
+                      is_initializer: bool = False) -> None:
+        enclosing_initializer = self.initializer_this
+        self.initializer_this = this.python_name if is_initializer else None
+
+        self.emit(self.function_signature(name, declaration, this))
+        self.indent += 1
+        for binding in self.scopes.params[declaration]:
+            if binding.is_cell:
+                self.emit(f"{binding.python_name} = [{binding.python_name}]")
+        self.indent -= 1
+        self.emit_suite(declaration.body)
+        if is_initializer:
+            self.indent += 1
+            self.emit(f"return {this.python_name}")
+            self.indent -= 1
+
+        self.initializer_this = enclosing_initializer
+
+    # Statements
+
+    def visit_expression_stmt(self, statement: stmt.Expression) -> None:
+        expression = statement.expression
+
+        # assignments are the most common expression statements, and are much
+        # cheaper as python statements than as expressions
+        if isinstance(expression, expr.Assign):
+            binding = self.scopes.references.get(expression)
+            value = self.expression(expression.value)
+            if binding is None:
+                temp = self.temporary()
+                name = expression.name.lexeme
+                self.emit(f"{temp} = {value}")
+                self.emit(f"if {name!r} not in G: undefined_variable({self.token(expression.name)})")
+                self.emit(f"G[{name!r}] = {temp}")
+            elif binding.is_cell:
+                self.emit(f"{binding.python_name}[0] = {value}")
+            else:
+                self.emit(f"{binding.python_name} = {value}")
+            return
+
+        if isinstance(expression, expr.Set):
+            temp = self.temporary()
+            obj = self.expression(expression.object)
+            self.emit(f"if type({temp} := {obj}) is not Instance: check_instance({temp}, {self.token(expression.name)})")
+            self.emit(f"{temp}.fields[{expression.name.lexeme!r}] = {self.expression(expression.value)}")
+            return
+
+        self.emit(self.expression(expression))
+
+    def visit_print_stmt(self, statement: stmt.Print) -> None:
+        self.emit(f"print(stringify({self.expression(statement.expression)}))")
+
+    def visit_assert_stmt(self, statement: stmt.Assert) -> None:
+        self.emit(f"if not {self.condition(statement.expression)}: assertion_failed({statement.assert_token.line})")
+
+    def visit_var_stmt(self, statement: stmt.Var) -> None:
+        value = "None"
+        if statement.initializer is not None:
+            value = self.expression(statement.initializer)
+        self.emit_store(self.scopes.declarations[statement], statement.name, value)
+
+    def visit_block_stmt(self, statement: stmt.Block) -> None:
+        for s in statement.statements:
+            s.accept(self)
+
+    def visit_if_stmt(self, statement: stmt.If) -> None:
+        self.emit(f"if {self.condition(statement.condition)}:")
+        self.emit_body(statement.then_branch)
+        if statement.else_branch is not None:
+            self.emit("else:")
+            self.emit_body(statement.else_branch)
+
+    def visit_while_stmt(self, statement: stmt.While) -> None:
+        self.emit(f"while {self.condition(statement.condition)}:")
+        self.emit_body(statement.body)
+
+    def visit_return_stmt(self, statement: stmt.Return) -> None:
+        if self.initializer_this is not None:
+            self.emit(f"return {self.initializer_this}")
+        elif statement.value is None:
+            self.emit("return None")
+        else:
+            self.emit(f"return {self.expression(statement.value)}")
+
+    def visit_function_stmt(self, statement: stmt.Function) -> None:
+        binding = self.scopes.declarations[statement]
+        name = self.scopes.python_name(statement.name.lexeme)
+
+        if binding is not None and binding.is_cell:
+            # the function can refer to itself, so the cell has to exist first
+            self.emit(f"{binding.python_name} = [None]")
+            self.emit_function(name, statement)
+            self.emit(f"{binding.python_name}[0] = {name}")
+        elif binding is not None:
+            self.emit_function(binding.python_name, statement)
+        else:
+            self.emit_function(name, statement)
+            self.emit(f"G[{statement.name.lexeme!r}] = {name}")
+
+    def visit_class_stmt(self, statement: stmt.Class) -> None:
+        binding = self.scopes.declarations[statement]
+
+        superclass = "None"
+        if statement.superclass is not None:
+            superclass = self.scopes.super_bindings[statement].python_name
+            value = self.expression(statement.superclass)
+            self.emit(f"{superclass} = check_superclass({value}, {self.token(statement.superclass.name)})")
+
+        self.emit_store(binding, statement.name, "None")
+
+        methods = []
+        for method in statement.methods:
+            name = self.scopes.python_name(method.name.lexeme)
+            this = self.scopes.this_bindings[method]
+            self.emit_function(name, method, this, is_initializer=method.name.lexeme == "init")
+            methods.append(f"{method.name.lexeme!r}: {name}")
+
+        klass = f"Class({statement.name.lexeme!r}, {superclass}, {{{', '.join(methods)}}})"
+        if binding is None:
+            self.emit(f"G[{statement.name.lexeme!r}] = {klass}")
+        elif binding.is_cell:
+            self.emit(f"{binding.python_name}[0] = {klass}")
+        else:
+            self.emit(f"{binding.python_name} = {klass}")
+
+    # Expressions
+
+    def visit_literal_expr(self, expression: expr.Literal) -> str:
+        if type(expression.value) is float and not math.isfinite(expression.value):
+            return f"float({str(expression.value)!r})"
+        return repr(expression.value)
+
+    def visit_grouping_expr(self, expression: expr.Grouping) -> str:
+        return self.expression(expression.expression)
+
+    def visit_variable_expr(self, expression: expr.Variable) -> str:
+        binding = self.scopes.references.get(expression)
+        if binding is not None:
+            return self.read(binding)
+        name = expression.name.lexeme
+        return f"(G[{name!r}] if {name!r} in G else undefined_variable({self.token(expression.name)}))"
+
+    def visit_this_expr(self, expression: expr.This) -> str:
+        return self.read(self.scopes.references[expression])
+
+    def visit_assign_expr(self, expression: expr.Assign) -> str:
+        binding = self.scopes.references.get(expression)
+        value = self.expression(expression.value)
+        if binding is None:
+            return f"assign_global(G, {self.token(expression.name)}, {value})"
+        if binding.is_cell:
+            return f"set_cell({binding.python_name}, {value})"
+        return f"({binding.python_name} := {value})"
+
+    def visit_logical_expr(self, expression: expr.Logical) -> str:
+        left = self.expression(expression.left)
+        right = self.expression(expression.right)
+
+        # python's `and`/`or` agree with Lox when the left operand is a boolean
+        if self.static_type(expression.left) == bool:
+            operator = "or" if expression.operator.type == TokenType.OR else "and"
+            return f"({left} {operator} {right})"
+
+        temp = self.temporary()
+        falsey = f"(({temp} := {left}) is None or {temp} is False)"
+        if expression.operator.type == TokenType.OR:
+            return f"({right} if {falsey} else {temp})"
+        return f"({temp} if {falsey} else {right})"
+
+    def visit_unary_expr(self, expression: expr.Unary) -> str:
+        right = self.expression(expression.right)
+        if expression.operator.type == TokenType.BANG:
+            if self.static_type(expression.right) == bool:
+                return f"(not {right})"
+            temp = self.temporary()
+            return f"(({temp} := {right}) is None or {temp} is False)"
+
+        if self.static_type(expression.right) == float:
+            return f"(-{right})"
+        temp = self.temporary()
+        return f"(-{temp} if type({temp} := {right}) is float else operand_error({self.token(expression.operator)}))"
+
+    def visit_binary_expr(self, expression: expr.Binary) -> str:
+        operator = expression.operator
+        left = self.expression(expression.left)
+        right = self.expression(expression.right)
+        left_type = self.static_type(expression.left)
+        right_type = self.static_type(expression.right)
+
+        match operator.type:
+            case TokenType.EQUAL_EQUAL:
+                return f"({left} == {right})"
+            case TokenType.BANG_EQUAL:
+                return f"({left} != {right})"
+            case TokenType.PLUS:
+                return self.plus(operator, left, right, left_type, right_type)
+
+        symbol = NUMERIC_OPERATORS[operator.type]
+        token = self.token(operator)
+        needs_zero_check = operator.type in [TokenType.SLASH, TokenType.PERCENT] and not (
+            isinstance(expression.right, expr.Literal) and expression.right.value != 0
+        )
+
+        if left_type == float and right_type == float and not needs_zero_check:
+            return f"({left} {symbol} {right})"
+
+        # Both operands have to be evaluated before either is checked, and in
+        # order. Literal operands can't have side effects, so they're left in place.
+        checks = []
+        if not isinstance(expression.left, expr.Literal):
+            temp = self.temporary()
+            if left_type != float:
+                checks.append(f"(type({temp} := {left}) is not float)")
+            else:
+                checks.append(f"(({temp} := {left}) is None)")
+            left = temp
+        elif left_type != float:
+            checks.append("True")
+
+        if not isinstance(expression.right, expr.Literal):
+            temp = self.temporary()
+            if right_type != float:
+                checks.append(f"(type({temp} := {right}) is not float)")
+            else:
+                checks.append(f"(({temp} := {right}) is None)")
+            right = temp
+        elif right_type != float:
+            checks.append("True")
+
+        result = f"{left} {symbol} {right}"
+        if needs_zero_check:
+            zero_error = "divide_by_zero" if operator.type == TokenType.SLASH else "modulo_by_zero"
+            result = f"({result} if {right} != 0 else {zero_error}({token}))"
+
+        if not checks:
+            return f"({result})"
+        return f"(operands_error({token}) if {' | '.join(checks)} else {result})"
+
+    def plus(self, operator: Token, left: str, right: str, left_type: Optional[type], right_type: Optional[type]) -> str:
+        if left_type in [float, str] and left_type == right_type:
+            return f"({left} + {right})"
+
+        left_temp = self.temporary()
+        right_temp = self.temporary()
+        return (
+            f"({left_temp} + {right_temp} if type({left_temp} := {left}) is type({right_temp} := {right})"
+            f" and type({left_temp}) in ADDABLE else plus_error({self.token(operator)}))"
+        )
+
+    def visit_get_expr(self, expression: expr.Get) -> str:
+        temp = self.temporary()
+        name = repr(expression.name.lexeme)
+        obj = self.expression(expression.object)
+        return (
+            f"({temp}.fields[{name}] if type({temp} := {obj}) is Instance and {name} in {temp}.fields"
+            f" else get_property({temp}, {name}, {self.token(expression.name)}))"
+        )
+
+    def visit_set_expr(self, expression: expr.Set) -> str:
+        obj = self.expression(expression.object)
+        value = self.expression(expression.value)
+        return (
+            f"set_property(check_instance({obj}, {self.token(expression.name)}),"
+            f" {expression.name.lexeme!r}, {value})"
+        )
+
+    def visit_super_expr(self, expression: expr.Super) -> str:
+        superclass = self.read(self.scopes.references[expression])
+        this = self.read(self.scopes.references[expression.keyword])
+        return f"super_method({superclass}, {this}, {expression.method.lexeme!r}, {self.token(expression.method)})"
+
+    def is_pure(self, expression: expr.Expr) -> bool:
+        # expressions that can't fail or have side effects, so can be repeated freely
+        if isinstance(expression, expr.Literal):
+            return True
+        if isinstance(expression, (expr.Variable, expr.This)):
+            return expression in self.scopes.references
+        return False
+
+    def arguments(self, arguments: List[expr.Expr]) -> Tuple[List[str], List[str]]:
+        # Evaluates each argument exactly once: returns the assignments to run
+        # (in order) before the call, and the values to pass to it.
+        assignments = []
+        values = []
+        for argument in arguments:
+            source = self.expression(argument)
+            if self.is_pure(argument):
+                values.append(source)
+            else:
+                temp = self.temporary()
+                assignments.append(f"({temp} := {source})")
+                values.append(temp)
+        return assignments, values
+
+    def visit_call_expr(self, expression: expr.Call) -> str:
+        callee = expression.callee
+        paren = self.token(expression.paren)
+
+        if isinstance(callee, expr.Get):
+            return self.invoke(callee, expression.arguments, paren)
+
+        function = self.temporary()
+        source = self.expression(callee)
+        assignments, arguments = self.arguments(expression.arguments)
+        evaluate = f"type({function} := {source}) is FunctionType"
+        if assignments:
+            evaluate = f"(({function} := {source}), {', '.join(assignments)}) and type({function}) is FunctionType"
+
+        return (
+            f"({function}({', '.join(arguments)}) if {evaluate}"
+            f" and {function}.__code__.co_argcount == {len(arguments)}"
+            f" else call({', '.join([paren, function] + arguments)}))"
+        )
+
+    def invoke(self, callee: expr.Get, argument_expressions: List[expr.Expr], paren: str) -> str:
+        # `obj.method(...)` calls the method function directly, without creating
+        # a bound method. The property is looked up (and any error raised)
+        # before the arguments are evaluated, just like the tree-walker.
+        receiver = self.temporary()
+        method = self.temporary()
+        value = self.temporary()
+        name = repr(callee.name.lexeme)
+        obj = self.expression(callee.object)
+        assignments, arguments = self.arguments(argument_expressions)
+
+        lookup = (
+            f"({method} := ({receiver}.klass.methods.get({name})"
+            f" if type({receiver} := {obj}) is Instance and {name} not in {receiver}.fields else None))"
+        )
+        fallback = f"({value} := (get_property({receiver}, {name}, {self.token(callee.name)}) if {method} is None else None))"
+        evaluate = f"({', '.join([lookup, fallback] + assignments)}) and {method} is not None"
+        slow_callee = f"({value} if {method} is None else BoundMethod({receiver}, {method}))"
+
+        return (
+            f"({method}({', '.join([receiver] + arguments)}) if {evaluate}"
+            f" and {method}.__code__.co_argcount == {len(arguments) + 1}"
+            f" else call({', '.join([paren, slow_callee] + arguments)}))"
+        )
+
+
+class PythonEngine:
+
+    # Runs Lox programs by translating them into python source, which is then
+    # compiled and run by CPython. Translated code objects are cached by source
+    # and whether it was optimized, so running the same program again in this
+    # process skips translation.
+
+    code_cache: 'OrderedDict[Tuple[str, bool], Tuple[CodeType, List[Token]]]' = OrderedDict()
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.globals = {"clock": ClockBuiltinFn()}
+
+    def resolve(self, expression: expr.Expr, depth: int, slot: int) -> None:
+        # The transpiler works out its own scopes, see ScopeAnalyzer
+        pass
+
+    def resolve_tail_call(self, expression: expr.Call) -> None:
+        # Lox calls are plain python calls, which can't be made in tail position
+        pass
+
+    def resolve_counted_loop(self, loop: CountedLoop) -> None:
+        # only the tree-walking Interpreter has a fast path for these
+        pass
+
+    def resolve_empty_scope(self, node: Union[stmt.Block, stmt.Function]) -> None:
+        # scopes are worked out separately here, as with `resolve`
+        pass
+
+    def compile(self, statements: List[stmt.Stmt]) -> Tuple[CodeType, List[Token]]:
+        source = getattr(self.runtime, "source", None)
+        key = (source, getattr(self.runtime, "optimize", False))
+        if source is not None and key in self.code_cache:
+            self.code_cache.move_to_end(key)
+            return self.code_cache[key]
+
+        transpiler = Transpiler()
+        python_source = transpiler.transpile(statements)
+        compiled = (compile(python_source, "<lox>", "exec"), transpiler.tokens)
+
+        if source is not None:
+            self.code_cache[key] = compiled
+            if len(self.code_cache) > CODE_CACHE_SIZE:
+                self.code_cache.popitem(last=False)
+        return compiled
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        code, tokens = self.compile(statements)
+        namespace = {
+            name: getattr(py_runtime, name) for name in dir(py_runtime) if not name.startswith("__")
+        }
+        namespace.update({"G": self.globals, "T": tokens, "ADDABLE": (float, str), "FunctionType": FunctionType})
+        exec(code, namespace)
+
+        try:
+            namespace["_main"]()
+        except LoxRuntimeError as e:
+            self.runtime.runtime_error(e)
+        except LoxAssertionError as e:
+            self.runtime.assertion_error(e)
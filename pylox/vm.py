@@ -0,0 +1,570 @@
+from pylox.chunk import OpCode
+from pylox.compiler import Compiler
+from pylox.exceptions import LoxRuntimeError, LoxAssertionError
+from pylox.interpreter import ClockBuiltinFn
+from pylox.lox_callable import LoxCallable
+from pylox.token import Token
+from pylox.vm_objects import Upvalue, Closure, VMClass, VMInstance, BoundMethod
+from pylox.counted_loop import CountedLoop
+
+from pylox import expr
+from pylox import stmt
+
+from typing import List, Union
+
+# The maximum depth of Lox calls before the VM reports a stack overflow
+FRAMES_MAX = 10000
+
+# Plain ints compare faster than IntEnum members in the dispatch loop
+CONSTANT = int(OpCode.CONSTANT)
+NIL = int(OpCode.NIL)
+TRUE = int(OpCode.TRUE)
+FALSE = int(OpCode.FALSE)
+POP = int(OpCode.POP)
+GET_LOCAL = int(OpCode.GET_LOCAL)
+SET_LOCAL = int(OpCode.SET_LOCAL)
+GET_GLOBAL = int(OpCode.GET_GLOBAL)
+DEFINE_GLOBAL = int(OpCode.DEFINE_GLOBAL)
+SET_GLOBAL = int(OpCode.SET_GLOBAL)
+GET_UPVALUE = int(OpCode.GET_UPVALUE)
+SET_UPVALUE = int(OpCode.SET_UPVALUE)
+GET_PROPERTY = int(OpCode.GET_PROPERTY)
+CHECK_INSTANCE = int(OpCode.CHECK_INSTANCE)
+SET_PROPERTY = int(OpCode.SET_PROPERTY)
+GET_SUPER = int(OpCode.GET_SUPER)
+EQUAL = int(OpCode.EQUAL)
+NOT_EQUAL = int(OpCode.NOT_EQUAL)
+GREATER = int(OpCode.GREATER)
+GREATER_EQUAL = int(OpCode.GREATER_EQUAL)
+LESS = int(OpCode.LESS)
+LESS_EQUAL = int(OpCode.LESS_EQUAL)
+ADD = int(OpCode.ADD)
+SUBTRACT = int(OpCode.SUBTRACT)
+MULTIPLY = int(OpCode.MULTIPLY)
+DIVIDE = int(OpCode.DIVIDE)
+MODULO = int(OpCode.MODULO)
+NOT = int(OpCode.NOT)
+NEGATE = int(OpCode.NEGATE)
+PRINT = int(OpCode.PRINT)
+ASSERT = int(OpCode.ASSERT)
+JUMP = int(OpCode.JUMP)
+JUMP_IF_FALSE = int(OpCode.JUMP_IF_FALSE)
+JUMP_IF_TRUE = int(OpCode.JUMP_IF_TRUE)
+POP_JUMP_IF_FALSE = int(OpCode.POP_JUMP_IF_FALSE)
+CALL = int(OpCode.CALL)
+INVOKE = int(OpCode.INVOKE)
+PREPARE_INVOKE = int(OpCode.PREPARE_INVOKE)
+PREPARE_SUPER_INVOKE = int(OpCode.PREPARE_SUPER_INVOKE)
+CALL_METHOD = int(OpCode.CALL_METHOD)
+CLOSURE = int(OpCode.CLOSURE)
+CLOSE_UPVALUE = int(OpCode.CLOSE_UPVALUE)
+RETURN = int(OpCode.RETURN)
+CLASS = int(OpCode.CLASS)
+INHERIT = int(OpCode.INHERIT)
+METHOD = int(OpCode.METHOD)
+
+
+class CallFrame:
+
+    def __init__(self, closure: Closure, base: int):
+        self.closure = closure
+        self.base = base  # stack index of slot zero
+        self.ip = 0
+
+        chunk = closure.function.chunk
+        self.code = chunk.code
+        self.constants = chunk.constants
+        self.tokens = chunk.tokens
+
+
+class VM:
+
+    # A stack-based bytecode virtual machine in the style of clox. Programs are
+    # compiled by `Compiler` and then run in a single dispatch loop, so there's
+    # no python-level recursion for Lox function calls.
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.compiler = Compiler()
+        self.globals = {}
+        self.stack = []
+        self.frames: List[CallFrame] = []
+        self.open_upvalues = {}
+
+        self.globals["clock"] = ClockBuiltinFn()
+
+    def resolve(self, expression: expr.Expr, depth: int, slot: int) -> None:
+        # The compiler does its own slot resolution, so the depths and slots
+        # computed by the Resolver aren't needed here.
+        pass
+
+    def resolve_tail_call(self, expression: expr.Call) -> None:
+        # Lox calls don't recurse in python here, so tail calls need nothing special
+        pass
+
+    def resolve_counted_loop(self, loop: CountedLoop) -> None:
+        # only the tree-walking Interpreter has a fast path for these
+        pass
+
+    def resolve_empty_scope(self, node: Union[stmt.Block, stmt.Function]) -> None:
+        # scopes are worked out separately here, as with `resolve`
+        pass
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        script = Closure(self.compiler.compile(statements), [])
+        self.stack.append(script)
+        self.frames.append(CallFrame(script, 0))
+        try:
+            self.run()
+        except LoxRuntimeError as e:
+            self.runtime.runtime_error(e)
+        except LoxAssertionError as e:
+            self.runtime.assertion_error(e)
+        finally:
+            self.stack.clear()
+            self.frames.clear()
+            self.open_upvalues.clear()
+
+    def run(self) -> None:
+        stack = self.stack
+        frames = self.frames
+        global_values = self.globals
+        push = stack.append
+        pop = stack.pop
+
+        frame = frames[-1]
+        closure = frame.closure
+        code = frame.code
+        constants = frame.constants
+        tokens = frame.tokens
+        ip = frame.ip
+        base = frame.base
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+
+            elif op == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+
+            elif op == GET_PROPERTY:
+                instance = stack[-1]
+                if type(instance) is not VMInstance:
+                    raise LoxRuntimeError(tokens[ip], "Only class instances have properties.")
+                name = constants[code[ip]]
+                ip += 1
+                fields = instance.fields
+                if name in fields:
+                    stack[-1] = fields[name]
+                else:
+                    stack[-1] = self.bind_method(instance.klass, name, tokens[ip - 1])
+
+            elif op == POP_JUMP_IF_FALSE:
+                value = pop()
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+
+            elif op == LESS:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left < right
+
+            elif op == ADD:
+                right = pop()
+                left = stack[-1]
+                if type(left) is type(right) and (type(left) is float or type(left) is str):
+                    stack[-1] = left + right
+                else:
+                    raise LoxRuntimeError(
+                        tokens[ip - 1], "Runtime Error: Operands must be two numbers or two strings"
+                    )
+
+            elif op == SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left - right
+
+            elif op == POP:
+                pop()
+
+            elif op == JUMP:
+                ip = code[ip]
+
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+
+            elif op == GET_GLOBAL:
+                name = constants[code[ip]]
+                if name not in global_values:
+                    raise LoxRuntimeError(tokens[ip], f"Undefined variable {name}.")
+                push(global_values[name])
+                ip += 1
+
+            elif op == INVOKE:
+                name = constants[code[ip]]
+                arg_count = code[ip + 1]
+                ip += 2
+                receiver = stack[-1 - arg_count]
+
+                # fast path for plain method calls on instances
+                if type(receiver) is VMInstance and name not in receiver.fields:
+                    method = receiver.klass.methods.get(name)
+                    if method is not None and method.function.arity == arg_count and len(frames) < FRAMES_MAX:
+                        frame.ip = ip
+                        frame = CallFrame(method, len(stack) - arg_count - 1)
+                        frames.append(frame)
+                        closure = method
+                        code = frame.code
+                        constants = frame.constants
+                        tokens = frame.tokens
+                        ip = 0
+                        base = frame.base
+                        continue
+
+                frame.ip = ip
+                self.invoke(receiver, name, arg_count, tokens[ip - 2], tokens[ip - 1])
+                frame = frames[-1]
+                closure = frame.closure
+                code = frame.code
+                constants = frame.constants
+                tokens = frame.tokens
+                ip = frame.ip
+                base = frame.base
+
+            elif op == CALL:
+                arg_count = code[ip]
+                ip += 1
+                callee = stack[-1 - arg_count]
+
+                # fast path for calling closures directly
+                if type(callee) is Closure and callee.function.arity == arg_count and len(frames) < FRAMES_MAX:
+                    frame.ip = ip
+                    frame = CallFrame(callee, len(stack) - arg_count - 1)
+                    frames.append(frame)
+                    closure = callee
+                    code = frame.code
+                    constants = frame.constants
+                    tokens = frame.tokens
+                    ip = 0
+                    base = frame.base
+                    continue
+
+                frame.ip = ip
+                self.call_value(callee, arg_count, tokens[ip - 1])
+                frame = frames[-1]
+                closure = frame.closure
+                code = frame.code
+                constants = frame.constants
+                tokens = frame.tokens
+                ip = frame.ip
+                base = frame.base
+
+            elif op == RETURN:
+                result = pop()
+                if self.open_upvalues:
+                    self.close_upvalues(base)
+                frames.pop()
+                del stack[base:]
+                if not frames:
+                    return
+
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = frame.code
+                constants = frame.constants
+                tokens = frame.tokens
+                ip = frame.ip
+                base = frame.base
+
+            elif op == GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.location >= 0:
+                    push(stack[upvalue.location])
+                else:
+                    push(upvalue.closed)
+
+            elif op == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.location >= 0:
+                    stack[upvalue.location] = stack[-1]
+                else:
+                    upvalue.closed = stack[-1]
+
+            elif op == CHECK_INSTANCE:
+                if type(stack[-1]) is not VMInstance:
+                    raise LoxRuntimeError(tokens[ip - 1], "Only instances have fields.")
+
+            elif op == SET_PROPERTY:
+                # CHECK_INSTANCE has already checked the instance
+                value = pop()
+                instance = pop()
+                instance.fields[constants[code[ip]]] = value
+                push(value)
+                ip += 1
+
+            elif op == EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+
+            elif op == NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+
+            elif op == GREATER:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left > right
+
+            elif op == GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left >= right
+
+            elif op == LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left <= right
+
+            elif op == MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left * right
+
+            elif op == DIVIDE:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                if right == 0:
+                    raise LoxRuntimeError(tokens[ip - 1], "Runtime Error: Cannot Divide by zero.")
+                stack[-1] = left / right
+
+            elif op == MODULO:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                if right == 0:
+                    raise LoxRuntimeError(tokens[ip - 1], "Runtime Error: Cannot Modulo by zero.")
+                stack[-1] = left % right
+
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operand must be a numbers.")
+                stack[-1] = -value
+
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+
+            elif op == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += 1
+                else:
+                    ip = code[ip]
+
+            elif op == NIL:
+                push(None)
+
+            elif op == TRUE:
+                push(True)
+
+            elif op == FALSE:
+                push(False)
+
+            elif op == SET_GLOBAL:
+                name = constants[code[ip]]
+                if name not in global_values:
+                    raise LoxRuntimeError(tokens[ip], f"Undefined variable {name}.")
+                global_values[name] = stack[-1]
+                ip += 1
+
+            elif op == DEFINE_GLOBAL:
+                global_values[constants[code[ip]]] = pop()
+                ip += 1
+
+            elif op == PRINT:
+                print(str(pop()))
+
+            elif op == ASSERT:
+                value = pop()
+                if value is None or value is False:
+                    raise LoxAssertionError(tokens[ip - 1].line, "Assertion Error")
+
+            elif op == CLOSURE:
+                function = constants[code[ip]]
+                ip += 1
+                upvalues = []
+                for _ in range(function.upvalue_count):
+                    is_local = code[ip]
+                    index = code[ip + 1]
+                    ip += 2
+                    if is_local:
+                        upvalues.append(self.capture_upvalue(base + index))
+                    else:
+                        upvalues.append(closure.upvalues[index])
+                push(Closure(function, upvalues))
+
+            elif op == CLOSE_UPVALUE:
+                self.close_upvalues(len(stack) - 1)
+                pop()
+
+            elif op == PREPARE_INVOKE:
+                instance = stack[-1]
+                if type(instance) is not VMInstance:
+                    raise LoxRuntimeError(tokens[ip], "Only class instances have properties.")
+                name = constants[code[ip]]
+                ip += 1
+                # fields shadow methods, and a field's value takes the
+                # receiver's place too, as it would be called by CALL
+                if name in instance.fields:
+                    stack[-1] = instance.fields[name]
+                    push(stack[-1])
+                else:
+                    push(self.find_method(instance.klass, name, tokens[ip - 1]))
+
+            elif op == PREPARE_SUPER_INVOKE:
+                name = constants[code[ip]]
+                ip += 1
+                stack[-1] = self.find_method(stack[-1], name, tokens[ip - 1])
+
+            elif op == CALL_METHOD:
+                # the method (or a field's value) is beneath the arguments, and the receiver beneath it
+                arg_count = code[ip]
+                ip += 1
+                callee = stack.pop(-1 - arg_count)
+                frame.ip = ip
+                self.call_value(callee, arg_count, tokens[ip - 1])
+                frame = frames[-1]
+                closure = frame.closure
+                code = frame.code
+                constants = frame.constants
+                tokens = frame.tokens
+                ip = frame.ip
+                base = frame.base
+
+            elif op == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                superclass = pop()
+                stack[-1] = self.bind_method(superclass, name, tokens[ip - 1])
+
+            elif op == CLASS:
+                push(VMClass(constants[code[ip]]))
+                ip += 1
+
+            elif op == INHERIT:
+                superclass = stack[-2]
+                if type(superclass) is not VMClass:
+                    raise LoxRuntimeError(tokens[ip - 1], "Superclass must be a class.")
+                # copy-down inheritance, the subclass's own methods are added afterwards
+                pop().methods.update(superclass.methods)
+
+            elif op == METHOD:
+                method = pop()
+                stack[-1].methods[constants[code[ip]]] = method
+                ip += 1
+
+            else:
+                raise RuntimeError(f"Unknown opcode {op}")
+
+    def call_value(self, callee: object, arg_count: int, paren: Token) -> None:
+        if type(callee) is Closure:
+            self.call(callee, arg_count, paren)
+
+        elif type(callee) is BoundMethod:
+            self.stack[-1 - arg_count] = callee.receiver
+            self.call(callee.method, arg_count, paren)
+
+        elif type(callee) is VMClass:
+            self.stack[-1 - arg_count] = VMInstance(callee)
+            initializer = callee.methods.get("init")
+            if initializer is not None:
+                self.call(initializer, arg_count, paren)
+            elif arg_count != 0:
+                raise LoxRuntimeError(paren, f"Expected 0 arguments but got {arg_count}.")
+
+        elif isinstance(callee, LoxCallable):
+            if arg_count != callee.arity():
+                raise LoxRuntimeError(paren, f"Expected {callee.arity()} arguments but got {arg_count}.")
+            arguments = self.stack[len(self.stack) - arg_count:]
+            result = callee.call(self, arguments)
+            del self.stack[len(self.stack) - arg_count - 1:]
+            self.stack.append(result)
+
+        else:
+            raise LoxRuntimeError(paren, "Can only call functions and classes.")
+
+    def call(self, closure: Closure, arg_count: int, paren: Token) -> None:
+        if arg_count != closure.function.arity:
+            raise LoxRuntimeError(paren, f"Expected {closure.function.arity} arguments but got {arg_count}.")
+        if len(self.frames) >= FRAMES_MAX:
+            raise LoxRuntimeError(paren, "Stack overflow.")
+        self.frames.append(CallFrame(closure, len(self.stack) - arg_count - 1))
+
+    def invoke(self, receiver: object, name: str, arg_count: int, name_token: Token, paren: Token) -> None:
+        if type(receiver) is not VMInstance:
+            raise LoxRuntimeError(name_token, "Only class instances have properties.")
+
+        if name in receiver.fields:
+            value = receiver.fields[name]
+            self.stack[-1 - arg_count] = value
+            self.call_value(value, arg_count, paren)
+            return
+
+        self.call(self.find_method(receiver.klass, name, name_token), arg_count, paren)
+
+    @staticmethod
+    def find_method(klass: VMClass, name: str, name_token: Token) -> Closure:
+        method = klass.methods.get(name)
+        if method is None:
+            raise LoxRuntimeError(name_token, f"Undefined property {name}.")
+        return method
+
+    def bind_method(self, klass: VMClass, name: str, name_token: Token) -> BoundMethod:
+        return BoundMethod(self.stack[-1], self.find_method(klass, name, name_token))
+
+    def capture_upvalue(self, location: int) -> Upvalue:
+        upvalue = self.open_upvalues.get(location)
+        if upvalue is None:
+            upvalue = Upvalue(location)
+            self.open_upvalues[location] = upvalue
+        return upvalue
+
+    def close_upvalues(self, last: int) -> None:
+        for location in [l for l in self.open_upvalues if l >= last]:
+            upvalue = self.open_upvalues.pop(location)
+            upvalue.closed = self.stack[location]
+            upvalue.location = -1
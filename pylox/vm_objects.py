@@ -0,0 +1,54 @@
+from pylox.chunk import FunctionPrototype
+
+from typing import List
+
+
+class Upvalue:
+
+    # While the captured variable is still on the VM stack, `location` is its
+    # stack index. Once the variable goes out of scope the value is moved into
+    # `closed` and `location` is set to -1.
+
+    def __init__(self, location: int):
+        self.location = location
+        self.closed = None
+
+
+class Closure:
+
+    def __init__(self, function: FunctionPrototype, upvalues: List[Upvalue]):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self) -> str:
+        return str(self.function)
+
+
+class VMClass:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.methods = {}
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class VMInstance:
+
+    def __init__(self, klass: VMClass):
+        self.klass = klass
+        self.fields = {}
+
+    def __str__(self) -> str:
+        return self.klass.name + " instance"
+
+
+class BoundMethod:
+
+    def __init__(self, receiver: VMInstance, method: Closure):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self) -> str:
+        return str(self.method)
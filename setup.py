@@ -8,9 +8,11 @@ setup(
     author='Sam Wheating',
     author_email='SamWheating@gmail.com',
     description='Python 3.10+ Implementation of the Lox programming language',
-    packages=find_packages(),    
+    # benchmarks/ holds scripts that read the repo's test_scripts, so it isn't installed
+    packages=find_packages(exclude=['benchmarks']),
+    package_data={'pylox.bench': ['*.lox']},
     install_requires=[],
     entry_points = {
-        'console_scripts': ['pylox=pylox.lox:main'],
+        'console_scripts': ['pylox=pylox.lox:main', 'pylox-bench=pylox.bench.runner:main'],
     }
 )
\ No newline at end of file
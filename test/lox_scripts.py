@@ -0,0 +1,48 @@
+import contextlib
+import glob
+import io
+import os
+import re
+from typing import Optional
+from pylox.lox import Lox
+
+# Helpers shared by the tests that run whole Lox programs, mostly to check
+# that each engine (and the optimizer) prints what the tree-walker does
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = sorted(
+    glob.glob(os.path.join(REPO_ROOT, "test_scripts", "*.lox"))
+    + glob.glob(os.path.join(REPO_ROOT, "example_programs", "*.lox"))
+)
+
+
+def read(path: str) -> str:
+    with open(path) as ifp:
+        return ifp.read()
+
+
+def run_source(source: str, engine: str = "tree", optimize: bool = False, max_depth: Optional[int] = None) -> str:
+    runtime = Lox(engine=engine, optimize=optimize)
+    if max_depth is not None:
+        runtime.interpreter.max_depth = max_depth
+    runtime.source = source
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        runtime.run()
+    # the output of clock() is the only thing that can differ between runs
+    return re.sub(r"^\d{10}\.\d+$", "<clock>", output.getvalue(), flags=re.MULTILINE)
+
+
+class MatchesTreeWalker:
+
+    # Mixed into an engine's TestCase, runs every script with `engine` and
+    # checks it prints the same as the tree-walking Interpreter
+
+    engine = ""
+
+    def test_scripts_match_tree_walker(self):
+
+        for path in SCRIPTS:
+            source = read(path)
+            with self.subTest(script=os.path.basename(path)):
+                assert run_source(source, self.engine) == run_source(source, "tree")
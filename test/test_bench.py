@@ -0,0 +1,87 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from pylox.bench import runner
+
+
+def results(**medians) -> dict:
+    return {"results": [
+        {"benchmark": name, "engine": "tree", "optimize": False, "median": median}
+        for name, median in medians.items()
+    ]}
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name: str, source: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as ofp:
+            ofp.write(source)
+        return path
+
+    def test_the_suite_has_every_workload(self):
+
+        assert set(runner.benchmarks()) == {
+            "binary_trees", "fib", "instantiation", "linked_list", "method_call", "string_equality", "trees", "zoo",
+        }
+
+    def test_measuring_a_benchmark(self):
+
+        path = self.write("count.lox", "var n = 0; while (n < 100) n = n + 1; print n;")
+
+        result = runner.measure(path, "vm", warmup=2, repeat=3)
+        assert result["benchmark"] == "count" and result["engine"] == "vm"
+        assert len(result["times"]) == 3
+        assert result["min"] <= result["median"] <= result["max"]
+        assert result["variance"] >= 0
+
+        with self.assertRaises(RuntimeError):
+            runner.measure(self.write("broken.lox", "print nil + 1;"), "tree", warmup=0, repeat=1)
+        with self.assertRaises(RuntimeError):
+            runner.measure(self.write("clock.lox", "print clock();"), "tree", warmup=0, repeat=2)
+
+    def test_comparing_results(self):
+
+        baseline = results(fib=1.0, zoo=1.0)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            assert not runner.compare(baseline, results(fib=1.04, zoo=0.5), threshold=5)
+            assert runner.compare(baseline, results(fib=1.06, zoo=0.5), threshold=5)
+            assert not runner.compare(baseline, results(fib=1.06), threshold=10)
+
+        lines = output.getvalue().splitlines()
+        assert "fib (tree)    1.0000s    1.0600s     +6.0%  slower" in lines
+        assert "zoo (tree)    1.0000s    0.5000s    -50.0%  faster" in lines
+        assert "zoo (tree): only in the baseline" in lines
+
+    def test_running_and_comparing_from_the_command_line(self):
+
+        self.write("count.lox", "var n = 0; while (n < 100) n = n + 1; print n;")
+        self.write("other.lox", "print 1;")
+        output = os.path.join(self.directory, "results.json")
+
+        with mock.patch.object(runner, "BENCHMARKS_DIR", self.directory), contextlib.redirect_stdout(io.StringIO()):
+            runner.main(["run", "count", "--engine", "tree", "--engine", "closure", "--repeat", "2", "--output", output])
+            with open(output) as ifp:
+                written = json.load(ifp)
+            assert [(r["benchmark"], r["engine"]) for r in written["results"]] == [("count", "tree"), ("count", "closure")]
+
+            with self.assertRaises(SystemExit) as exit:
+                runner.main(["compare", output, output])
+            assert exit.exception.code == 0
+
+            # far faster than any run could be, so the new one has to count as a regression
+            written["results"][0]["median"] = 1e-9
+            with open(output, "w") as ofp:
+                json.dump(written, ofp)
+            with self.assertRaises(SystemExit) as exit:
+                runner.main(["run", "count", "--repeat", "1", "--compare", output])
+            assert exit.exception.code == 1
@@ -0,0 +1,41 @@
+import unittest
+from lox_scripts import MatchesTreeWalker, run_source
+
+
+class TestClosureCompiler(MatchesTreeWalker, unittest.TestCase):
+
+    engine = "closure"
+
+    def test_runtime_errors_match_tree_walker(self):
+
+        programs = [
+            'print "a" - 1;',
+            "print -nil;",
+            "print 1 / 0;",
+            "print 1 % 0;",
+            'print 1 + "a";',
+            "print missing;",
+            "missing = 1;",
+            "var a = 1; a();",
+            "fun f(a) {} f();",
+            "class A {} print A().field;",
+            "var a = 1; a.field = 2;",
+            "var a = 1; class B < a {}",
+            "class A {} class B < A { m() { return super.missing; } } B().m();",
+        ]
+        for source in programs:
+            with self.subTest(source=source):
+                assert run_source(source, "closure") == run_source(source, "tree")
+
+    def test_recursion_and_methods(self):
+
+        source = """
+        fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+        print fib(15);
+        class Counter {
+            init() { this.count = 0; }
+            increment() { this.count = this.count + 1; return this; }
+        }
+        print Counter().increment().increment().count;
+        """
+        assert run_source(source, "closure") == "610.0\n2.0\n"
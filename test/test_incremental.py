@@ -0,0 +1,118 @@
+import os
+import random
+import unittest
+from unittest import mock
+from pylox.incremental import Diagnostic, Diagnostics, Document
+from pylox.parser import Parser
+from pylox.program_cache import Annotations
+from pylox.resolver import Resolver
+from pylox.scanner import RegexScanner
+from pylox.token import Token
+import pylox.expr as expr
+import pylox.stmt as stmt
+from lox_scripts import REPO_ROOT
+
+# pieces of Lox to insert, chosen to open and close scopes, strings and
+# comments, merge and split tokens, and cause each kind of error
+FRAGMENTS = [
+    "{", "}", ";", '"', "\n", " ", "(", ")", "=", "!", "@", "//", "1.", "5", "x",
+    "var ", "print ", "return ", "this", "super.m", "fun f(a) {", "class A < B {",
+    "if (x) ", "else ", "for (var i = 0; i < 3; i = i + 1) ",
+]
+
+
+def same(a, b) -> bool:
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(map(same, a, b))
+    if isinstance(a, (expr.Expr, stmt.Stmt, Token)):
+        return type(a) == type(b) and all(same(getattr(a, f), getattr(b, f)) for f in a.__match_args__)
+    return a == b
+
+
+def from_scratch(source: str):
+    """Scans, parses and resolves `source` in full, as a Document should have"""
+
+    runtime = Diagnostics()
+    tokens = RegexScanner(source, runtime).scan_tokens()
+    parser = Parser(tokens, runtime)
+    statements, parsed = [], []
+    while not parser.is_at_end():
+        errors = len(runtime.entries)
+        statements.append(parser.declaration())
+        parsed.append(len(runtime.entries) == errors)
+    for statement, without_errors in zip(statements, parsed):
+        if without_errors:
+            Resolver(Annotations(), runtime).resolve([statement])
+    return tokens, statements, runtime.entries
+
+
+class TestDocument(unittest.TestCase):
+
+    def assert_matches_from_scratch(self, document: Document):
+        tokens, statements, diagnostics = from_scratch(document.source)
+        assert same(document.tokens, tokens)
+        assert same(document.statements, statements)
+        assert document.diagnostics == diagnostics
+
+    def test_randomized_edits_match_a_full_parse(self):
+
+        with open(os.path.join(REPO_ROOT, "example_programs", "doubly_linked_list.lox")) as ifp:
+            source = ifp.read()
+
+        for seed in range(3):
+            generator = random.Random(seed)
+            document = Document(source)
+            for _ in range(150):
+                start = generator.randint(0, len(document.source))
+                end = min(len(document.source), start + generator.choice([0, 0, 1, 2, 5, 20]))
+                text = "".join(generator.choice(FRAGMENTS) for _ in range(generator.choice([0, 1, 1, 2, 4])))
+
+                document.edit(start, end, text)
+                with self.subTest(seed=seed, source=document.source):
+                    self.assert_matches_from_scratch(document)
+
+    def test_only_changed_declarations_are_parsed_and_resolved(self):
+
+        document = Document("fun a() { return 1; }\nfun b() { return 2; }\nfun c() { return 3; }\n")
+        a, b, c = document.statements
+
+        with mock.patch("pylox.incremental.Resolver", wraps=Resolver) as resolver:
+            statements, diagnostics = document.edit(document.source.index("2"), document.source.index("2") + 1, "x + 1")
+
+        assert statements[0] is a and statements[2] is c
+        assert statements[1] is not b
+        assert resolver.call_count == 1
+        assert diagnostics == []
+        self.assert_matches_from_scratch(document)
+
+    def test_later_declarations_move_to_new_lines(self):
+
+        document = Document("var a = 1;\nfun f() { return this; }\n")
+        [_, function] = document.statements
+        assert document.diagnostics == [Diagnostic(2, "Error : Can't use 'this' outside of a class.")]
+
+        statements, diagnostics = document.edit(0, 0, "// a comment\n\n")
+
+        assert statements[1] is function
+        assert function.name.line == 4
+        assert diagnostics == [Diagnostic(4, "Error : Can't use 'this' outside of a class.")]
+
+    def test_edits_can_merge_and_split_declarations(self):
+
+        document = Document("print 1;\nprint 2;\nprint 3;\n")
+
+        document.edit(0, 0, "{")
+        self.assert_matches_from_scratch(document)
+        assert len(document.statements) == 1
+        assert document.diagnostics == [Diagnostic(4, "Error at end: Expect '}' after block.")]
+
+        document.edit(len(document.source) - 10, len(document.source) - 10, "}")
+        self.assert_matches_from_scratch(document)
+        assert len(document.statements) == 2
+        assert document.diagnostics == []
+
+    def test_edits_must_be_inside_the_source(self):
+
+        document = Document("print 1;")
+        with self.assertRaises(ValueError):
+            document.edit(5, 20, "")
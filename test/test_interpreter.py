@@ -1,3 +1,5 @@
+import contextlib
+import io
 import unittest
 from pylox.interpreter import Interpreter
 from pylox.token_type import TokenType
@@ -39,4 +41,187 @@ class TestInterpreter(unittest.TestCase):
         result = self.interpreter.interpret([expression])
         
         assert result is None
-        assert self.runtime.had_runtime_error
\ No newline at end of file
+        assert self.runtime.had_runtime_error
+
+    def test_locals_are_resolved_to_slots(self):
+
+        self.runtime.source = """
+        var a = "global";
+        {
+            var a = "outer";
+            var b = "second";
+            fun show() { print a + " " + b; }
+            {
+                var a = "shadow";
+                show();
+                b = a;
+            }
+            show();
+        }
+        print a;
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue() == "outer second\nouter shadow\nglobal\n"
+        assert (1, 1) in self.runtime.interpreter.locals.values()
+
+    def test_global_slots_follow_redefinition(self):
+
+        self.runtime.source = """
+        fun show() { print value; }
+        var value = 1;
+        show();
+        var value = "redefined";
+        show();
+        value = nil;
+        show();
+        missing = 1;
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue().startswith("1.0\nredefined\nNone\nUndefined variable missing.")
+        assert self.runtime.had_runtime_error
+
+    def test_returns_with_and_without_exceptions(self):
+
+        source = """
+        fun find(limit) {
+            for (var i = 0; i < limit; i = i + 1) {
+                { if (i == 3) return i; }
+            }
+            return "none";
+        }
+        fun nothing() { return; }
+        print find(10);
+        print find(2);
+        print nothing();
+        """
+        for signal_returns in [True, False]:
+            with self.subTest(signal_returns=signal_returns):
+                runtime = Lox()
+                runtime.interpreter = Interpreter(runtime, signal_returns=signal_returns)
+                runtime.source = source
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    runtime.run()
+
+                assert output.getvalue() == "3.0\nnone\nNone\n"
+
+    def test_methods_are_inherited_through_deep_hierarchies(self):
+
+        self.runtime.source = """
+        class A { init(name) { this.name = name; } describe() { return "A " + this.name; } }
+        class B < A { describe() { return "B " + super.describe(); } }
+        class C < B {}
+        class D < C { describe() { return "D " + super.describe(); } }
+        print D("d").describe();
+        print C("c").describe();
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue() == "D B A d\nB A c\n"
+        assert self.runtime.interpreter.globals.get(Token(TokenType.IDENTIFIER, "D", None, 1)).arity() == 1
+
+    def test_method_invocation(self):
+
+        self.runtime.source = """
+        fun shout() { return "field"; }
+        class A {
+            init(n) { this.n = n; }
+            add(x) { return this.n + x; }
+            shout() { return "method"; }
+        }
+        var a = A(1);
+        print a.add(2);
+        var add = a.add;
+        print add(3);
+        print a.shout();
+        a.shout = shout;
+        print a.shout();
+        print a.init(5).n;
+        a.add();
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue().startswith("3.0\n4.0\nmethod\nfield\n5.0\nExpected 1 arguments but got 0.")
+
+    def test_tail_calls_run_in_constant_stack(self):
+
+        # each of these recurses far deeper than python's recursion limit would
+        # allow if every Lox call nested python calls
+        self.runtime.source = """
+        fun count(n, acc) { if (n == 0) return acc; return count(n - 1, acc + 1); }
+        fun even(n) { if (n == 0) return true; return odd(n - 1); }
+        fun odd(n) { if (n == 0) return false; return even(n - 1); }
+        class Walker {
+            init(n) { this.n = n; }
+            walk(k) { if (k == 0) return this; this.n = this.n + 1; return this.walk(k - 1); }
+            reset() { return this.init(0); }
+        }
+        print count(5000, 0);
+        print even(5001);
+        print Walker(0).walk(5000).n;
+        print Walker(3).reset().n;
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue() == "5000.0\nFalse\n5000.0\n0.0\n"
+
+    def test_counted_loops(self):
+
+        self.runtime.source = """
+        fun first_square_over(n, limit) {
+            for (var i = 0; i < n; i = i + 1) { var square = i * i; if (square > limit) return square; }
+            return nil;
+        }
+        var total = 0;
+        for (var i = 3; i >= 1; i = i - 1) for (var j = 0; j < i; j = j + 1) total = total + j;
+        print total;
+        print first_square_over(10, 10);
+        print first_square_over(2, 10);
+        for (var i = 0; i < 4; i = i + 1) { print i; i = i + 2; }
+        var closure;
+        for (var i = 0; i < 3; i = i + 1) { fun get() { return i; } closure = get; }
+        print closure();
+        for (var i = 0; i < "3"; i = i + 1) print i;
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue().startswith("4.0\n16.0\nNone\n0.0\n3.0\n3.0\nOperands must be numbers.")
+        # the loops that assign their counter or declare a function run normally
+        assert sorted(loop.name.line for loop in self.runtime.interpreter.counted_loops.values()) == [3, 7, 7, 15]
+
+    def test_empty_scopes_are_elided(self):
+
+        self.runtime.source = """
+        class A { init() { this.n = 1; } name() { return "A"; } }
+        class B < A { name() { { return "B" + super.name(); } } }
+        fun make(a) { fun get() { { return a; } } return get; }
+        var n = 0;
+        while (n < 3) { if (n == 1) { print B().name() + make("!")(); } n = n + 1; }
+        { var shadow = "outer"; { { var shadow = "inner"; } print shadow; } }
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.runtime.run()
+
+        assert output.getvalue() == "BA!\nouter\n"
+        names = sorted(
+            node.name.lexeme if isinstance(node, stmt.Function) else type(node).__name__
+            for node in self.runtime.interpreter.empty_scopes
+        )
+        # everything except `make`, the methods (whose scopes hold `this`) and
+        # the blocks declaring `shadow` runs without a scope of its own
+        assert names == ["Block", "Block", "Block", "Block", "Block", "get"]
@@ -0,0 +1,101 @@
+import contextlib
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+from pylox.lox import Lox
+from lox_scripts import REPO_ROOT, SCRIPTS
+
+
+
+def run(source: str, stream: bool, engine: str = "tree", scanner: str = "regex", path: str = None) -> str:
+    runtime = Lox(engine=engine, scanner=scanner)
+    # streamed programs read their failed assertions back from the file
+    runtime.source_path = path
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if stream:
+            runtime.run_stream(source[i : i + 16] for i in range(0, len(source), 16))
+        else:
+            runtime.source = source
+            runtime.run()
+    return re.sub(r"^\d{10}\.\d+$", "<clock>", output.getvalue(), flags=re.MULTILINE)
+
+
+class TestLox(unittest.TestCase):
+
+    def test_streamed_scripts_match(self):
+
+        for path in SCRIPTS:
+            with open(path) as ifp:
+                source = ifp.read()
+            for engine, scanner in [("tree", "regex"), ("vm", "char"), ("closure", "store")]:
+                with self.subTest(script=os.path.basename(path), engine=engine, scanner=scanner):
+                    assert run(source, True, engine, scanner, path) == run(source, False, engine, scanner)
+
+    def test_mapped_scripts_match(self):
+
+        for path in SCRIPTS:
+            with open(path) as ifp:
+                source = ifp.read()
+            with self.subTest(script=os.path.basename(path)):
+                runtime = Lox()
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    assert runtime.run_mapped(path)
+                mapped = re.sub(r"^\d{10}\.\d+$", "<clock>", output.getvalue(), flags=re.MULTILINE)
+                assert mapped == run(source, False)
+
+    def test_mapping_falls_back_for_non_ascii_identifiers(self):
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".lox", delete=False) as ofp:
+            ofp.write('var caf\u00e9 = "cr\u00e8me";\nprint caf\u00e9 + 1;\n')
+        self.addCleanup(os.remove, ofp.name)
+
+        runtime = Lox()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            assert not runtime.run_mapped(ofp.name)
+        assert output.getvalue() == ""
+        assert not runtime.had_error and not runtime.had_runtime_error
+
+    def test_streaming_stops_at_a_syntax_error(self):
+
+        source = 'print "before";\nprint 1 +;\nprint "after";\nvar = 2;\n'
+
+        # declarations before the error have already run, nothing after it does
+        assert run(source, True) == (
+            "before\n"
+            "[line: 2] Error at ;: Expect expression.\n"
+            "[line: 4] Error at =: Expect variable name.\n"
+        )
+        assert run(source, False) == (
+            "[line: 2] Error at ;: Expect expression.\n"
+            "[line: 4] Error at =: Expect variable name.\n"
+        )
+
+    def test_streamed_assertions_show_the_source_line(self):
+
+        with tempfile.NamedTemporaryFile("w", suffix=".lox", delete=False) as ofp:
+            ofp.write("var a = 1;\nassert a == 2;\nprint a;\n")
+        self.addCleanup(os.remove, ofp.name)
+
+        runtime = Lox()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), self.assertRaises(SystemExit):
+            runtime.run_file(ofp.name, stream=True)
+
+        assert output.getvalue() == "Assertion Error on line 2: \n ->  assert a == 2;\n"
+
+    def test_only_the_selected_engine_is_imported(self):
+
+        # run in a fresh interpreter, since this one has imported everything for the other tests
+        code = "import sys, pylox.lox; pylox.lox.Lox(engine='vm'); print(' '.join(sorted(sys.modules)))"
+        modules = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.split()
+
+        assert "pylox.vm" in modules
+        for module in ["pylox.stack_interpreter", "pylox.closure_compiler", "pylox.transpiler", "pylox.profiler", "pylox.tracing", "pylox.stats"]:
+            assert module not in modules
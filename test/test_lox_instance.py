@@ -0,0 +1,51 @@
+import unittest
+from pylox.lox_class import LoxClass
+from pylox.lox_instance import LoxInstance, GetCache, SetCache, MAX_CACHED_SHAPES
+from pylox.exceptions import LoxRuntimeError
+from pylox.token_type import TokenType
+from pylox.token import Token
+
+
+def name(lexeme: str) -> Token:
+    return Token(TokenType.IDENTIFIER, lexeme, None, 1)
+
+
+class TestLoxInstance(unittest.TestCase):
+
+    def setUp(self):
+        self.klass = LoxClass("Point", None, {})
+
+    def test_instances_with_the_same_fields_share_a_shape(self):
+
+        first, second, other = LoxInstance(self.klass), LoxInstance(self.klass), LoxInstance(self.klass)
+        for instance in [first, second]:
+            instance.set_attr(name("x"), 1.0)
+            instance.set_attr(name("y"), 2.0)
+        other.set_attr(name("y"), 2.0)
+        other.set_attr(name("x"), 1.0)
+
+        assert first.shape is second.shape
+        assert first.shape is not other.shape
+        assert first.values == [1.0, 2.0]
+        assert other.get_attr(name("x")) == 1.0
+
+    def test_caches_follow_each_shape(self):
+
+        get_x, set_x = GetCache(name("x")), SetCache(name("x"))
+        instances = [LoxInstance(self.klass) for _ in range(MAX_CACHED_SHAPES + 2)]
+        for i, instance in enumerate(instances):
+            # give every instance a different shape before it reaches the sites
+            instance.set_attr(name(f"field{i}"), None)
+            set_x.set(instance, float(i))
+            set_x.set(instance, float(i) * 10)
+
+        for i, instance in enumerate(instances):
+            assert get_x.get(instance) == float(i) * 10
+            assert instance.get_attr(name("x")) == float(i) * 10
+
+        assert len(get_x.entries) == MAX_CACHED_SHAPES
+
+    def test_missing_property(self):
+
+        with self.assertRaises(LoxRuntimeError):
+            GetCache(name("missing")).get(LoxInstance(self.klass))
@@ -0,0 +1,97 @@
+import os
+import unittest
+from pylox.lox import Lox
+from pylox.optimizer import Optimizer
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.scanner import Scanner
+import pylox.expr as expr
+import pylox.stmt as stmt
+from lox_scripts import SCRIPTS, read, run_source
+
+
+def optimize(source: str):
+    runtime = Lox()
+    statements = Parser(Scanner(source, runtime).scan_tokens(), runtime).parse()
+    Resolver(runtime.interpreter, runtime).resolve(statements)
+    return Optimizer().optimize(statements)
+
+
+class TestOptimizer(unittest.TestCase):
+
+    def test_scripts_match_unoptimized(self):
+
+        for path in SCRIPTS:
+            source = read(path)
+            for engine in ["tree", "vm"]:
+                with self.subTest(script=os.path.basename(path), engine=engine):
+                    assert run_source(source, engine, optimize=True) == run_source(source, engine)
+
+    def test_runtime_errors_are_preserved(self):
+
+        programs = [
+            "print 1 / 0;",
+            "print 1 % 0;",
+            'print "a" - 1;',
+            'print 1 + "a";',
+            "print -nil;",
+            'print "a" < "b";',
+            "fun f() { var zero = 0; return 2 / zero; } print f();",
+            "fun f(a) { for (var i = 0; i < 2; i = i + 1) print a * 2; } f(1); f(nil);",
+            "fun f(a) { var b = a; while (false) print b - 1; print b + 1; } f(1); f(true);",
+            "fun f() { var n = 0; while (n < 1) { print missing * 2; n = n + 1; } } f();",
+        ]
+        for source in programs:
+            with self.subTest(source=source):
+                assert run_source(source, optimize=True) == run_source(source)
+
+    def test_constants_are_folded_and_propagated(self):
+
+        [function] = optimize("fun f(r) { var pi = 3.14; var two = 2; print two * pi * r; print !nil and -pi; }")
+        first, second = function.body[2:]
+
+        assert isinstance(first.expression.left, expr.Literal)
+        assert first.expression.left.value == 6.28
+        assert isinstance(second.expression, expr.Literal)
+        assert second.expression.value == -3.14
+
+    def test_reassigned_variables_are_not_propagated(self):
+
+        source = """
+        fun f() {
+            var a = 1;
+            var b = 1;
+            fun set() { b = 2; }
+            a = 3;
+            set();
+            print a + b;
+        }
+        f();
+        """
+        assert run_source(source, optimize=True) == "5.0\n"
+
+    def test_dead_code_is_dropped(self):
+
+        [function] = optimize("fun f() { if (false) print 1; else print 2; while (nil) print 3; return 4; print 5; }")
+
+        assert [type(statement) for statement in function.body] == [stmt.Print, stmt.Return]
+
+    def test_loop_invariants_are_hoisted(self):
+
+        source = """
+        fun f(n) {
+            var scale = n * 2;
+            var total = 0;
+            for (var i = 0; i < 3; i = i + 1) {
+                total = total + scale * scale + i;
+            }
+            return total;
+        }
+        print f(2);
+        """
+        [function, _] = optimize(source)
+        loop = function.body[2].statements[1]
+
+        assert isinstance(loop, stmt.Block)
+        assert [type(statement) for statement in loop.statements] == [stmt.Var, stmt.While]
+        assert run_source(source, optimize=True) == "51.0\n"
@@ -1,11 +1,28 @@
+import pickle
 import unittest
 from pylox.parser import Parser
+from pylox.scanner import Scanner, TokenStoreScanner
 from pylox.token_type import TokenType
 from pylox.token import Token
 from pylox.lox import Lox
 import pylox.expr as expr
 import pylox.stmt as stmt
 
+
+def same(a, b) -> bool:
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(map(same, a, b))
+    if isinstance(a, (expr.Expr, stmt.Stmt, Token)):
+        return type(a) == type(b) and all(same(getattr(a, f), getattr(b, f)) for f in a.__match_args__)
+    return a == b
+
+
+SOURCE = """
+class A < B { init(x) { this.x = -x; } get() { return super.get() + this.x; } }
+for (var i = 0; i < 10; i = i + 1) { if (i % 2 == 0 or i > 5) print "even"; else print nil; }
+assert A(1).get() != 2.5;
+"""
+
 class TestParser(unittest.TestCase):
 
     def setUp(self):
@@ -79,3 +96,48 @@ class TestParser(unittest.TestCase):
         assert result is None
         assert self.runtime.had_error
 
+    def test_parsing_from_a_token_store(self):
+        from_list = Parser(Scanner(SOURCE, self.runtime).scan_tokens(), self.runtime).parse()
+        from_store = Parser(TokenStoreScanner(SOURCE, self.runtime).scan_tokens(), self.runtime).parse()
+
+        assert same(from_list, from_store)
+        assert not self.runtime.had_error
+
+    def test_parsing_a_token_stream(self):
+
+        from_list = Parser(Scanner(SOURCE, self.runtime).scan_tokens(), self.runtime).parse()
+
+        pulled = []
+        def tokens():
+            for token in Scanner(SOURCE, self.runtime).stream_tokens():
+                pulled.append(token)
+                yield token
+
+        declarations = Parser(tokens(), self.runtime).parse_stream()
+        first = next(declarations)
+        # the first declaration is parsed before the rest of the program is scanned
+        assert pulled[-1].line == 2
+        assert same(from_list, [first] + list(declarations))
+        assert not self.runtime.had_error
+
+    def test_nodes_and_tokens_are_slotted(self):
+
+        classes = [Token] + [
+            cls for module in (expr, stmt) for cls in vars(module).values()
+            if isinstance(cls, type) and cls.__module__ == module.__name__ and issubclass(cls, (expr.Expr, stmt.Stmt))
+            and cls not in (expr.Expr, stmt.Stmt)
+        ]
+        assert len(classes) > 20
+
+        for cls in classes:
+            with self.subTest(cls.__name__):
+                # a distinct value for each constructor argument, in order
+                arguments = [object() for _ in cls.__match_args__]
+                node = cls(*arguments)
+
+                assert not hasattr(node, "__dict__")
+                assert [getattr(node, field) for field in cls.__match_args__] == arguments
+
+                # and they're pickled as the same constructor call
+                node = cls(*(str(i) for i in range(len(arguments))))
+                assert same(pickle.loads(pickle.dumps(node)), node)
@@ -0,0 +1,98 @@
+import contextlib
+import io
+import unittest
+from pylox.lox import Lox
+from pylox.profiler import SCRIPT, DeterministicProfiler, SamplingProfiler
+
+SOURCE = """fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+fun count(n) { if (n == 0) return 0; return count(n - 1); }
+fun spin(n) {
+  var total = 0;
+  for (var i = 0; i < n; i = i + 1) total = total + i;
+  return total;
+}
+print fib(12);
+print count(2000);
+print spin(SPINS);
+"""
+
+
+def profile(profiler_class, spins: int = 10, **options):
+    runtime = Lox()
+    runtime.source = SOURCE.replace("SPINS", str(spins))
+    profiler = profiler_class(runtime.interpreter, **options)
+    output = io.StringIO()
+    profiler.start()
+    with contextlib.redirect_stdout(output):
+        runtime.run()
+    profiler.stop()
+    assert output.getvalue() == f"144.0\n0.0\n{float(spins * (spins - 1) // 2)}\n"
+    return profiler
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_deterministic_profiles_count_every_call_and_line(self):
+
+        profiler = profile(DeterministicProfiler)
+        functions, lines = profiler.functions, profiler.lines
+
+        # tail calls replace each other on the shadow stack, and count as calls
+        assert functions["fib:1"].count == 465
+        assert functions["count:5"].count == 2001
+        assert functions["spin:6"].count == 1
+        # the `if` on line 2 runs in every call, and its `return` in 233 of them
+        assert lines[2].count == 698 and lines[3].count == 232
+        assert lines[8].count == 11
+        assert profiler.stack == []
+
+        for label, stats in functions.items():
+            with self.subTest(label=label):
+                # recursive calls are only counted once in inclusive time
+                assert 0 < stats.exclusive <= stats.inclusive <= profiler.elapsed
+        assert abs(sum(stats.exclusive for stats in functions.values()) - profiler.elapsed) < 0.01 * profiler.elapsed
+        assert functions[SCRIPT].inclusive == profiler.elapsed
+
+    def test_sampling_profiles_follow_the_shadow_stack(self):
+
+        profiler = profile(SamplingProfiler, spins=100_000, interval=0.001)
+        functions = profiler.functions
+
+        assert profiler.samples > 10
+        assert functions["fib:1"].count == 465 and functions["count:5"].count == 2001
+        assert functions["spin:6"].inclusive > 0
+        assert profiler.lines[8].count > 0 and profiler.lines[13].count > 0
+        assert profiler.stack == [] and profiler.interpreter.call_hooks is None
+
+    def test_collapsed_stacks_and_report(self):
+
+        profiler = profile(DeterministicProfiler)
+
+        collapsed = io.StringIO()
+        profiler.write_collapsed(collapsed)
+        stacks = dict(line.rsplit(" ", 1) for line in collapsed.getvalue().splitlines())
+        assert "<script>;fib:1;fib:1;fib:1" in stacks
+        assert "<script>;spin:6" in stacks
+        assert all(stack.startswith(SCRIPT) and int(microseconds) > 0 for stack, microseconds in stacks.items())
+
+        report = io.StringIO()
+        profiler.report(report)
+        assert report.getvalue().startswith("Profile (deterministic)")
+        assert "fib:1" in report.getvalue() and "line 3" in report.getvalue()
+
+    def test_runtime_errors_unwind_the_shadow_stack(self):
+
+        runtime = Lox()
+        runtime.source = "fun f(n) { if (n == 0) return nil + 1; return f(n - 1) + 0; }\nf(5);"
+        profiler = DeterministicProfiler(runtime.interpreter)
+        profiler.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            runtime.run()
+        profiler.stop()
+
+        assert runtime.had_runtime_error
+        assert profiler.stack == [] and profiler.functions["f:1"].count == 6
+        assert "execute" not in vars(runtime.interpreter)
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pylox.program_cache
+from pylox.lox import Lox
+from pylox.program_cache import CACHE_DIR, ProgramCache
+
+# tail calls, a counted loop, an empty scope, closures and a class, so a
+# cached program only runs correctly if all its annotations come back
+SOURCE = """
+fun count(n, acc) { if (n == 0) return acc; return count(n - 1, acc + 1); }
+fun counter() { var n = 0; fun up() { n = n + 1; return n; } return up; }
+class Box { init(v) { this.v = v; } get() { { print "empty"; } return this.v; } }
+var up = counter();
+var total = 0;
+for (var i = 0; i < 10; i = i + 1) { total = total + i; }
+print count(100, 0);
+print up() + up();
+print Box(total).get();
+"""
+
+EXPECTED = "100.0\n3.0\nempty\n45.0\n"
+
+
+class TestProgramCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.script = os.path.join(self.directory, "script.lox")
+        self.write(SOURCE)
+
+    def write(self, source: str):
+        with open(self.script, "w") as ofp:
+            ofp.write(source)
+
+    def run_file(self, engine: str = "tree") -> str:
+        runtime = Lox(engine=engine, cache=True)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.suppress(SystemExit):
+            runtime.run_file(self.script)
+        return output.getvalue()
+
+    def cached(self, optimize: bool = False) -> bool:
+        return ProgramCache(self.script, optimize).load() is not None
+
+    def test_cached_programs_run_without_being_compiled(self):
+
+        assert not self.cached()
+        assert self.run_file() == EXPECTED
+        assert os.path.exists(os.path.join(self.directory, CACHE_DIR, "script.lox.pickle"))
+
+        for engine in ["tree", "stack", "vm", "closure", "python"]:
+            with self.subTest(engine=engine), mock.patch("pylox.lox.Parser") as parser:
+                assert self.run_file(engine) == EXPECTED
+                parser.assert_not_called()
+
+        # deeper than python's recursion limit, so only runs if the tail calls are still marked
+        self.write("fun count(n, acc) { if (n == 0) return acc; return count(n - 1, acc + 1); } print count(5000, 0);")
+        assert self.run_file() == "5000.0\n"
+        assert self.cached()
+        assert self.run_file() == "5000.0\n"
+
+    def test_entries_are_invalidated(self):
+
+        self.run_file()
+        assert self.cached() and not self.cached(optimize=True)
+
+        self.write(SOURCE + 'print "more";\n')
+        assert not self.cached()
+        assert self.run_file() == EXPECTED + "more\n"
+        assert self.cached()
+
+        with mock.patch.object(pylox.program_cache, "__version__", "0.0.0"):
+            assert not self.cached()
+
+    def test_corrupt_entries_are_rebuilt(self):
+
+        self.run_file()
+        path = ProgramCache(self.script, False).path
+        with open(path, "rb") as ifp:
+            entry = ifp.read()
+        header = entry[: entry.index(b"\n") + 1]
+
+        for corrupt in [b"", entry[: len(entry) // 2], header + b"not a pickle", header + entry[len(header) + 1:]]:
+            with self.subTest(corrupt=corrupt[:60]):
+                with open(path, "wb") as ofp:
+                    ofp.write(corrupt)
+                assert not self.cached()
+                assert self.run_file() == EXPECTED
+                assert self.cached()
+
+    def test_programs_with_errors_or_warnings_are_not_cached(self):
+
+        self.write("print 1 +;")
+        assert self.run_file() == "[line: 1] Error at ;: Expect expression.\n"
+        assert not self.cached()
+
+        self.write("print 1; @")
+        assert self.run_file() == "Unexpected Character @ on line 1\n1.0\n"
+        assert not self.cached()
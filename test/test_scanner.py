@@ -1,7 +1,11 @@
+import contextlib
+import io
 import unittest
-from pylox.scanner import Scanner
+from pylox.scanner import Scanner, RegexScanner, TokenStoreScanner, MappedScanner
 from pylox.token_type import TokenType
 from pylox.lox import Lox
+from lox_scripts import SCRIPTS
+
 
 class TestScanner(unittest.TestCase):
 
@@ -94,3 +98,127 @@ class TestScanner(unittest.TestCase):
 
         expected = [TokenType.IDENTIFIER, TokenType.IDENTIFIER, TokenType.IDENTIFIER, TokenType.EOF]
         assert [t.type for t in tokens] == expected
+
+    def test_token_store_matches_token_list(self):
+
+        source = 'var name = "multi\nline" + 12.5; // comment\nfun f(a_1) { return a_1 >= 3 and !nil; }'
+        tokens = Scanner(source, self.runtime).scan_tokens()
+        store = TokenStoreScanner(source, self.runtime).scan_tokens()
+
+        assert len(store) == len(tokens)
+        for i, token in enumerate(tokens):
+            assert store.type(i) == token.type
+            assert store.lexeme(i) == token.lexeme
+            assert store.line(i) == token.line
+            assert store[i].literal == token.literal
+        assert store[-1].type == TokenType.EOF
+        # both uses of `a_1` share one interned lexeme
+        assert store[10].lexeme is store[14].lexeme == "a_1"
+
+
+class TestRegexScanner(TestScanner):
+
+    # runs every Scanner test above against RegexScanner as well
+
+    def setUp(self):
+        self.runtime = Lox()
+        self.scanner = RegexScanner("", runtime=self.runtime)
+
+    def scan(self, scanner_class, source: str):
+        runtime = Lox()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tokens = scanner_class(source, runtime).scan_tokens()
+        return [(t.type, t.lexeme, t.literal, t.line) for t in tokens], output.getvalue(), runtime.had_error
+
+    def test_matches_scanner(self):
+
+        sources = [
+            'print "one\ntwo" ;\n"three\n\nfour" ',
+            "var x = 12.5.y + 3. + .4;\t// trailing\r\n",
+            "a!=b==c<=d>=e<f>g=!h ",
+            "caf\u00e9 _under x_1 1x \u0663 ",
+            "# @ $ \f ok ",
+            '"unterminated\nstring',
+        ]
+        for path in SCRIPTS:
+            with open(path) as ifp:
+                sources.append(ifp.read())
+
+        for source in sources:
+            with self.subTest(source=source[:40]):
+                assert self.scan(RegexScanner, source) == self.scan(Scanner, source)
+
+    def test_streams_chunks(self):
+
+        def scan_chunks(source: str, size: int):
+            runtime = Lox()
+            output = io.StringIO()
+            chunks = (source[i : i + size] for i in range(0, len(source), size))
+            with contextlib.redirect_stdout(output):
+                tokens = list(RegexScanner("", runtime).stream_tokens(chunks))
+            return [(t.type, t.lexeme, t.literal, t.line) for t in tokens], output.getvalue(), runtime.had_error
+
+        sources = [
+            'a==b<=c!=d // note\n"split\nstring" 12.75 .5 3. x_1 "open',
+            "1.2.3 /// // / !! == = \n\n",
+        ]
+        for path in SCRIPTS[:3]:
+            with open(path) as ifp:
+                sources.append(ifp.read())
+
+        for source in sources:
+            for size in [1, 2, 3, 7, 64]:
+                with self.subTest(source=source[:40], size=size):
+                    assert scan_chunks(source, size) == self.scan(Scanner, source)
+
+
+
+class TestMappedScanner(unittest.TestCase):
+
+    def scan(self, source: bytes):
+        runtime = Lox()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tokens = MappedScanner(memoryview(source), runtime).scan_tokens()
+        if tokens is None:
+            return None
+        tokens = [tokens[i] for i in range(len(tokens))]
+        return [(t.type, t.lexeme, t.literal, t.line) for t in tokens], output.getvalue(), runtime.had_error
+
+    def test_matches_scanner(self):
+
+        sources = [
+            'print "one\ntwo" ;\n"three\n\nfour" ',
+            "var x = 12.5.y + 3. + .4;\t// trailing\r\n",
+            "# @ $ ok\n\"unterminated\nstring",
+        ]
+        for path in SCRIPTS:
+            with open(path) as ifp:
+                sources.append(ifp.read())
+
+        for source in sources:
+            with self.subTest(source=source[:40]):
+                runtime = Lox()
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    tokens = RegexScanner(source.replace("\r\n", "\n"), runtime).scan_tokens()
+                expected = [(t.type, t.lexeme, t.literal, t.line) for t in tokens], output.getvalue(), runtime.had_error
+                assert self.scan(source.encode()) == expected
+
+    def test_line_breaks_are_read_as_in_text_mode(self):
+
+        tokens, _, _ = self.scan(b'a\r\nb\rc\n"d\r\ne\rf" g')
+
+        assert [(lexeme, line) for _, lexeme, _, line in tokens] == [
+            ("a", 1), ("b", 2), ("c", 3), ('"d\ne\nf"', 6), ("g", 6), ("", 6),
+        ]
+        assert tokens[3][2] == "d\ne\nf"
+
+    def test_non_ascii_outside_strings_is_left_to_str_scanners(self):
+
+        tokens, _, _ = self.scan('print "caf\u00e9"; // na\u00efve'.encode())
+        assert tokens[1][2] == "caf\u00e9"
+
+        assert self.scan('var caf\u00e9 = 1;'.encode()) is None
+        assert self.scan("print \u0663;".encode()) is None
@@ -0,0 +1,63 @@
+import unittest
+from lox_scripts import MatchesTreeWalker, run_source
+
+
+class TestStackInterpreter(MatchesTreeWalker, unittest.TestCase):
+
+    engine = "stack"
+
+    def test_runtime_errors_match_tree_walker(self):
+
+        programs = [
+            'print "a" - 1;',
+            "print -nil;",
+            "print 1 / 0;",
+            'print 1 + "a";',
+            "print missing;",
+            "var a = 1; a();",
+            "fun f(a) {} f();",
+            "class A {} print A().field;",
+            "var a = 1; a.field = 2;",
+            "var a = 1; class B < a {}",
+            "class A {} class B < A { m() { return super.missing; } } B().m();",
+            "fun f() { { var a = 1; return a; } } print f(); print a;",
+        ]
+        for source in programs:
+            with self.subTest(source=source):
+                assert run_source(source, "stack") == run_source(source, "tree")
+
+    def test_deep_recursion(self):
+
+        source = """
+        fun depth(n) { if (n == 0) return 0; return 1 + depth(n - 1); }
+        print depth(20000);
+        class Node {
+            init(n) { if (n > 0) this.next = Node(n - 1); else this.next = nil; }
+        }
+        var node = Node(5000);
+        var length = 0;
+        while (node != nil) { length = length + 1; node = node.next; }
+        print length;
+        """
+        assert run_source(source, "stack") == "20000.0\n5001.0\n"
+
+    def test_stack_overflow(self):
+
+        source = """
+        fun depth(n) { if (n == 0) return 0; return 1 + depth(n - 1); }
+        print depth(10);
+        print depth(100);
+        """
+        assert run_source(source, "stack", max_depth=50) == "10.0\nStack overflow.\n[line: 2]\n"
+
+    def test_deep_expressions(self):
+
+        sums = "print " + " + ".join(["1"] * 5000) + ";"
+        negations = "print " + "-" * 4999 + "1;"
+        nots = "print " + "!" * 5000 + "true;"
+        assert run_source(sums + negations + nots, "stack") == "5000.0\n-1.0\nTrue\n"
+
+    def test_nesting_too_deep_to_parse(self):
+
+        source = "print " + "(" * 5000 + "1" + ")" * 5000 + ";\nprint 2;"
+        assert run_source(source, "stack") == "[line: 1] Error at (: Too much nesting.\n"
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import sys
+import unittest
+from pylox.interpreter import Interpreter
+from pylox.lox import Lox
+from pylox.stats import Stats
+
+SOURCE = """
+class Point {
+  init(x, y) { this.x = x; this.y = y; }
+  sum() { return this.x + this.y; }
+}
+fun count(n) { if (n == 0) return "done"; return count(n - 1); }
+fun unused() { return 1 + 2 + 3; }
+var p = Point(1, 2);
+var total = 0;
+for (var i = 0; i < 100; i = i + 1) {
+  total = total + p.sum();
+}
+print total;
+print count(2);
+"""
+
+
+def count(source: str, signal_returns: bool = True) -> Stats:
+    runtime = Lox()
+    runtime.interpreter = Interpreter(runtime, signal_returns=signal_returns)
+    runtime.source = source
+    stats = Stats()
+    stats.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        runtime.run()
+    stats.stop()
+    return stats
+
+
+class TestStats(unittest.TestCase):
+
+    def test_counts_are_exact(self):
+
+        stats = count(SOURCE)
+        counts = stats.as_dict()
+
+        assert counts["calls"] == 104 and counts["tail calls"] == 2
+        assert counts["instances"] == 1
+        assert counts["functions"] == 4 and counts["bound methods"] == 0
+        assert counts["returns raised"] == 0
+        # one per call with parameters, one per method call holding `this` and
+        # its parameters together, and one for the counter of the loop rather
+        # than one per iteration
+        assert counts["environments"] == 105
+        assert counts["global lookups"] == 205 and counts["global assignments"] == 100
+        assert counts["local lookups"] == 209 and counts["local assignments"] == 0
+
+        # nodes in functions that never run are never counted, although the Resolver visits them
+        assert counts["evaluations"]["Literal"] == 112
+        assert counts["evaluations"]["Block"] == 1
+        # tail calls are made by their return statements, without evaluating the call
+        assert counts["evaluations"]["Call"] == 102
+
+        assert count(SOURCE).as_dict() == counts
+
+    def test_returns_raised(self):
+
+        assert count(SOURCE).counts["returns raised"] == 0
+        assert count(SOURCE, signal_returns=False).counts["returns raised"] == 103
+
+    def test_stopping_restores_the_profile_function(self):
+
+        def profile(frame, event, arg):
+            pass
+
+        sys.setprofile(profile)
+        try:
+            stats = Stats()
+            stats.start()
+            assert sys.getprofile() == stats.event
+            stats.stop()
+            assert sys.getprofile() is profile
+        finally:
+            sys.setprofile(None)
+
+    def test_report(self):
+
+        report = io.StringIO()
+        count(SOURCE).report(report)
+        lines = report.getvalue().splitlines()
+
+        assert lines[0] == "Stats"
+        assert lines[1].split()[:2] == ["calls", "104"]
+        assert "Evaluations" in lines
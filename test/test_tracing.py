@@ -0,0 +1,113 @@
+import contextlib
+import io
+import json
+import unittest
+from unittest import mock
+from pylox.lox import Lox
+from pylox.tracing import SCRIPT, ChromeTrace
+
+SOURCE = """class Point {
+  init(x, y) { this.x = x; this.y = y; }
+}
+fun count(n) {
+  if (n == 0) return "done";
+  return count(n - 1);
+}
+var p = Point(1, 2);
+print count(1);
+"""
+
+
+def trace(source: str, lines: bool = True):
+    runtime = Lox()
+    runtime.source = source
+    events = []
+    runtime.interpreter.settrace(lambda *event: events.append(event), lines)
+    with contextlib.redirect_stdout(io.StringIO()):
+        runtime.run()
+    runtime.interpreter.settrace(None)
+    return runtime, events
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_calls_returns_instantiations_and_lines(self):
+
+        _, events = trace(SOURCE)
+
+        assert events == [
+            ("line", SCRIPT, 1, None),
+            ("line", SCRIPT, 4, None),
+            ("line", SCRIPT, 8, None),
+            ("instantiate", "Point", 8, [1.0, 2.0]),
+            ("call", "init", 2, [1.0, 2.0]),
+            ("line", "init", 2, None),
+            ("return", "init", 2, mock.ANY),
+            ("line", SCRIPT, 9, None),
+            ("call", "count", 4, [1.0]),
+            ("line", "count", 5, None),
+            ("line", "count", 6, None),
+            # the tail call takes the place of the call making it
+            ("return", "count", 6, None),
+            ("call", "count", 4, [0.0]),
+            ("line", "count", 5, None),
+            ("return", "count", 5, "done"),
+        ]
+
+    def test_loops_run_their_lines_again(self):
+
+        _, events = trace("var a = 0; var b = 0;\nfor (var i = 0; i < 3; i = i + 1) a = a + i;\nwhile (b < 2) {\n  b = b + 1;\n}\n")
+
+        lines = [line for event, _, line, _ in events if event == "line"]
+        assert lines == [1, 2, 2, 2, 3, 4, 4]
+
+    def test_tracing_without_lines(self):
+
+        runtime, events = trace(SOURCE, lines=False)
+
+        assert [event for event, *_ in events] == ["instantiate", "call", "return", "call", "return", "call", "return"]
+        assert events[-1] == ("return", "count", 4, "done")
+
+    def test_removing_the_hook_restores_the_interpreter(self):
+
+        runtime = Lox()
+        interpreter = runtime.interpreter
+
+        def hook(*event):
+            pass
+
+        interpreter.settrace(hook)
+        assert interpreter.gettrace() is hook
+        assert "execute" in vars(interpreter) and "call" in vars(interpreter)
+
+        interpreter.settrace(None)
+        assert interpreter.gettrace() is None and interpreter.call_hooks is None
+        assert "execute" not in vars(interpreter) and "call" not in vars(interpreter)
+
+    def test_runtime_errors_return_none(self):
+
+        runtime, events = trace('fun f() {\n  return nil + 1;\n}\nf();\nprint "not run";')
+
+        assert runtime.had_runtime_error
+        assert events[-2:] == [("line", "f", 2, None), ("return", "f", 2, None)]
+
+    def test_chrome_traces_are_json(self):
+
+        for source, slices in [(SOURCE, 3), ("print 1;", 0)]:
+            with self.subTest(source=source):
+                runtime = Lox()
+                runtime.source = source
+                out = io.StringIO()
+                chrome = ChromeTrace(out)
+                runtime.interpreter.settrace(chrome, lines=False)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    runtime.run()
+                runtime.interpreter.settrace(None)
+                chrome.close()
+
+                events = json.loads(out.getvalue())
+                assert [event["ph"] for event in events].count("B") == slices
+                assert [event["ph"] for event in events].count("E") == slices
+                assert [event["ts"] for event in events] == sorted(event["ts"] for event in events)
+                if slices:
+                    assert events[0]["name"] == "Point" and events[0]["args"]["arguments"] == ["1.0", "2.0"]
@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+from pylox.transpiler import PythonEngine, Transpiler
+from lox_scripts import MatchesTreeWalker, run_source
+
+
+class TestTranspiler(MatchesTreeWalker, unittest.TestCase):
+
+    engine = "python"
+
+    def test_runtime_errors_match_tree_walker(self):
+
+        programs = [
+            'print "a" - 1;',
+            "print -nil;",
+            "var zero = 0; print 1 / zero;",
+            "print 1 % 0;",
+            'print 1 + "a";',
+            "print missing;",
+            "missing = 1;",
+            "var a = 1; a();",
+            "fun f(a) {} f();",
+            "class A {} print A().field;",
+            "var a = 1; a.field = 2;",
+            "var a = 1; class B < a {}",
+            "class A {} class B < A { m() { return super.missing; } } B().m();",
+            'fun f() { print "side effect"; } class A {} A().missing(f());',
+            "class A { m(a) {} } A().m();",
+        ]
+        for source in programs:
+            with self.subTest(source=source):
+                assert run_source(source, "python") == run_source(source, "tree")
+
+    def test_block_scoped_closures(self):
+
+        # python only has function scope, so each Lox block variable captured
+        # by a closure needs its own storage per execution of the block
+        source = """
+        var first = nil;
+        var second = nil;
+        for (var i = 0; i < 2; i = i + 1) {
+            var j = i;
+            fun show() { print j; }
+            if (j == 0) first = show;
+            if (j == 1) second = show;
+        }
+        first();
+        second();
+
+        fun outer() {
+            var x = "before";
+            fun get() { return x; }
+            x = "after";
+            return get;
+        }
+        print outer()();
+        """
+        assert run_source(source, "python") == "0.0\n1.0\nafter\n"
+
+    def test_lox_names_that_are_python_keywords(self):
+
+        source = "var def = 1; { var lambda = 2; var None = 3; print def + lambda + None; }"
+        assert run_source(source, "python") == "6.0\n"
+
+    def test_code_objects_are_cached_by_source(self):
+
+        source = "fun add(a, b) { return a + b; } print add(1, 2);"
+        PythonEngine.code_cache.pop((source, False), None)
+        PythonEngine.code_cache.pop((source, True), None)
+
+        with mock.patch.object(Transpiler, "transpile", autospec=True, side_effect=Transpiler.transpile) as transpile:
+            assert run_source(source, "python") == "3.0\n"
+            assert run_source(source, "python") == "3.0\n"
+            assert transpile.call_count == 1
+
+            # the optimized program is translated separately
+            assert run_source(source, "python", optimize=True) == "3.0\n"
+            assert run_source(source, "python", optimize=True) == "3.0\n"
+            assert transpile.call_count == 2
+
+        assert (source, False) in PythonEngine.code_cache and (source, True) in PythonEngine.code_cache
@@ -0,0 +1,92 @@
+import unittest
+from pylox.lox import Lox
+from pylox.chunk import OpCode
+from pylox.compiler import Compiler
+from pylox.parser import Parser
+from pylox.scanner import Scanner
+from lox_scripts import MatchesTreeWalker, run_source
+
+
+class TestVM(MatchesTreeWalker, unittest.TestCase):
+
+    engine = "vm"
+
+    def test_closures_capture_variables(self):
+
+        source = """
+        fun makeCounter() {
+            var i = 0;
+            fun count() { i = i + 1; return i; }
+            return count;
+        }
+        var a = makeCounter();
+        var b = makeCounter();
+        print a(); print a(); print b();
+
+        var closures = nil;
+        for (var i = 0; i < 3; i = i + 1) {
+            var j = i;
+            fun show() { print j; }
+            closures = show;
+        }
+        closures();
+        """
+        assert run_source(source, "vm") == "1.0\n2.0\n1.0\n2.0\n"
+
+    def test_methods_and_super(self):
+
+        source = """
+        class A { init(x) { this.x = x; } describe() { return "A " + this.x; } }
+        class B < A {
+            init(x) { super.init(x + "!"); }
+            describe() { var parent = super.describe; return parent() + " via B"; }
+        }
+        var b = B("hi");
+        print b.describe();
+        print b;
+        print b.init("again") == b;
+        """
+        assert run_source(source, "vm") == "A hi! via B\nB instance\nTrue\n"
+
+    def test_runtime_errors_report_line(self):
+
+        source = 'print 1;\nprint "a" - 1;\nprint 2;'
+        assert run_source(source, "vm") == "1.0\nOperands must be numbers.\n[line: 2]\n"
+
+    def test_property_errors_come_before_side_effects(self):
+
+        side = 'fun side() { print "side"; return 1; }\nclass A {}\nvar a = A();\n'
+        for source, error in [
+            ("a.missing(side());", "Undefined property missing."),
+            ("nil.m(side());", "Only class instances have properties."),
+            ("var n = 1;\nn.x = side();", "Only instances have fields."),
+            ("class B < A { m() { return super.missing(side()); } }\nB().m();", "Undefined property missing."),
+        ]:
+            with self.subTest(source=source):
+                assert run_source(side + source, "vm") == run_source(side + source, "tree")
+                assert run_source(side + source, "vm").startswith(error)
+
+    def test_fields_are_looked_up_before_arguments(self):
+
+        source = """
+        class A { m(x) { return "method"; } }
+        var a = A();
+        fun f() { return "field"; }
+        fun shadow() { a.m = f; return 1; }
+        print a.m(shadow());
+        """
+        assert run_source(source, "vm") == "method\n"
+
+    def test_deep_recursion_reports_stack_overflow(self):
+
+        source = "fun f(n) { return f(n + 1); }\nf(0);"
+        assert run_source(source, "vm") == "Stack overflow.\n[line: 1]\n"
+
+    def test_method_calls_compile_to_invoke(self):
+
+        runtime = Lox(engine="vm")
+        tokens = Scanner("class A { m() {} } A().m();", runtime).scan_tokens()
+        statements = Parser(tokens, runtime).parse()
+        function = Compiler().compile(statements)
+        assert OpCode.INVOKE in function.chunk.code
+        assert OpCode.GET_PROPERTY not in function.chunk.code
@@ -14,6 +14,7 @@ def define_ast(output_dir: str, base_name: str, types: List[str]):
     contents += define_visitor(base_name, types)
 
     contents += f"class {base_name}(ABC):\n\n"
+    contents += "    __slots__ = ()\n\n"
     contents += "    def accept(visitor: Visitor):\n"
     contents += "        pass\n\n"
 
@@ -47,16 +48,33 @@ def define_type(base_name, class_name, fields):
 
     class_contents = f"class {class_name}({base_name}):\n\n"
 
+    # Nodes are slotted to keep large syntax trees small and attribute access
+    # fast, and can be destructured positionally with `match`
+    field_names = [field.strip() for field in fields.split(",")]
+    names = ", ".join(f'"{field_name}"' for field_name in field_names)
+    if len(field_names) == 1:
+        names += ","
+    class_contents += f"    __slots__ = ({names})\n"
+    class_contents += f"    __match_args__ = ({names})\n\n"
+
     # constructor
     class_contents += f"    def __init__(self, {fields}):\n"
-    for field in fields.split(","):
-        field_name = field.strip()
+    for field_name in field_names:
         class_contents += f"        self.{field_name} = {field_name}\n"
 
     class_contents += "\n    def accept(self, visitor: Visitor):\n"
     class_contents += (
         f"        return visitor.visit_{class_name.lower()}_{base_name.lower()}(self)\n"
     )
+
+    # Pickled as a call to the constructor, which is about half the size of
+    # the slot state pickle saves by default and much faster to write and read
+    # (see program_cache)
+    values = ", ".join(f"self.{field_name}" for field_name in field_names)
+    if len(field_names) == 1:
+        values += ","
+    class_contents += "\n    def __reduce__(self):\n"
+    class_contents += f"        return ({class_name}, ({values}))\n"
     return class_contents
 
 